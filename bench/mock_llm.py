@@ -0,0 +1,127 @@
+"""OpenAI-compatible stand-in for benchmarking: /v1/chat/completions with synthetic latency, errors and usage.
+
+    python bench/mock_llm.py --port 8089 --latency-ms 800 --jitter-ms 200 --error-rate 0.02
+
+Answers are valid JSON for the checkers' prompts: `--violations` violations
+per rule check (attributed to each listed rule in batched prompts) and no
+LLM calls for cost prompts.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# "- 'GDPR-5': ..." lines of a batched rule prompt
+BATCH_RULE = re.compile(r"^- '([^']*)':", re.MULTILINE)
+
+
+def build_app(
+    latency_ms: float = 500,
+    jitter_ms: float = 100,
+    ms_per_output_token: float = 0,
+    error_rate: float = 0,
+    error_status: int = 503,
+    violations: int = 1,
+    completion_tokens: int = 150,
+    cached_fraction: float = 0,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def answer(prompt: str) -> str:
+        if '"llm_calls"' in prompt:
+            return json.dumps({"llm_calls": []})
+        ids = BATCH_RULE.findall(prompt)
+        found = []
+        for rule_id in ids or [None]:
+            for i in range(violations):
+                violation = {"start_line": 1 + i, "end_line": 1 + i, "description": "Synthetic violation", "severity": "medium"}
+                if rule_id is not None:
+                    id_key = "code_rule_id" if "code_rule_id" in prompt else "regulation_id"
+                    violation = {id_key: rule_id, **violation}
+                found.append(violation)
+        return json.dumps({"violations": found})
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "".join(str(m.get("content", "")) for m in body.get("messages", []))
+        stats["requests"] += 1
+        output_tokens = min(completion_tokens, int(body.get("max_tokens") or completion_tokens))
+        delay = max(0.0, rng.gauss(latency_ms, jitter_ms) + ms_per_output_token * output_tokens) / 1000
+        await asyncio.sleep(delay)
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Synthetic upstream error", "type": "server_error"}}, status_code=error_status,
+            )
+        prompt_tokens = max(1, len(prompt) // 4)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += output_tokens
+        return {
+            "id": f"chatcmpl-mock-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": answer(prompt)},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": prompt_tokens + output_tokens,
+                "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * cached_fraction)},
+            },
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=500, help="mean time to answer")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="standard deviation of that time")
+    parser.add_argument("--ms-per-output-token", type=float, default=0, help="extra decode time per completion token")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of calls answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--violations", type=int, default=1, help="violations reported per rule")
+    parser.add_argument("--completion-tokens", type=int, default=150, help="completion tokens reported per call")
+    parser.add_argument("--cached-fraction", type=float, default=0, help="share of prompt tokens reported as cached")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = build_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        ms_per_output_token=args.ms_per_output_token,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        violations=args.violations,
+        completion_tokens=args.completion_tokens,
+        cached_fraction=args.cached_fraction,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Latency and throughput benchmark for the check endpoints, fully offline.
+
+Boots bench/mock_llm.py and main:app (pointed at the mock through
+OPENAI_BASE_URL) on free local ports, then for every combination of rule
+count, file size and concurrency sends --requests checks to each endpoint
+and reports throughput and p50/p95/p99 latency as JSON.
+
+    python bench/run.py --rules 1,5,20 --file-lines 50,500 --concurrency 1,8 --output bench.json
+    python bench/run.py --baseline bench.json   # exits 1 if any p95 regressed by more than --max-regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+
+ENDPOINTS = ("check-violations", "check-violations/stream", "check-code-violations", "check-cost", "check-all")
+
+RULE_TEXTS = (
+    "Ensure no personal data (e.g., names, emails, IPs) is logged or stored without masking",
+    "All external API calls must use TLS/HTTPS",
+    "Support right-to-be-forgotten: code must allow deletion of user data upon request",
+    "Secrets and API keys must never be hardcoded",
+    "Prompts sent to an LLM must not include raw customer records",
+    "Database queries must be parameterized",
+)
+
+FILE_HEADER = '''import logging
+import requests
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+client = OpenAI()
+'''
+
+FILE_BLOCK = '''
+
+def handle_{i}(user, payload):
+    """Handle request {i}."""
+    email = user.email
+    logger.info("processing %s", email)
+    response = requests.post("http://api.example.com/items/{i}", json=payload)
+    completion = client.chat.completions.create(
+        model=payload.get("model", "gpt-4o"),
+        messages=[{{"role": "user", "content": payload["text"]}}],
+    )
+    return response.json(), completion.choices[0].message.content
+'''
+
+
+def synthetic_source(lines: int) -> str:
+    """A Python file of about `lines` lines with logging, HTTP and LLM calls for the checkers to find."""
+    parts = [FILE_HEADER]
+    i = 0
+    while sum(part.count("\n") for part in parts) < lines:
+        parts.append(FILE_BLOCK.format(i=i))
+        i += 1
+    return "\n".join("".join(parts).splitlines()[:lines]) + "\n"
+
+
+def synthetic_rules(count: int, prefix: str) -> List[Dict[str, str]]:
+    return [{"id": f"{prefix}-{i}", "description": RULE_TEXTS[i % len(RULE_TEXTS)]} for i in range(count)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    return {
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "mean": round(statistics.fmean(values), 1) if values else 0.0,
+        "max": round(values[-1], 1) if values else 0.0,
+    }
+
+
+async def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode} before starting")
+            try:
+                if (await http.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:g}s")
+
+
+def llm_calls_so_far(metrics_text: str) -> int:
+    return int(sum(
+        float(line.rsplit(" ", 1)[1]) for line in metrics_text.splitlines() if line.startswith("llm_calls_total{")
+    ))
+
+
+async def replace_rules(http: httpx.AsyncClient, kind: str, rules: List[Dict[str, str]]) -> None:
+    # kind is "regulations" or "code-rules"
+    existing = (await http.get(f"/get-{kind}")).json()
+    if existing:
+        (await http.post(f"/bulk-delete-{kind}", json=[rule["id"] for rule in existing])).raise_for_status()
+    if rules:
+        (await http.post(f"/add-{kind}", json=rules)).raise_for_status()
+
+
+async def timed_request(http: httpx.AsyncClient, endpoint: str, source: str, params: Dict[str, Any]) -> Optional[float]:
+    """Latency in ms of one check until its full body arrived, or None if it failed."""
+    files = {"file": ("bench_input.py", source.encode("utf-8"), "text/x-python")}
+    started = time.perf_counter()
+    try:
+        async with http.stream("POST", f"/{endpoint}", params=params, files=files) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            if response.status_code != 200:
+                return None
+    except httpx.HTTPError:
+        return None
+    return (time.perf_counter() - started) * 1000
+
+
+async def run_cell(
+    http: httpx.AsyncClient, endpoint: str, source: str, params: Dict[str, Any], requests: int, concurrency: int,
+) -> Dict[str, Any]:
+    pending = iter(range(requests))
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            latency = await timed_request(http, endpoint, source, params)
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+
+    calls_before = llm_calls_so_far((await http.get("/metrics")).text)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    calls_after = llm_calls_so_far((await http.get("/metrics")).text)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "llm_calls_per_request": round((calls_after - calls_before) / requests, 2),
+    }
+
+
+def cell_key(result: Dict[str, Any]) -> tuple:
+    return (result["endpoint"], result["rules"], result["file_lines"], result["concurrency"], result["mode"])
+
+
+def regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], max_regression: float) -> List[str]:
+    before = {cell_key(result): result for result in baseline}
+    found = []
+    for result in results:
+        old = before.get(cell_key(result))
+        if old is None or not old["latency_ms"]["p95"]:
+            continue
+        change = result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1
+        if change > max_regression:
+            found.append(
+                f"{result['endpoint']} rules={result['rules']} lines={result['file_lines']} "
+                f"concurrency={result['concurrency']}: p95 {old['latency_ms']['p95']} -> "
+                f"{result['latency_ms']['p95']} ms (+{change:.0%})"
+            )
+    return found
+
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    mock_port, app_port = free_port(), free_port()
+    mock_command = [
+        sys.executable, str(BENCH_DIR / "mock_llm.py"),
+        "--port", str(mock_port),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--ms-per-output-token", str(args.ms_per_output_token),
+        "--error-rate", str(args.error_rate),
+        "--violations", str(args.violations),
+        "--completion-tokens", str(args.completion_tokens),
+        "--cached-fraction", str(args.cached_fraction),
+        "--seed", str(args.seed),
+    ]
+    server_env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "LLM_PROVIDER": "openai",
+        "RULE_STORE_PATH": "",
+        "JOB_STORE_PATH": "",
+        "RESULT_CACHE_PATH": "",
+        # check every rule so the rule count is what gets measured
+        "RELEVANCE_THRESHOLD": "0",
+    }
+    for setting in args.server_env:
+        key, _, value = setting.partition("=")
+        server_env[key] = value
+    app_command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"]
+
+    mock = subprocess.Popen(mock_command, cwd=ROOT)
+    app = subprocess.Popen(app_command, cwd=ROOT, env=server_env)
+    try:
+        await wait_until_up(f"http://127.0.0.1:{mock_port}/health", mock)
+        await wait_until_up(f"http://127.0.0.1:{app_port}/metrics", app)
+        results = []
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=args.timeout, limits=limits) as http:
+            params = {"mode": args.mode, "use_cache": str(args.use_cache).lower()}
+            for rule_count in args.rules:
+                await replace_rules(http, "regulations", synthetic_rules(rule_count, "REG"))
+                await replace_rules(http, "code-rules", synthetic_rules(rule_count, "CODE"))
+                for lines in args.file_lines:
+                    source = synthetic_source(lines)
+                    for endpoint in args.endpoints:
+                        if endpoint == "check-cost" and rule_count != args.rules[0]:
+                            continue  # the cost check doesn't depend on rules
+                        for _ in range(args.warmup):
+                            await timed_request(http, endpoint, source, params)
+                        for concurrency in args.concurrency:
+                            cell = await run_cell(http, endpoint, source, params, args.requests, concurrency)
+                            results.append({
+                                "endpoint": endpoint,
+                                "rules": rule_count,
+                                "file_lines": lines,
+                                "concurrency": concurrency,
+                                "mode": args.mode,
+                                **cell,
+                            })
+                            print(
+                                f"{endpoint:<26} rules={rule_count:<3} lines={lines:<5} c={concurrency:<3} "
+                                f"{cell['throughput_rps']:>8.2f} req/s  p50={cell['latency_ms']['p50']:.0f}ms "
+                                f"p95={cell['latency_ms']['p95']:.0f}ms  errors={cell['errors']}",
+                                file=sys.stderr,
+                            )
+    finally:
+        for process in (app, mock):
+            process.terminate()
+        for process in (app, mock):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "baseline", "max_regression")
+        },
+        "results": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int_list, default=[1, 5, 20], help="regulation (and code rule) counts")
+    parser.add_argument("--file-lines", type=int_list, default=[50, 500], help="synthetic file sizes in lines")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8], help="concurrent clients")
+    parser.add_argument("--endpoints", type=lambda v: v.split(","), default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint and setting")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests before each endpoint's runs")
+    parser.add_argument("--mode", choices=("per_rule", "batched"), default="per_rule")
+    parser.add_argument("--use-cache", action="store_true", help="let repeated checks hit the result cache")
+    parser.add_argument("--timeout", type=float, default=600, help="per-request timeout in seconds")
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--ms-per-output-token", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--violations", type=int, default=1)
+    parser.add_argument("--completion-tokens", type=int, default=150)
+    parser.add_argument("--cached-fraction", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--server-env", action="append", default=[], metavar="KEY=VALUE",
+        help="extra environment for main:app, e.g. LLM_CONCURRENCY=16 (repeatable)",
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase over the baseline")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        found = regressions(report["results"], json.loads(Path(args.baseline).read_text())["results"], args.max_regression)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import ast
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+
+@dataclass
+class CodeUnit:
+    """A top-level function/class, or a run of other top-level statements."""
+    name: str
+    start_line: int  # 1-based, inclusive
+    end_line: int    # 1-based, inclusive
+    fingerprint: str
+
+
+def _fingerprint(kind: str, lines: Sequence[str]) -> str:
+    return hashlib.sha256((kind + "\n" + "\n".join(lines)).encode("utf-8")).hexdigest()
+
+
+def split_units(source: str) -> List[CodeUnit]:
+    """Split a module into top-level units. Raises SyntaxError for unparsable source."""
+    tree = ast.parse(source)
+    lines = source.splitlines()
+    units: List[CodeUnit] = []
+    module_run: Optional[Tuple[int, int]] = None
+
+    def flush_module_run() -> None:
+        nonlocal module_run
+        if module_run is not None:
+            start, end = module_run
+            units.append(CodeUnit("<module>", start, end, _fingerprint("module", lines[start - 1:end])))
+            module_run = None
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            flush_module_run()
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            kind = "class" if isinstance(node, ast.ClassDef) else "def"
+            units.append(CodeUnit(f"{kind} {node.name}", start, node.end_lineno,
+                                  _fingerprint(kind, lines[start - 1:node.end_lineno])))
+        elif module_run is None:
+            module_run = (node.lineno, node.end_lineno)
+        else:
+            module_run = (module_run[0], node.end_lineno)
+    flush_module_run()
+    return units
+
+
+def unit_index_for_line(units: Sequence[CodeUnit], line: int) -> int:
+    """Index of the unit owning `line`; lines between units belong to the unit before them."""
+    owner = 0
+    for i, unit in enumerate(units):
+        if unit.start_line <= line:
+            owner = i
+        else:
+            break
+    return owner
+
+
+def render_ranges(lines: Sequence[str], ranges: Sequence[Tuple[int, int]]) -> Tuple[str, List[Optional[int]]]:
+    """Concatenate 1-based inclusive line ranges (sorted, non-overlapping) into a partial source.
+
+    Returns the text and a line map where entry i is the original line number
+    of rendered line i+1 (None for the `# ...` separators between ranges).
+    """
+    rendered: List[str] = []
+    line_map: List[Optional[int]] = []
+    previous_end: Optional[int] = None
+    for start, end in ranges:
+        if previous_end is not None and start > previous_end + 1:
+            rendered.append("# ...")
+            line_map.append(None)
+        for line_no in range(start, end + 1):
+            rendered.append(lines[line_no - 1])
+            line_map.append(line_no)
+        previous_end = end
+    return "\n".join(rendered), line_map
+
+
+def render_units(
+    lines: Sequence[str], units: Sequence[CodeUnit], context: Sequence[Tuple[int, int]] = (),
+) -> Tuple[str, List[Optional[int]]]:
+    """render_ranges over `units` plus `context` ranges (e.g. imports and globals from context_ranges)."""
+    return render_ranges(lines, _merge_ranges(list(context) + [(unit.start_line, unit.end_line) for unit in units]))
+
+
+def map_line(line_map: Sequence[Optional[int]], line: int) -> int:
+    """Translate a line number in rendered text back to the original file."""
+    if not line_map:
+        return line
+    index = min(max(line, 1), len(line_map)) - 1
+    for i in range(index, -1, -1):
+        if line_map[i] is not None:
+            return line_map[i]
+    return next(original for original in line_map if original is not None)
+
+
+def remap_violations(violations: List[Dict], line_map: Sequence[Optional[int]]) -> List[Dict]:
+    for v in violations:
+        start = map_line(line_map, int(v.get("start_line", 1)))
+        end = map_line(line_map, int(v.get("end_line", v.get("start_line", 1))))
+        v["start_line"], v["end_line"] = start, max(start, end)
+    return violations
+
+
+@dataclass
+class SourceChunk:
+    text: str
+    line_map: List[Optional[int]]  # see render_ranges
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def context_ranges(tree: ast.Module, max_statement_lines: int = 5) -> List[Tuple[int, int]]:
+    """Line ranges of imports and short module-level assignments, shared by every chunk."""
+    ranges = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            ranges.append((node.lineno, node.end_lineno))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.end_lineno - node.lineno < max_statement_lines:
+            ranges.append((node.lineno, node.end_lineno))
+    return _merge_ranges(ranges)
+
+
+def chunk_source(source: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[SourceChunk]:
+    """Split source on top-level function/class boundaries into chunks of about `max_tokens`.
+
+    Each chunk carries the module's imports and globals as context. Units
+    larger than the budget are cut into line windows. Source that fits, or
+    that can't be parsed, comes back as a single chunk.
+    """
+    lines = source.splitlines()
+    whole = SourceChunk(source, list(range(1, len(lines) + 1)))
+    if count_tokens(source) <= max_tokens:
+        return [whole]
+    try:
+        tree = ast.parse(source)
+        units = split_units(source)
+    except SyntaxError:
+        return [whole]
+
+    context = context_ranges(tree)
+    context_tokens = sum(count_tokens("\n".join(lines[s - 1:e])) for s, e in context)
+    budget = max(max_tokens - context_tokens, max_tokens // 4)
+
+    # Pieces are the units themselves, or line windows of oversized units
+    pieces: List[Tuple[int, int, int]] = []
+    for unit in units:
+        tokens = count_tokens("\n".join(lines[unit.start_line - 1:unit.end_line]))
+        if tokens <= budget:
+            pieces.append((unit.start_line, unit.end_line, tokens))
+            continue
+        start = unit.start_line
+        while start <= unit.end_line:
+            end, tokens = start, count_tokens(lines[start - 1])
+            while end < unit.end_line and tokens + count_tokens(lines[end]) <= budget:
+                end += 1
+                tokens += count_tokens(lines[end - 1])
+            pieces.append((start, end, tokens))
+            start = end + 1
+
+    groups: List[List[Tuple[int, int]]] = []
+    current: List[Tuple[int, int]] = []
+    current_tokens = 0
+    for start, end, tokens in pieces:
+        if current and current_tokens + tokens > budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append((start, end))
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+
+    chunks = []
+    for group in groups:
+        text, line_map = render_ranges(lines, _merge_ranges(context + group))
+        chunks.append(SourceChunk(text, line_map))
+    return chunks
+
+
+def shared_context_lines(chunks: Sequence[SourceChunk]) -> Set[int]:
+    """Original line numbers that appear in more than one chunk."""
+    seen: Set[int] = set()
+    shared: Set[int] = set()
+    for chunk in chunks:
+        for line in chunk.line_map:
+            if line is None:
+                continue
+            if line in seen:
+                shared.add(line)
+            seen.add(line)
+    return shared
+
+
+_SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+
+def merge_chunk_violations(violations: List[Dict], id_key: str, shared_lines: Set[int]) -> List[Dict]:
+    """Drop duplicates reported by several chunks for the same lines.
+
+    Exact repeats are removed outright; overlapping findings for the same id
+    that sit entirely in the shared context lines are folded into one.
+    """
+    merged: List[Dict] = []
+    seen: Set[Tuple] = set()
+    for v in sorted(violations, key=lambda v: (v["start_line"], v["end_line"])):
+        key = (v.get(id_key), v["start_line"], v["end_line"])
+        if key in seen:
+            continue
+        seen.add(key)
+        in_context = all(line in shared_lines for line in range(v["start_line"], v["end_line"] + 1))
+        if in_context:
+            for kept in merged:
+                if (kept.get(id_key) == v.get(id_key)
+                        and kept["start_line"] <= v["end_line"] and v["start_line"] <= kept["end_line"]
+                        and all(line in shared_lines for line in range(kept["start_line"], kept["end_line"] + 1))):
+                    kept["start_line"] = min(kept["start_line"], v["start_line"])
+                    kept["end_line"] = max(kept["end_line"], v["end_line"])
+                    if _SEVERITY_RANK.get(v.get("severity"), 1) > _SEVERITY_RANK.get(kept.get("severity"), 1):
+                        kept["severity"] = v["severity"]
+                    break
+            else:
+                merged.append(v)
+        else:
+            merged.append(v)
+    return merged
@@ -0,0 +1,321 @@
+import ast
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+# A cost polynomial in N (items per loop): {degree: coefficient}
+Poly = Dict[int, float]
+
+MODULE_SCOPE = "<module>"
+
+
+def _poly_add(a: Poly, b: Poly) -> Poly:
+    out = dict(a)
+    for degree, coefficient in b.items():
+        out[degree] = out.get(degree, 0.0) + coefficient
+    return out
+
+
+def _poly_scale(p: Poly, degree: int, factor: float) -> Poly:
+    """`p` multiplied by factor×N^degree."""
+    return {d + degree: c * factor for d, c in p.items()}
+
+
+def poly_eval(p: Poly, n: int) -> float:
+    return sum(c * n ** d for d, c in p.items())
+
+
+def poly_label(degree: int, factor: float) -> str:
+    """Human-readable multiplier, e.g. "1", "N", "3×N^2"."""
+    n_part = "" if degree == 0 else ("N" if degree == 1 else f"N^{degree}")
+    if factor == 1 and n_part:
+        return n_part
+    count = f"{factor:g}"
+    return f"{count}×{n_part}" if n_part else count
+
+
+@dataclass
+class _Loop:
+    start_line: int
+    end_line: int
+    degree: int     # 1 when the trip count is the caller-supplied N
+    factor: float   # constant trip count (e.g. range(5)), 1 otherwise
+
+
+@dataclass
+class _Function:
+    name: str
+    start_line: int
+    end_line: int
+    class_name: Optional[str]
+    loops: List[_Loop] = field(default_factory=list)
+    callees: List[Tuple[str, int]] = field(default_factory=list)  # (function name, call line)
+
+
+def _trip_count(iterable: ast.expr) -> Tuple[int, float]:
+    """(degree, factor) for a loop over `iterable`: literal range()/sequence sizes are exact."""
+    if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name) and iterable.func.id == "range":
+        args = iterable.args
+        if args and all(isinstance(a, ast.Constant) and isinstance(a.value, int) for a in args):
+            values = [a.value for a in args]
+            return 0, float(max(len(range(*values)), 0))
+    if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)) and not any(isinstance(e, ast.Starred) for e in iterable.elts):
+        return 0, float(len(iterable.elts))
+    return 1, 1.0
+
+
+def _loops_in(node: ast.AST) -> List[_Loop]:
+    loops = []
+    for child in ast.walk(node):
+        if isinstance(child, (ast.For, ast.AsyncFor)):
+            degree, factor = _trip_count(child.iter)
+            loops.append(_Loop(child.body[0].lineno, child.body[-1].end_lineno, degree, factor))
+        elif isinstance(child, ast.While):
+            loops.append(_Loop(child.body[0].lineno, child.body[-1].end_lineno, 1, 1.0))
+        elif isinstance(child, (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)):
+            for generator in child.generators:
+                degree, factor = _trip_count(generator.iter)
+                loops.append(_Loop(child.lineno, child.end_lineno, degree, factor))
+    return loops
+
+
+class CallGraph:
+    """Functions of one module with their loops and intra-module call edges."""
+
+    def __init__(self, tree: ast.Module):
+        self.functions: Dict[str, _Function] = {}
+        self._collect(tree, None, None)
+        self.module = _Function(MODULE_SCOPE, 1, max((getattr(n, "end_lineno", 1) for n in tree.body), default=1), None)
+        self.module.loops = [loop for loop in _loops_in(tree) if self.owner(loop.start_line) is self.module]
+        self._link(tree)
+
+    def _collect(self, node: ast.AST, class_name: Optional[str], prefix: Optional[str]) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.ClassDef):
+                self._collect(child, child.name, child.name)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = f"{prefix}.{child.name}" if prefix else child.name
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                function = _Function(name, start, child.end_lineno, class_name)
+                self.functions[name] = function
+                self._collect(child, class_name, name)
+                # loops of nested functions belong to those functions
+                nested = [(f.start_line, f.end_line) for f in self.functions.values() if f.name.startswith(name + ".")]
+                function.loops = [
+                    loop for loop in _loops_in(child)
+                    if not any(s <= loop.start_line <= e for s, e in nested)
+                ]
+            else:
+                self._collect(child, class_name, prefix)
+
+    def owner(self, line: int) -> _Function:
+        """Innermost function whose span contains `line` (the module scope otherwise)."""
+        best = None
+        for function in self.functions.values():
+            if function.start_line <= line <= function.end_line:
+                if best is None or function.end_line - function.start_line < best.end_line - best.start_line:
+                    best = function
+        return best or self.module
+
+    def _resolve(self, call: ast.Call, caller: _Function) -> Optional[str]:
+        func = call.func
+        if isinstance(func, ast.Name):
+            # nested function of the caller, then module-level function
+            nested = f"{caller.name}.{func.id}"
+            if nested in self.functions:
+                return nested
+            return func.id if func.id in self.functions else None
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            if func.value.id in ("self", "cls") and caller.class_name:
+                name = f"{caller.class_name}.{func.attr}"
+            else:
+                name = f"{func.value.id}.{func.attr}"
+            return name if name in self.functions else None
+        return None
+
+    def _link(self, tree: ast.Module) -> None:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                caller = self.owner(node.lineno)
+                callee = self._resolve(node, caller)
+                if callee:
+                    caller.callees.append((callee, node.lineno))
+
+    def multiplier(self, function: _Function, line: int) -> Tuple[int, float]:
+        degree, factor = 0, 1.0
+        for loop in function.loops:
+            if loop.start_line <= line <= loop.end_line:
+                degree += loop.degree
+                factor *= loop.factor
+        return degree, factor
+
+    def components(self) -> Dict[str, int]:
+        """Strongly connected component id per function (Tarjan): mutually recursive functions share one."""
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        component: Dict[str, int] = {}
+        stack: List[str] = []
+        by_name = {f.name: f for f in self.all()}
+
+        def visit(name: str) -> None:
+            index[name] = low[name] = len(index)
+            stack.append(name)
+            for callee, _ in by_name[name].callees:
+                if callee not in index:
+                    visit(callee)
+                    low[name] = min(low[name], low[callee])
+                elif callee not in component:
+                    low[name] = min(low[name], index[callee])
+            if low[name] == index[name]:
+                while True:
+                    member = stack.pop()
+                    component[member] = index[name]
+                    if member == name:
+                        break
+
+        for function in self.all():
+            if function.name not in index:
+                visit(function.name)
+        return component
+
+    def entry_points(self) -> List[_Function]:
+        """Functions no other function calls, plus the first function of each recursive group nothing else calls."""
+        component = self.components()
+        called: Set[str] = set()
+        covered: Set[int] = set()
+        for function in self.all():
+            for callee, _ in function.callees:
+                called.add(callee)
+                if component[callee] != component[function.name]:
+                    covered.add(component[callee])
+        entries = [f for f in self.all() if f.name not in called]
+        covered.update(component[f.name] for f in entries)
+        for function in sorted(self.all(), key=lambda f: f.start_line):
+            if component[function.name] not in covered:
+                covered.add(component[function.name])
+                entries.append(function)
+        return entries
+
+    def all(self) -> List[_Function]:
+        return list(self.functions.values()) + [self.module]
+
+
+@dataclass
+class CallSiteProjection:
+    start_line: int
+    end_line: int
+    model: str
+    calls: Poly          # LLM calls per entry-point invocation
+    cost: Poly           # USD per entry-point invocation
+
+
+@dataclass
+class EntryPointProjection:
+    name: str
+    start_line: int
+    end_line: int
+    call_sites: List[CallSiteProjection]
+    recursive: bool = False
+
+    @property
+    def calls(self) -> Poly:
+        total: Poly = {}
+        for site in self.call_sites:
+            total = _poly_add(total, site.calls)
+        return total
+
+    @property
+    def cost(self) -> Poly:
+        total: Poly = {}
+        for site in self.call_sites:
+            total = _poly_add(total, site.cost)
+        return total
+
+
+# call sites reached from one function, by (start_line, end_line)
+_Sites = Dict[Tuple[int, int], CallSiteProjection]
+
+
+def project_costs(source: str, llm_calls: List[Dict]) -> List[EntryPointProjection]:
+    """Project per-entry-point LLM cost as a polynomial in N, the trip count of each loop.
+
+    `llm_calls` are /check-cost entries carrying start_line, end_line, model
+    and estimated_cost. Calls inside loops and comprehensions are multiplied
+    by N per loop level (or by the literal size of range()/list iterables),
+    and callers inherit the cost of the module functions they call.
+    Entry points are functions no other function in the module calls; a
+    group of mutually recursive functions that nothing else calls is
+    entered at its first function. Each function is expanded once per
+    recursion context, so shared callees don't multiply the work.
+    """
+    try:
+        graph = CallGraph(ast.parse(source))
+    except SyntaxError:
+        return []
+
+    direct: Dict[str, List[Tuple[Dict, int, float]]] = {}
+    for call in llm_calls:
+        owner = graph.owner(call["start_line"])
+        degree, factor = graph.multiplier(owner, call["start_line"])
+        direct.setdefault(owner.name, []).append((call, degree, factor))
+
+    by_name = {f.name: f for f in graph.all()}
+    component = graph.components()
+    memo: Dict[Tuple[str, FrozenSet[str]], Tuple[_Sites, bool]] = {}
+
+    def expand(name: str, stack: FrozenSet[str]) -> Tuple[_Sites, bool]:
+        """Call sites reached by one call of `name`, with `stack` the functions of its recursive group being expanded."""
+        memo_key = (name, stack)
+        if memo_key in memo:
+            return memo[memo_key]
+        sites: _Sites = {}
+
+        def add(site: CallSiteProjection) -> None:
+            # merge repeated paths to the same call site
+            key = (site.start_line, site.end_line)
+            if key in sites:
+                sites[key] = CallSiteProjection(
+                    site.start_line, site.end_line, site.model,
+                    _poly_add(sites[key].calls, site.calls), _poly_add(sites[key].cost, site.cost),
+                )
+            else:
+                sites[key] = site
+
+        recursive = False
+        for call, d, f in direct.get(name, []):
+            add(CallSiteProjection(
+                start_line=call["start_line"],
+                end_line=call["end_line"],
+                model=call.get("model", "unknown"),
+                calls={d: f},
+                cost={d: f * call.get("estimated_cost", 0.0)},
+            ))
+        for callee, line in by_name[name].callees:
+            if callee in stack:
+                recursive = True  # count one level of recursion only
+                continue
+            # only members of the callee's own recursive group can lead back to it
+            callee_stack = stack | {callee} if component[callee] == component[name] else frozenset((callee,))
+            callee_sites, callee_recursive = expand(callee, callee_stack)
+            d, f = graph.multiplier(by_name[name], line)
+            for site in callee_sites.values():
+                add(CallSiteProjection(
+                    site.start_line, site.end_line, site.model,
+                    _poly_scale(site.calls, d, f), _poly_scale(site.cost, d, f),
+                ))
+            recursive = recursive or callee_recursive
+        memo[memo_key] = sites, recursive
+        return sites, recursive
+
+    projections = []
+    for entry in graph.entry_points():
+        sites, recursive = expand(entry.name, frozenset((entry.name,)))
+        if not sites:
+            continue
+        projections.append(EntryPointProjection(
+            name=entry.name,
+            start_line=entry.start_line,
+            end_line=entry.end_line,
+            call_sites=sorted(sites.values(), key=lambda s: s.start_line),
+            recursive=recursive,
+        ))
+    return projections
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Job statuses: queued -> running -> completed | failed; queued/running -> cancelled
+
+
+class JobStore:
+    """Durable job queue in SQLite (WAL mode), safe to share between processes.
+
+    A job's request and (partial) result are stored as JSON. Running jobs
+    carry a heartbeat; a job whose heartbeat goes stale, because its
+    process died or the server restarted, is put back on the queue.
+    """
+
+    def __init__(self, path: str, retention: float = 7 * 24 * 3600, stale_after: float = 60):
+        self.retention = retention
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        # autocommit; transactions are opened explicitly where needed
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, result TEXT, error TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)")
+
+    def submit(self, request: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, request, created) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(request), time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, result, error, created, started, finished, attempts FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "status", "result", "error", "created", "started", "finished", "attempts")
+        job = dict(zip(keys, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Take the oldest queued job, first requeueing running jobs whose worker went away."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND heartbeat < ?",
+                    (now - self.stale_after,),
+                )
+                row = self._db.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, attempts = attempts + 1 "
+                    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1) "
+                    "RETURNING id, request",
+                    (now, now),
+                ).fetchone()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def heartbeat(self, job_ids: List[str]) -> List[str]:
+        """Refresh running jobs' heartbeats; returns the ids that are no longer running (e.g. cancelled)."""
+        if not job_ids:
+            return []
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'",
+                [(now, job_id) for job_id in job_ids],
+            )
+            placeholders = ",".join("?" * len(job_ids))
+            running = {
+                job_id for (job_id,) in self._db.execute(
+                    f"SELECT id FROM jobs WHERE status = 'running' AND id IN ({placeholders})", job_ids
+                )
+            }
+        return [job_id for job_id in job_ids if job_id not in running]
+
+    def save_partial(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET result = ?, heartbeat = ? WHERE id = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        # a job cancelled while running keeps its cancelled status
+        status = "failed" if error is not None else "completed"
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = COALESCE(?, result), error = ?, finished = ? "
+                "WHERE id = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def requeue(self, job_ids: List[str]) -> None:
+        """Put running jobs back on the queue, e.g. when their worker shuts down."""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET status = 'queued' WHERE id = ? AND status = 'running'",
+                [(job_id,) for job_id in job_ids],
+            )
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued or running job; returns its resulting status, or None if unknown."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def purge(self) -> int:
+        """Delete finished jobs older than the retention period."""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed', 'cancelled') AND finished < ?",
+                (time.time() - self.retention,),
+            )
+        return cursor.rowcount
+
+
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobWorkerPool:
+    """A bounded set of asyncio workers pulling jobs from a JobStore.
+
+    `handler(job_id, request)` runs one job and returns its result. A
+    monitor task keeps running jobs' heartbeats fresh and cancels any
+    job whose status was changed to cancelled, by this or another process.
+    """
+
+    def __init__(self, store: JobStore, handler: JobHandler, workers: int = 2, poll_interval: float = 1.0):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # jobs interrupted by shutdown go back on the queue for the next start
+        interrupted = [job_id for job_id in self._running if job_id not in self._cancelled]
+        await asyncio.to_thread(self.store.requeue, interrupted)
+        self._running.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            claimed = await asyncio.to_thread(self.store.claim)
+            if claimed is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            job_id, request = claimed
+            task = asyncio.create_task(self.handler(job_id, request))
+            self._running[job_id] = task
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                if job_id not in self._cancelled:
+                    raise  # the worker itself is being stopped; keep the job for requeueing
+                self._cancelled.discard(job_id)
+                self._running.pop(job_id, None)
+                continue
+            except Exception as e:
+                await asyncio.to_thread(self.store.finish, job_id, None, str(e))
+            else:
+                await asyncio.to_thread(self.store.finish, job_id, result)
+            self._running.pop(job_id, None)
+
+    async def _monitor(self) -> None:
+        last_purge = 0.0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for job_id in await asyncio.to_thread(self.store.heartbeat, list(self._running)):
+                task = self._running.get(job_id)
+                if task is not None:
+                    self._cancelled.add(job_id)
+                    task.cancel()
+            if time.time() - last_purge > 60:
+                await asyncio.to_thread(self.store.purge)
+                last_purge = time.time()
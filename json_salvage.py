@@ -0,0 +1,94 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_decoder = json.JSONDecoder()
+
+
+def strip_fences(text: str) -> str:
+    return _FENCE.sub("", text.strip()).strip()
+
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def matches_schema(value: Any, schema: Dict[str, Any]) -> bool:
+    """Check `value` against the JSON Schema subset the checkers' response formats use.
+
+    Supports type, enum, properties, required and items; other keywords are ignored.
+    """
+    expected = schema.get("type")
+    if expected is not None:
+        if isinstance(value, bool) and expected in ("integer", "number"):
+            return False
+        if not isinstance(value, _JSON_TYPES[expected]):
+            return False
+    if "enum" in schema and value not in schema["enum"]:
+        return False
+    if isinstance(value, dict):
+        if any(name not in value for name in schema.get("required", [])):
+            return False
+        properties = schema.get("properties", {})
+        if not all(matches_schema(value[name], properties[name]) for name in properties if name in value):
+            return False
+    if isinstance(value, list) and "items" in schema:
+        return all(matches_schema(item, schema["items"]) for item in value)
+    return True
+
+
+def salvage_json_list(text: str, key: str, item_schema: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict], bool]:
+    """Read `{"<key>": [ {...}, ... ]}` from model output, tolerating truncation.
+
+    Returns (objects, complete). When the output parses as a whole with a
+    list under `key`, or the list itself was closed, complete is True.
+    Otherwise every object in the list that was closed before the output
+    broke off is returned, and complete is False; output without the key
+    is incomplete too, so it is never cached as a clean result. With
+    `item_schema`, objects that don't match it are dropped and the answer
+    counts as incomplete.
+    """
+    items, complete = _salvage(strip_fences(text), key)
+    if item_schema is not None:
+        valid = [item for item in items if matches_schema(item, item_schema)]
+        if len(valid) < len(items):
+            return valid, False
+    return items, complete
+
+
+def _salvage(text: str, key: str) -> Tuple[List[Dict], bool]:
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict) and isinstance(value.get(key), list):
+            return [item for item in value[key] if isinstance(item, dict)], True
+        return [], False  # valid JSON, but not the answer asked for
+    except json.JSONDecodeError:
+        pass
+
+    match = re.search(r'"%s"\s*:\s*\[' % re.escape(key), text)
+    if match is None:
+        return [], False
+    items: List[Dict] = []
+    position = match.end()
+    while True:
+        # skip separators between elements
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text):
+            break
+        if text[position] == "]":
+            return items, True  # only trailing braces are missing
+        try:
+            item, position = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break  # the truncated (or malformed) element and everything after it is lost
+        if isinstance(item, dict):
+            items.append(item)
+    return items, False
@@ -0,0 +1,348 @@
+import ast
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Client classes whose instances expose provider SDK methods
+CLIENT_CLASSES = {
+    "openai.OpenAI": "openai",
+    "openai.AsyncOpenAI": "openai",
+    "openai.AzureOpenAI": "openai",
+    "openai.AsyncAzureOpenAI": "openai",
+    "anthropic.Anthropic": "anthropic",
+    "anthropic.AsyncAnthropic": "anthropic",
+}
+
+# SDK method paths below a client (or the legacy `openai` module) -> call type
+SDK_METHODS = {
+    "openai": {
+        ("chat", "completions", "create"): "chat",
+        ("beta", "chat", "completions", "parse"): "chat",
+        ("responses", "create"): "chat",
+        ("completions", "create"): "completion",
+        ("embeddings", "create"): "embedding",
+        # pre-1.0 module-level API
+        ("ChatCompletion", "create"): "chat",
+        ("ChatCompletion", "acreate"): "chat",
+        ("Completion", "create"): "completion",
+        ("Completion", "acreate"): "completion",
+        ("Embedding", "create"): "embedding",
+        ("Embedding", "acreate"): "embedding",
+    },
+    "anthropic": {
+        ("messages", "create"): "chat",
+        ("messages", "stream"): "chat",
+        ("completions", "create"): "completion",
+    },
+}
+
+# Method paths specific enough to flag even when the receiver can't be traced
+# (e.g. a client passed in as a parameter); `messages.create` is left out
+# because other SDKs (Twilio, ...) use it too.
+UNAMBIGUOUS_OPENAI_METHODS = {
+    ("chat", "completions", "create"): "chat",
+    ("beta", "chat", "completions", "parse"): "chat",
+    ("embeddings", "create"): "embedding",
+}
+
+# LangChain wrappers: class -> (provider, call type, model used when none is given)
+LANGCHAIN_CLASSES = {
+    "langchain.llms.OpenAI": ("langchain", "completion", "gpt-3.5-turbo-instruct"),
+    "langchain_openai.OpenAI": ("langchain", "completion", "gpt-3.5-turbo-instruct"),
+    "langchain_community.llms.OpenAI": ("langchain", "completion", "gpt-3.5-turbo-instruct"),
+    "langchain.chat_models.ChatOpenAI": ("langchain", "chat", "gpt-3.5-turbo"),
+    "langchain_openai.ChatOpenAI": ("langchain", "chat", "gpt-3.5-turbo"),
+    "langchain_community.chat_models.ChatOpenAI": ("langchain", "chat", "gpt-3.5-turbo"),
+    "langchain_anthropic.ChatAnthropic": ("langchain", "chat", None),
+    "langchain.chat_models.ChatAnthropic": ("langchain", "chat", None),
+    "langchain.embeddings.OpenAIEmbeddings": ("langchain", "embedding", "text-embedding-ada-002"),
+    "langchain_openai.OpenAIEmbeddings": ("langchain", "embedding", "text-embedding-ada-002"),
+}
+
+LANGCHAIN_METHODS = {
+    "invoke", "ainvoke", "predict", "apredict", "predict_messages", "generate", "agenerate",
+    "batch", "abatch", "stream", "astream", "call", "run", "embed_query", "embed_documents",
+}
+
+MODEL_KWARGS = ("model", "model_name")
+MAX_TOKENS_KWARGS = ("max_tokens", "max_completion_tokens", "max_output_tokens", "max_tokens_to_sample")
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+
+@dataclass
+class ClientInfo:
+    provider: str
+    call_type: Optional[str] = None      # fixed call type for LangChain wrappers
+    default_model: Optional[str] = None
+    constructor: Optional[ast.Call] = field(default=None, repr=False)
+    scope: Optional[FunctionNode] = field(default=None, repr=False)
+
+
+@dataclass
+class DetectedCall:
+    start_line: int
+    end_line: int
+    provider: str
+    call_type: str
+    model: Optional[str]
+    model_origin: Optional[str]  # "literal", "default argument", "constant", "client default", ...
+    max_tokens: Optional[int]
+    function: Optional[str]
+    receiver: str
+    node: ast.Call = field(repr=False)
+    scope: Optional[FunctionNode] = field(default=None, repr=False)
+    names: Optional["NameScope"] = field(default=None, repr=False)
+
+    @property
+    def resolved(self) -> bool:
+        return self.model is not None
+
+
+@dataclass
+class StaticScan:
+    calls: List[DetectedCall]
+    parsed: bool = True
+
+    @property
+    def unresolved(self) -> List[DetectedCall]:
+        return [call for call in self.calls if not call.resolved]
+
+    @property
+    def needs_llm(self) -> bool:
+        return not self.parsed or bool(self.unresolved)
+
+
+def dotted_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+class NameScope:
+    """Name lookups for one module: imports, constants and function-local assignments."""
+
+    def __init__(self, tree: ast.Module):
+        self.imports: Dict[str, str] = {}
+        self.constants: Dict[str, ast.expr] = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    self.imports[alias.asname or alias.name.split(".")[0]] = alias.name if alias.asname else alias.name.split(".")[0]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                for alias in node.names:
+                    self.imports[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+        for node in ast.walk(tree):
+            for target, value in _assignments(node):
+                # instance attributes are visible from every method
+                if target.startswith("self."):
+                    self.constants[target] = value
+        for node in tree.body:
+            for target, value in _assignments(node):
+                self.constants[target] = value
+
+    def qualify(self, node: ast.AST) -> Optional[str]:
+        name = dotted_name(node)
+        if name is None:
+            return None
+        head, _, rest = name.partition(".")
+        head = self.imports.get(head, head)
+        return f"{head}.{rest}" if rest else head
+
+    def lookup(self, name: str, function: Optional[FunctionNode], before_line: int) -> Tuple[Optional[ast.expr], Optional[str]]:
+        """Find the expression bound to `name` as seen from `function`."""
+        if function is not None:
+            local = None
+            for node in ast.walk(function):
+                for target, value in _assignments(node):
+                    if target == name and node.lineno < before_line:
+                        if local is None or node.lineno > local[0]:
+                            local = (node.lineno, value)
+            if local is not None:
+                return local[1], "local variable"
+            args = function.args
+            positional = args.posonlyargs + args.args
+            for arg, default in zip(positional[len(positional) - len(args.defaults):], args.defaults):
+                if arg.arg == name:
+                    return default, "default argument"
+            for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+                if arg.arg == name and default is not None:
+                    return default, "default argument"
+            if any(arg.arg == name for arg in positional + args.kwonlyargs):
+                return None, None  # a parameter with no default: caller decides
+        if name in self.constants:
+            return self.constants[name], "constant"
+        return None, None
+
+
+def _assignments(node: ast.AST):
+    if isinstance(node, ast.Assign):
+        for target in node.targets:
+            name = dotted_name(target)
+            if name:
+                yield name, node.value
+    elif isinstance(node, ast.AnnAssign) and node.value is not None:
+        name = dotted_name(node.target)
+        if name:
+            yield name, node.value
+
+
+def resolve_literal(scope: NameScope, expr: Optional[ast.expr], function: Optional[FunctionNode], before_line: int, _depth: int = 0) -> Tuple[Any, Optional[str]]:
+    """Resolve `expr` to a constant value through names, defaults and module constants."""
+    if expr is None or _depth > 5:
+        return None, None
+    if isinstance(expr, ast.Constant):
+        return expr.value, "literal"
+    if isinstance(expr, ast.Name):
+        bound, origin = scope.lookup(expr.id, function, before_line)
+        if isinstance(bound, ast.Name) and bound.id == expr.id:
+            function = None  # x = x: look further out
+        value, _ = resolve_literal(scope, bound, function, before_line, _depth + 1)
+        return (value, origin) if value is not None else (None, None)
+    if isinstance(expr, ast.Attribute) and dotted_name(expr) and dotted_name(expr).startswith("self."):
+        bound, origin = scope.lookup(dotted_name(expr), None, before_line)
+        value, _ = resolve_literal(scope, bound, None, before_line, _depth + 1)
+        return (value, origin) if value is not None else (None, None)
+    return None, None
+
+
+def _keyword(call: ast.Call, names) -> Optional[ast.expr]:
+    for kw in call.keywords:
+        if kw.arg in names:
+            return kw.value
+    return None
+
+
+class _Detector(ast.NodeVisitor):
+    def __init__(self, tree: ast.Module):
+        self.scope = NameScope(tree)
+        self.clients: Dict[str, ClientInfo] = {}
+        self.calls: List[DetectedCall] = []
+        self.functions: List[FunctionNode] = []
+        self._collect_clients(tree)
+
+    def _client_for_constructor(self, call: ast.Call, scope: Optional[FunctionNode]) -> Optional[ClientInfo]:
+        cls = self.scope.qualify(call.func)
+        if cls in CLIENT_CLASSES:
+            return ClientInfo(CLIENT_CLASSES[cls], constructor=call, scope=scope)
+        if cls in LANGCHAIN_CLASSES:
+            provider, call_type, default_model = LANGCHAIN_CLASSES[cls]
+            return ClientInfo(provider, call_type, default_model, constructor=call, scope=scope)
+        return None
+
+    def _collect_clients(self, tree: ast.Module) -> None:
+        def visit(node: ast.AST, function: Optional[FunctionNode]) -> None:
+            for child in ast.iter_child_nodes(node):
+                child_function = child if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) else function
+                for target, value in _assignments(child):
+                    if isinstance(value, ast.Call):
+                        info = self._client_for_constructor(value, function)
+                        if info is not None:
+                            self.clients[target] = info
+                visit(child, child_function)
+        visit(tree, None)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self.functions.append(node)
+        self.generic_visit(node)
+        self.functions.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node: ast.Call) -> None:
+        detected = self._detect(node)
+        if detected is not None:
+            self.calls.append(detected)
+        self.generic_visit(node)
+
+    def _detect(self, node: ast.Call) -> Optional[DetectedCall]:
+        function = self.functions[-1] if self.functions else None
+
+        # Wrapper object called directly: llm("prompt")
+        name = dotted_name(node.func)
+        if name in self.clients and self.clients[name].call_type:
+            return self._build(node, self.clients[name], self.clients[name].call_type, name, function)
+
+        if not isinstance(node.func, ast.Attribute):
+            return None
+
+        # Walk down the attribute chain to the receiver
+        path: List[str] = []
+        receiver: ast.AST = node.func
+        while isinstance(receiver, ast.Attribute):
+            path.insert(0, receiver.attr)
+            receiver = receiver.value
+            receiver_name = dotted_name(receiver)
+            if receiver_name in self.clients:
+                info = self.clients[receiver_name]
+                if info.call_type:
+                    if len(path) == 1 and path[0] in LANGCHAIN_METHODS:
+                        return self._build(node, info, info.call_type, receiver_name, function)
+                    return None
+                call_type = SDK_METHODS[info.provider].get(tuple(path))
+                return self._build(node, info, call_type, receiver_name, function) if call_type else None
+
+        # Inline client construction: OpenAI().chat.completions.create(...)
+        if isinstance(receiver, ast.Call):
+            info = self._client_for_constructor(receiver, function)
+            if info is not None and not info.call_type:
+                call_type = SDK_METHODS[info.provider].get(tuple(path))
+                if call_type:
+                    return self._build(node, info, call_type, dotted_name(receiver.func) + "()", function)
+            return None
+
+        # Legacy module-level API: openai.ChatCompletion.create(...)
+        root = self.scope.qualify(receiver)
+        if root in SDK_METHODS:
+            call_type = SDK_METHODS[root].get(tuple(path))
+            if call_type:
+                return self._build(node, ClientInfo(root), call_type, dotted_name(receiver), function)
+            return None
+
+        # Unknown receiver with an unmistakable SDK method path
+        call_type = UNAMBIGUOUS_OPENAI_METHODS.get(tuple(path))
+        if call_type:
+            return self._build(node, ClientInfo("openai"), call_type, dotted_name(receiver) or "<expression>", function)
+        return None
+
+    def _build(self, node: ast.Call, info: ClientInfo, call_type: str, receiver: str, function: Optional[FunctionNode]) -> DetectedCall:
+        model, origin = resolve_literal(self.scope, _keyword(node, MODEL_KWARGS), function, node.lineno)
+        if model is None and info.constructor is not None:
+            model, origin = resolve_literal(self.scope, _keyword(info.constructor, MODEL_KWARGS), info.scope, info.constructor.lineno)
+            if model is not None:
+                origin = "client constructor"
+        if model is None and info.constructor is not None and info.default_model:
+            model, origin = info.default_model, "client default"
+
+        max_tokens, _ = resolve_literal(self.scope, _keyword(node, MAX_TOKENS_KWARGS), function, node.lineno)
+        if max_tokens is None and info.constructor is not None:
+            max_tokens, _ = resolve_literal(self.scope, _keyword(info.constructor, MAX_TOKENS_KWARGS), info.scope, info.constructor.lineno)
+
+        return DetectedCall(
+            start_line=node.lineno,
+            end_line=node.end_lineno,
+            provider=info.provider,
+            call_type=call_type,
+            model=model if isinstance(model, str) else None,
+            model_origin=origin if isinstance(model, str) else None,
+            max_tokens=max_tokens if isinstance(max_tokens, int) and not isinstance(max_tokens, bool) else None,
+            function=function.name if function is not None else None,
+            receiver=receiver,
+            node=node,
+            scope=function,
+            names=self.scope,
+        )
+
+
+def find_llm_calls(source: str) -> StaticScan:
+    """Statically locate OpenAI, Anthropic and LangChain calls in Python source."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return StaticScan(calls=[], parsed=False)
+    detector = _Detector(tree)
+    detector.visit(tree)
+    calls = sorted(detector.calls, key=lambda call: (call.start_line, call.end_line))
+    return StaticScan(calls=calls)
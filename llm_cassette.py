@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import types
+from typing import Any, Dict, Optional
+
+from metrics import Counter
+
+CASSETTE_MODES = ("passthrough", "record", "replay")
+
+CASSETTE_REQUESTS = Counter("llm_cassette_requests_total", "Cassette lookups by result (hit, miss, recorded).", ["result"])
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+def normalize_prompt(text: str) -> str:
+    # line endings and trailing whitespace don't change what the model is asked
+    return "\n".join(line.rstrip() for line in text.replace("\r\n", "\n").strip().split("\n"))
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Hash of everything in a chat request that shapes the answer."""
+    payload = {
+        "model": kwargs.get("model"),
+        "messages": [
+            {"role": message.get("role"), "content": normalize_prompt(str(message.get("content", "")))}
+            for message in kwargs.get("messages", [])
+        ],
+        "temperature": kwargs.get("temperature"),
+        "max_tokens": kwargs.get("max_tokens"),
+        "response_format": kwargs.get("response_format"),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _plain(value: Any) -> Any:
+    """SDK response objects (pydantic models or namespaces) as plain JSON values."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, types.SimpleNamespace):
+        value = vars(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def compact_response(response: Any) -> Dict[str, Any]:
+    """The parts of a chat completion the checkers read: model, message content, finish reason and usage."""
+    response = _plain(response)
+    return {
+        "model": response.get("model"),
+        "choices": [
+            {
+                "index": choice.get("index", 0),
+                "finish_reason": choice.get("finish_reason"),
+                "message": {"role": "assistant", "content": (choice.get("message") or {}).get("content")},
+            }
+            for choice in response.get("choices", [])
+        ],
+        "usage": response.get("usage"),
+    }
+
+
+def _as_response(recorded: Dict[str, Any]) -> Any:
+    # a fresh attribute-access copy per call, so callers can't alter the cassette
+    return json.loads(json.dumps(recorded), object_hook=lambda d: types.SimpleNamespace(**d))
+
+
+class CassetteClient:
+    """Chat client wrapper that records responses to, or replays them from, cassette files.
+
+    A cassette is a JSONL file per model in `directory`, one line per
+    request: the request_key and the compact response. Cassettes are read
+    into memory on first use. In replay mode the wrapped client is never
+    called (and may be None), so checks run offline and deterministically;
+    a request with no recorded response raises CassetteMiss. In record
+    mode every request goes to the wrapped client and its response is
+    appended, replacing any earlier one for the same key.
+    """
+
+    def __init__(self, inner: Optional[Any], mode: str, directory: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"CassetteClient mode must be record or replay, not {mode!r}")
+        if mode == "record" and inner is None:
+            raise RuntimeError("LLM_CASSETTE_MODE=record needs a configured LLM provider to record from.")
+        self.inner = inner
+        self.mode = mode
+        self.directory = directory
+        self._cassettes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def path_for(self, model: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9._-]", "_", model or "default") + ".jsonl")
+
+    def _cassette(self, model: str) -> Dict[str, Dict[str, Any]]:
+        cassette = self._cassettes.get(model)
+        if cassette is None:
+            cassette = {}
+            path = self.path_for(model)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            cassette[entry["key"]] = entry["response"]  # later recordings win
+            self._cassettes[model] = cassette
+        return cassette
+
+    def _record(self, model: str, key: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cassette(model)[key] = response
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path_for(model), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "response": response}, separators=(",", ":")) + "\n")
+
+    async def _create(self, **kwargs: Any) -> Any:
+        model = str(kwargs.get("model", ""))
+        key = request_key(kwargs)
+        if self.mode == "replay":
+            recorded = self._cassette(model).get(key)
+            if recorded is None:
+                CASSETTE_REQUESTS.labels("miss").inc()
+                raise CassetteMiss(f"No recorded response for request {key[:12]} in {self.path_for(model)}")
+            CASSETTE_REQUESTS.labels("hit").inc()
+            return _as_response(recorded)
+
+        response = await self.inner.chat.completions.create(**kwargs)
+        self._record(model, key, compact_response(response))
+        CASSETTE_REQUESTS.labels("recorded").inc()
+        return response
+
+
+def with_cassette(client: Optional[Any], mode: str, directory: str) -> Optional[Any]:
+    """`client` wrapped for LLM_CASSETTE_MODE; passthrough returns it unchanged."""
+    if mode == "passthrough":
+        return client
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Unknown LLM_CASSETTE_MODE {mode!r}; expected one of {', '.join(CASSETTE_MODES)}.")
+    return CassetteClient(client, mode, directory)
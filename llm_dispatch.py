@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from llm_providers import cached_prompt_tokens
+from metrics import Counter, Gauge, Histogram
+from tracing import span
+
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "Latency of one upstream LLM call attempt.", ["model"])
+LLM_CALLS = Counter("llm_calls_total", "Upstream LLM call attempts by outcome (ok, retried, failed).", ["model", "outcome"])
+LLM_COALESCED = Counter("llm_coalesced_calls_total", "LLM calls served by an identical in-flight call.")
+LLM_IN_FLIGHT = Gauge("llm_calls_in_flight", "Upstream LLM calls currently awaiting a response.")
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens reported by the provider.", ["model"])
+LLM_CACHED_PROMPT_TOKENS = Counter("llm_cached_prompt_tokens_total", "Prompt tokens served from the provider's prompt cache.", ["model"])
+LLM_COMPLETION_TOKENS = Counter("llm_completion_tokens_total", "Completion tokens reported by the provider.", ["model"])
+
+
+class LLMError(RuntimeError):
+    """An LLM call failed for good: retries exhausted, non-retryable error, or circuit open."""
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class TokenBucket:
+    """Async token bucket: `rate` units per minute with bursts up to one minute's worth.
+
+    Waiters are served in arrival order. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """Return over-reserved units (e.g. when actual usage came in under the estimate)."""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """Fails fast after `threshold` consecutive upstream failures, for `reset_after` seconds.
+
+    After the cool-down one trial call is let through; success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError if calls aren't allowed; True if this call is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_running):
+            raise CircuitOpenError("LLM provider circuit is open after repeated failures; try again shortly.")
+        if state == "half_open":
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def record_neutral(self) -> None:
+        # a rate-limited or rejected trial call says nothing about provider health
+        self._trial_running = False
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(error: Exception) -> bool:
+    """Rate limits, 5xx responses, timeouts and dropped connections are worth retrying."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500 or status == 408
+    # no HTTP status: connection errors and timeouts
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in (
+        "APIConnectionError", "APITimeoutError",
+    )
+
+
+@dataclass
+class _Flight:
+    """One upstream call and the number of callers still waiting on it."""
+
+    task: "asyncio.Task[Any]"
+    waiters: int = 0
+
+
+class LLMDispatcher:
+    """Single funnel for chat-completion calls.
+
+    - requests/min and tokens/min token buckets keep traffic under provider limits
+    - transient failures retry with full-jitter exponential backoff, honouring Retry-After
+    - a circuit breaker fails fast while the provider is down
+    - identical concurrent requests share one upstream call (singleflight)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4)
+        self._inflight: Dict[str, _Flight] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "failures": 0}
+
+    def _request_key(self, kwargs: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _estimate_tokens(self, kwargs: Dict[str, Any]) -> int:
+        prompt = sum(self.count_tokens(str(m.get("content", ""))) for m in kwargs.get("messages", []))
+        return prompt + int(kwargs.get("max_tokens") or 0)
+
+    async def create(self, client: Any, **kwargs: Any) -> Any:
+        """`client.chat.completions.create(**kwargs)` through the limiter, retries and singleflight.
+
+        The upstream call runs in its own task, so a caller that is cancelled
+        only stops waiting; the call is cancelled once no caller is left.
+        """
+        key = self._request_key(kwargs)
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(self._call_with_retries(client, kwargs)))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _task: self._forget(key, flight))
+        else:
+            self.stats["coalesced"] += 1
+            LLM_COALESCED.inc()
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    async def _call_with_retries(self, client: Any, kwargs: Dict[str, Any]) -> Any:
+        estimated = self._estimate_tokens(kwargs)
+        model = str(kwargs.get("model", "unknown"))
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(estimated)
+                async with self.semaphore:
+                    self.stats["calls"] += 1
+                    LLM_IN_FLIGHT.inc()
+                    started = time.perf_counter()
+                    try:
+                        with span("llm.upstream", attempt=attempt + 1):
+                            response = await client.chat.completions.create(**kwargs)
+                    finally:
+                        LLM_IN_FLIGHT.dec()
+                        LLM_CALL_SECONDS.labels(model).observe(time.perf_counter() - started)
+            except Exception as e:
+                transient = is_transient(e)
+                if transient and _status_code(e) != 429:
+                    self.breaker.record_failure()
+                elif trial:
+                    self.breaker.record_neutral()
+                if not transient or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    LLM_CALLS.labels(model, "failed").inc()
+                    raise LLMError(f"LLM call failed after {attempt + 1} attempt(s): {e}") from e
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self.stats["retries"] += 1
+                LLM_CALLS.labels(model, "retried").inc()
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # cancelled mid-call: free the half-open slot, the call said nothing about the provider
+                if trial:
+                    self.breaker.record_neutral()
+                raise
+
+            self.breaker.record_success()
+            LLM_CALLS.labels(model, "ok").inc()
+            usage = getattr(response, "usage", None)
+            LLM_PROMPT_TOKENS.labels(model).inc(getattr(usage, "prompt_tokens", None) or 0)
+            LLM_CACHED_PROMPT_TOKENS.labels(model).inc(cached_prompt_tokens(response))
+            LLM_COMPLETION_TOKENS.labels(model).inc(getattr(usage, "completion_tokens", None) or 0)
+            used = getattr(usage, "total_tokens", None)
+            if isinstance(used, int) and used < estimated:
+                self.tokens.refund(estimated - used)
+            return response
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+import types
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+try:
+    import llama_cpp
+except ImportError:  # optional: only needed for LLM_PROVIDER=llamacpp
+    llama_cpp = None
+
+PROVIDERS = ("openai", "llamacpp_server", "llamacpp")
+
+# OpenAI models that accept response_format={"type": "json_object"}
+JSON_MODE_MODELS = ("gpt-4o", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-3.5-turbo", "gpt-4.1", "o1", "o3", "o4")
+
+
+def _namespace(value: Any) -> Any:
+    """Turn an OpenAI-shaped dict response into attribute-access objects like the SDK returns."""
+    if isinstance(value, dict):
+        return types.SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class _Chat:
+    def __init__(self, create):
+        self.completions = _Completions(create)
+
+
+class LlamaCppServerClient:
+    """OpenAI-compatible client for a llama.cpp `llama-server` on localhost.
+
+    Requests go to the server's /v1/chat/completions with `cache_prompt`
+    set, so a prompt that shares its prefix with an earlier one (the same
+    file checked against another regulation) reuses that slot's KV cache.
+    Batching happens server-side: start the server with `--parallel N` and
+    concurrent requests are decoded together in one continuous batch.
+    """
+
+    def __init__(self, base_url: str, model: str, timeout: float = 600):
+        self.model = model
+        self._client = AsyncOpenAI(base_url=base_url.rstrip("/") + "/v1", api_key="not-needed", timeout=timeout)
+        self.chat = _Chat(self._create)
+
+    async def _create(self, **kwargs: Any) -> Any:
+        extra_body = {"cache_prompt": True, **kwargs.pop("extra_body", {})}
+        return await self._client.chat.completions.create(**{**kwargs, "model": self.model}, extra_body=extra_body)
+
+
+class LlamaCppLocalClient:
+    """In-process GGUF inference through the optional `llama_cpp` package.
+
+    llama.cpp decodes one sequence at a time here, so requests arriving
+    within `batch_window` seconds are collected into a micro-batch and run
+    back to back, ordered so prompts with a common prefix are adjacent.
+    The model's prompt cache then only has to evaluate each prompt's
+    suffix after the first one.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        model: str,
+        n_ctx: int = 8192,
+        n_threads: Optional[int] = None,
+        n_gpu_layers: int = 0,
+        batch_window: float = 0.01,
+        cache_bytes: int = 2 << 30,
+    ):
+        if llama_cpp is None:
+            raise RuntimeError("LLM_PROVIDER=llamacpp needs the llama-cpp-python package installed.")
+        self.model = model
+        self.batch_window = batch_window
+        self._llama = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads or os.cpu_count(),
+            n_gpu_layers=n_gpu_layers,
+            verbose=False,
+        )
+        self._llama.set_cache(llama_cpp.LlamaRAMCache(capacity_bytes=cache_bytes))
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._runner: Optional[asyncio.Task] = None
+        self.chat = _Chat(self._create)
+
+    async def _create(self, **kwargs: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((kwargs, future))
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run_batches())
+        return await future
+
+    async def _run_batches(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.batch_window)
+            batch, self._pending = self._pending, []
+            batch.sort(key=lambda item: str(item[0].get("messages")))
+            for kwargs, future in batch:
+                if future.cancelled():
+                    continue
+                try:
+                    response = await asyncio.to_thread(self._complete, kwargs)
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(response)
+
+    def _complete(self, kwargs: Dict[str, Any]) -> Any:
+        options = {k: kwargs[k] for k in ("temperature", "max_tokens", "top_p", "stop", "response_format") if k in kwargs}
+        response = self._llama.create_chat_completion(messages=kwargs["messages"], **options)
+        response.setdefault("created", int(time.time()))
+        response["model"] = self.model
+        return _namespace(response)
+
+
+def json_response_format(provider: str, model: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """response_format that constrains output to JSON, or None if the model can't do it.
+
+    llama.cpp compiles the schema into a sampling grammar, so output always
+    matches it. OpenAI JSON mode guarantees well-formed JSON only.
+    """
+    if provider in ("llamacpp_server", "llamacpp"):
+        return {"type": "json_object", "schema": schema}
+    if provider == "openai" and model.startswith(JSON_MODE_MODELS):
+        return {"type": "json_object"}
+    return None
+
+
+def cached_prompt_tokens(response: Any) -> int:
+    """Prompt tokens the provider served from its prompt cache, or 0 if it doesn't say."""
+    details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    if isinstance(cached, int):
+        return cached
+    # llama-server reports KV-cache reuse in its own timings block
+    timings = getattr(response, "timings", None)
+    cache_n = timings.get("cache_n") if isinstance(timings, dict) else getattr(timings, "cache_n", None)
+    return cache_n if isinstance(cache_n, int) else 0
+
+
+def create_client(provider: str, model: str) -> Optional[Any]:
+    """Build the chat client for `provider`; None when the provider isn't configured (e.g. no OpenAI key)."""
+    if provider == "openai":
+        # OPENAI_BASE_URL is read by the SDK, so any OpenAI-compatible endpoint works too
+        return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
+    if provider == "llamacpp_server":
+        return LlamaCppServerClient(os.getenv("LLAMA_SERVER_URL", "http://localhost:8080"), model)
+    if provider == "llamacpp":
+        model_path = os.getenv("LLAMA_MODEL_PATH")
+        if not model_path:
+            raise RuntimeError("LLM_PROVIDER=llamacpp needs LLAMA_MODEL_PATH pointing at a GGUF file.")
+        return LlamaCppLocalClient(
+            model_path,
+            model,
+            n_ctx=int(os.getenv("LLAMA_N_CTX", "8192")),
+            n_threads=int(os.getenv("LLAMA_N_THREADS", "0")) or None,
+            n_gpu_layers=int(os.getenv("LLAMA_N_GPU_LAYERS", "0")),
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER {provider!r}; expected one of {', '.join(PROVIDERS)}.")
@@ -1,21 +1,145 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
 from fastapi_mcp import FastApiMCP
 import uvicorn
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Literal, Tuple
+import asyncio
 import json
+import time
+from contextlib import asynccontextmanager
+from result_cache import ResultCache, content_hash, make_cache_key
+from rule_store import DuplicateRuleError, RuleStore
+from job_queue import JobStore, JobWorkerPool
+from llm_dispatch import LLMDispatcher, LLMError
+from llm_providers import create_client
+from llm_cassette import with_cassette
+from metrics import Counter, Gauge, Histogram, render_metrics
+from tracing import configure as configure_tracing, span, start_trace
+from source_render import parse_elide
+from rule_engine import RuleEngine, source_prompt_prefix
+from llm_call_analyzer import DetectedCall, find_llm_calls
+from token_estimation import count_tokens, estimate_call_tokens
+from repository_scan import SourceFile, is_archive, read_archive
+from cost_projection import EntryPointProjection, poly_eval, poly_label, project_costs
+from code_units import chunk_source, remap_violations
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="OpenAI MCP Server")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_workers.start()
+    try:
+        yield
+    finally:
+        await job_workers.stop()
+
+app = FastAPI(title="OpenAI MCP Server", lifespan=lifespan)
+
+# Share of requests and jobs traced (0 = off), and the JSONL file finished traces are appended to
+configure_tracing(os.getenv("TRACE_FILE", "traces.jsonl"), float(os.getenv("TRACE_SAMPLE_RATE", "0")))
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to response start, by route (streams keep running after).", ["method", "route"],
+)
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status code.", ["method", "route", "status"])
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    with start_trace(request.method, **{"http.method": request.method}) as root:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if root.trace_id:
+                response.headers["X-Trace-Id"] = root.trace_id
+            return response
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # label by route template, never the raw path, so ids in URLs don't create new series
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(request.method, route, status).inc()
+            root.rename(f"{request.method} {route}")
+            root.set(**{"http.route": route, "http.status_code": status})
 
-# Initialize OpenAI client
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Which backend serves the checkers: "openai" (or any OpenAI-compatible URL via OPENAI_BASE_URL),
+# "llamacpp_server" (a local llama.cpp server) or "llamacpp" (in-process GGUF model)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+# Model used by the compliance and cost checkers; part of every cache key
+CHECK_MODEL = os.getenv("CHECK_MODEL", "gpt-4")
+
+# Chat client for the provider (None when no key is configured; static analysis still works).
+# LLM_CASSETTE_MODE=record saves every response under LLM_CASSETTE_DIR, replay serves them offline.
+client = with_cassette(
+    create_client(LLM_PROVIDER, CHECK_MODEL),
+    os.getenv("LLM_CASSETTE_MODE", "passthrough"),
+    os.getenv("LLM_CASSETTE_DIR", "cassettes"),
+)
+
+# Cap on concurrent LLM calls, shared by all in-flight checks
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+
+# Every LLM call goes through one dispatcher: rate limits (0 = unlimited), retries, circuit breaker
+llm_dispatcher = LLMDispatcher(
+    max_concurrency=LLM_CONCURRENCY,
+    requests_per_minute=float(os.getenv("LLM_RPM", "0")),
+    tokens_per_minute=float(os.getenv("LLM_TPM", "0")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+    backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+    backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "30")),
+    breaker_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+    breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    count_tokens=lambda text: count_tokens(text, CHECK_MODEL),
+)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Completion-token budget per checker call; a truncated answer is retried once with double
+OUTPUT_MAX_TOKENS = int(os.getenv("OUTPUT_MAX_TOKENS", "2000"))
+
+# What to leave out of the line-numbered source sent to the LLM: any of blank, comments, docstrings
+# (eliding all three cuts the numbered prompt by 10-26% on the sample files and main.py)
+PROMPT_ELIDE = parse_elide(os.getenv("PROMPT_ELIDE", "blank,comments,docstrings"))
+# Line-number anchor spacing in that source; sparser anchors make the model count lines
+PROMPT_NUMBER_EVERY = max(1, int(os.getenv("PROMPT_NUMBER_EVERY", "1")))
+
+# Rule/file pairs scoring below this keyword relevance are not sent to the LLM; off (0) by default
+# because keyword matching can't see every way code touches a rule (it can skip true positives)
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0"))
+
+# Prompt-token budget for a single call in batched check mode
+BATCH_MAX_PROMPT_TOKENS = int(os.getenv("BATCH_MAX_PROMPT_TOKENS", "6000"))
+
+# Sources larger than this are split into chunks that are analysed in parallel
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "3000"))
+
+# Limits for /check-repository
+REPOSITORY_WORKERS = int(os.getenv("REPOSITORY_WORKERS", "4"))
+REPOSITORY_MAX_FILES = int(os.getenv("REPOSITORY_MAX_FILES", "10000"))
+REPOSITORY_MAX_FILE_BYTES = int(os.getenv("REPOSITORY_MAX_FILE_BYTES", "1000000"))
+
+CheckMode = Literal["per_rule", "batched"]
+
+# Bump whenever a checker prompt changes so stale cached results aren't reused
+PROMPT_VERSION = "4"
+# Bump whenever the static cost analyzer's output changes
+COST_ANALYZER_VERSION = "2"
+
+# Content-addressed cache of check results (in-memory LRU + SQLite)
+result_cache = ResultCache(
+    path=os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3") or None,
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600))),
+)
 
 class PromptRequest(BaseModel):
     prompt: str
@@ -27,8 +151,11 @@ class PromptRequest(BaseModel):
 async def process_prompt(request: PromptRequest):
     try:
         print(request)
+        if client is None:
+            raise RuntimeError("No LLM client configured; set OPENAI_API_KEY or choose another LLM_PROVIDER.")
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = await llm_dispatcher.create(
+            client,
             model=request.model,
             messages=[
                 {"role": "user", "content": request.prompt}
@@ -45,10 +172,11 @@ async def process_prompt(request: PromptRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# In-memory storage for regulations
-stored_regulations: List[Dict[str, str]] = []
-# In-memory storage for code rules
-stored_code_rules: List[Dict[str, str]] = []
+# Regulations and code rules, keyed by id and persisted to SQLite (empty path = memory only).
+# Every uvicorn worker opening the same file sees the same, versioned rule set.
+RULE_STORE_PATH = os.getenv("RULE_STORE_PATH", "rules.sqlite3") or None
+regulation_store = RuleStore(RULE_STORE_PATH, table="regulations")
+code_rule_store = RuleStore(RULE_STORE_PATH, table="code_rules")
 
 # Models
 class Regulation(BaseModel):
@@ -78,199 +206,405 @@ class CheckRegulationsResponse(BaseModel):
     total_lines: int
     violations: List[RegulationViolation]
     total_violations: int
+    mode: str = "per_rule"
+    llm_requests: int = 0
+    cache: Dict[str, str] = {}
+    errors: Dict[str, str] = {}  # rule id -> why it could not be checked
+    incomplete: Dict[str, str] = {}  # rule id -> why some of its violations may be missing
+    input_tokens_saved: int = 0  # prompt tokens saved by eliding lines from the numbered source
+    prompt_tokens: int = 0  # prompt tokens billed, as reported by the provider
+    cached_prompt_tokens: int = 0  # of those, served from the provider's prompt cache
+    skipped: Dict[str, str] = {}  # rule id -> why the relevance filter didn't send it to the LLM
+    units_total: Optional[int] = None
+    units_reanalyzed: Optional[int] = None
 
 class CheckCodeResponse(BaseModel):
     filename: str
     total_lines: int
     violations: List[CodeViolation]
     total_violations: int
-
-def parse_json_response(response: str) -> Dict:
-    response = response.strip()
-    if response.startswith("```json"):
-        response = response[7:]  # Remove the leading ```json
-    if response.startswith("```"):
-        response = response[3:]  # Remove the leading ```
-    if response.endswith("```"):
-        response = response[:-3]  # Remove the trailing ```
-    return json.loads(response.strip())
+    mode: str = "per_rule"
+    llm_requests: int = 0
+    cache: Dict[str, str] = {}
+    errors: Dict[str, str] = {}  # rule id -> why it could not be checked
+    incomplete: Dict[str, str] = {}  # rule id -> why some of its violations may be missing
+    input_tokens_saved: int = 0  # prompt tokens saved by eliding lines from the numbered source
+    prompt_tokens: int = 0  # prompt tokens billed, as reported by the provider
+    cached_prompt_tokens: int = 0  # of those, served from the provider's prompt cache
+    skipped: Dict[str, str] = {}  # rule id -> why the relevance filter didn't send it to the LLM
+    units_total: Optional[int] = None
+    units_reanalyzed: Optional[int] = None
 
 @app.post("/add-regulations", summary="Add regulations")
 async def add_regulations(regulations: List[Regulation]):
-    global stored_regulations
-    for regulation in regulations:
-        if regulation.id in [reg["id"] for reg in stored_regulations]:
-            raise HTTPException(status_code=400, detail=f"Regulation ID {regulation.id} already exists.")
-        stored_regulations.append(regulation.dict())
+    try:
+        regulation_store.add([regulation.model_dump() for regulation in regulations])
+    except DuplicateRuleError as e:
+        raise HTTPException(status_code=400, detail=f"Regulation ID {', '.join(e.ids)} already exists.")
     return {"status": "success", "added_regulations": regulations}
 
 @app.post("/add-code-rules", summary="Add code rules")
 async def add_code_rules(code_rules: List[CodeRule]):
-    global stored_code_rules
-    for rule in code_rules:
-        if rule.id in [r["id"] for r in stored_code_rules]:
-            raise HTTPException(status_code=400, detail=f"Code Rule ID {rule.id} already exists.")
-        stored_code_rules.append(rule.dict())
+    try:
+        code_rule_store.add([rule.model_dump() for rule in code_rules])
+    except DuplicateRuleError as e:
+        raise HTTPException(status_code=400, detail=f"Code Rule ID {', '.join(e.ids)} already exists.")
     return {"status": "success", "added_code_rules": code_rules}
 
+@app.put("/upsert-regulations", summary="Insert or replace regulations by id in one transaction")
+async def upsert_regulations(regulations: List[Regulation]):
+    inserted, updated = regulation_store.upsert([regulation.model_dump() for regulation in regulations])
+    return {"status": "success", "inserted": inserted, "updated": updated}
+
+@app.put("/upsert-code-rules", summary="Insert or replace code rules by id in one transaction")
+async def upsert_code_rules(code_rules: List[CodeRule]):
+    inserted, updated = code_rule_store.upsert([rule.model_dump() for rule in code_rules])
+    return {"status": "success", "inserted": inserted, "updated": updated}
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def conditional_rules_response(store: RuleStore, if_none_match: Optional[str]) -> Response:
+    """The store's rules with an ETag, or an empty 304 if the client's copy is current."""
+    version, rules = store.snapshot()
+    etag = f'"{version}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(rules, headers={"ETag": etag})
+
 @app.get("/get-regulations", summary="Get the active list of regulations")
-async def get_regulations():
-    return stored_regulations
+async def get_regulations(if_none_match: Optional[str] = Header(None)):
+    return conditional_rules_response(regulation_store, if_none_match)
 
 @app.get("/get-code-rules", summary="Get the active list of code rules")
-async def get_code_rules():
-    return stored_code_rules
+async def get_code_rules(if_none_match: Optional[str] = Header(None)):
+    return conditional_rules_response(code_rule_store, if_none_match)
 
 @app.delete("/delete-regulations", summary="Delete regulations")
 async def delete_regulations(regulation_id: str):
-    global stored_regulations
-    stored_regulations = [reg for reg in stored_regulations if reg["id"] != regulation_id]
+    regulation_store.delete([regulation_id])
     return {"status": "success", "deleted_regulation_id": regulation_id}
 
 @app.delete("/delete-code-rules", summary="Delete code rules")
 async def delete_code_rules(code_rule_id: str):
-    global stored_code_rules
-    stored_code_rules = [rule for rule in stored_code_rules if rule["id"] != code_rule_id]
+    code_rule_store.delete([code_rule_id])
     return {"status": "success", "deleted_code_rule_id": code_rule_id}
 
+@app.post("/bulk-delete-regulations", summary="Delete many regulations by id in one transaction")
+async def bulk_delete_regulations(regulation_ids: List[str]):
+    deleted = regulation_store.delete(regulation_ids)
+    return {"status": "success", "deleted_regulation_ids": deleted, "not_found": sorted(set(regulation_ids) - set(deleted))}
+
+@app.post("/bulk-delete-code-rules", summary="Delete many code rules by id in one transaction")
+async def bulk_delete_code_rules(code_rule_ids: List[str]):
+    deleted = code_rule_store.delete(code_rule_ids)
+    return {"status": "success", "deleted_code_rule_ids": deleted, "not_found": sorted(set(code_rule_ids) - set(deleted))}
+
+def estimate_tokens(text: str) -> int:
+    return count_tokens(text, CHECK_MODEL)
+
+async def llm_chat(**kwargs: Any) -> Any:
+    if client is None:
+        raise RuntimeError("No LLM client configured; set OPENAI_API_KEY or choose another LLM_PROVIDER.")
+    return await llm_dispatcher.create(client, **kwargs)
+
+# One engine runs regulation and code-rule checks alike
+rule_engine = RuleEngine(
+    llm_chat,
+    result_cache,
+    model=CHECK_MODEL,
+    provider=LLM_PROVIDER,
+    prompt_version=PROMPT_VERSION,
+    count_tokens=estimate_tokens,
+    chunk_max_tokens=CHUNK_MAX_TOKENS,
+    output_max_tokens=OUTPUT_MAX_TOKENS,
+    elide=PROMPT_ELIDE,
+    number_every=PROMPT_NUMBER_EVERY,
+    relevance_threshold=RELEVANCE_THRESHOLD,
+)
+
+LLM_CALLS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "llm_calls": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "start_line": {"type": "integer"},
+                    "end_line": {"type": "integer"},
+                    "model": {"type": "string"},
+                    "estimated_input_tokens": {"type": "integer"},
+                    "estimated_output_tokens": {"type": "integer"},
+                    "call_type": {"type": "string"},
+                    "description": {"type": "string"},
+                },
+                "required": ["start_line", "end_line", "model", "estimated_input_tokens", "estimated_output_tokens", "call_type", "description"],
+            },
+        },
+    },
+    "required": ["llm_calls"],
+}
+
+async def analyze_rules(
+    kind: str,
+    id_key: str,
+    violation_model: type,
+    response_model: type,
+    filename: str,
+    file_content: str,
+    rules: List[Dict[str, str]],
+    mode: str,
+    max_prompt_tokens: int,
+    use_cache: bool,
+    incremental: bool,
+    force_all: bool,
+):
+    outcome = await rule_engine.check(
+        kind, id_key, rules, file_content,
+        mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+        incremental=incremental, force_all=force_all, filename=filename,
+    )
+    # Build the Pydantic response
+    with span("build_response", violations=len(outcome.violations)):
+        return response_model(
+            filename=filename,
+            total_lines=len(file_content.splitlines()),
+            violations=[violation_model(**v) for v in outcome.violations],
+            total_violations=len(outcome.violations),
+            mode=mode,
+            **outcome.model_dump(exclude={"violations"}),
+        )
+
+async def analyze_regulations(
+    filename: str,
+    file_content: str,
+    regulations: List[Dict[str, str]],
+    mode: str = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+) -> CheckRegulationsResponse:
+    return await analyze_rules(
+        "regulation", "regulation_id", RegulationViolation, CheckRegulationsResponse, filename, file_content, regulations,
+        mode, max_prompt_tokens, use_cache, incremental, force_all,
+    )
+
+async def analyze_code_rules(
+    filename: str,
+    file_content: str,
+    code_rules: List[Dict[str, str]],
+    mode: str = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+) -> CheckCodeResponse:
+    return await analyze_rules(
+        "code rule", "code_rule_id", CodeViolation, CheckCodeResponse, filename, file_content, code_rules,
+        mode, max_prompt_tokens, use_cache, incremental, force_all,
+    )
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_regulation_checks(
+    filename: str,
+    file_content: str,
+    regulations: List[Dict[str, str]],
+    mode: str = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+):
+    """Yield SSE events as each regulation's check finishes, then a summary.
+
+    Regulations are checked independently (or per prompt batch in batched
+    mode) so results can be sent as soon as their LLM calls return. The
+    relevance filter runs once over the whole set up front, so its choices
+    match the non-streaming endpoint.
+    """
+    file_lines = file_content.splitlines()
+    relevant, skipped = regulations, {}
+    if not force_all:
+        relevant, skipped = rule_engine.relevant(regulations, file_content)
+    if mode == "batched":
+        groups = rule_engine.plan_batches(
+            "regulation", "regulation_id", relevant, rule_engine.render(file_content), max_prompt_tokens,
+        )
+    else:
+        groups = [[regulation] for regulation in relevant]
+
+    async def run_group(group: List[Dict[str, str]]):
+        try:
+            outcome = await rule_engine.check(
+                "regulation", "regulation_id", group, file_content,
+                mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+                incremental=incremental, force_all=True, filename=filename,
+            )
+            return group, outcome, None
+        except Exception as e:
+            return group, None, str(e)
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(run_group(group)) for group in groups]
+    by_rule: Dict[str, List[Dict]] = {}
+    cache_status: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    incomplete: Dict[str, str] = {}
+    llm_requests = 0
+    tokens_saved = 0
+    prompt_tokens = 0
+    cached_prompt_tokens = 0
+    units_total: Optional[int] = None
+    units_reanalyzed: Optional[int] = None
+    try:
+        yield sse_event("start", {"filename": filename, "total_lines": len(file_lines), "total_regulations": len(regulations)})
+        for regulation_id, reason in skipped.items():
+            yield sse_event("skipped", {"regulation_id": regulation_id, "reason": reason})
+        for finished in asyncio.as_completed(tasks):
+            group, outcome, error = await finished
+            if outcome is not None:
+                llm_requests += outcome.llm_requests
+                tokens_saved += outcome.input_tokens_saved
+                prompt_tokens += outcome.prompt_tokens
+                cached_prompt_tokens += outcome.cached_prompt_tokens
+                cache_status.update(outcome.cache)
+                if outcome.units_total is not None:
+                    units_total = outcome.units_total
+                    units_reanalyzed = max(units_reanalyzed or 0, outcome.units_reanalyzed)
+            for regulation in group:
+                regulation_id = regulation.get("id", "unknown")
+                rule_error = error if outcome is None else outcome.errors.get(regulation_id)
+                if rule_error is not None:
+                    errors[regulation_id] = rule_error
+                    yield sse_event("error", {"regulation_id": regulation_id, "error": rule_error})
+                    continue
+                violations = [v for v in outcome.violations if v.get("regulation_id") == regulation_id]
+                by_rule[regulation_id] = violations
+                event = {
+                    "regulation_id": regulation_id,
+                    "violations": [RegulationViolation(**v).model_dump() for v in violations],
+                    "cache": outcome.cache.get(regulation_id, "miss"),
+                }
+                if regulation_id in outcome.incomplete:
+                    incomplete[regulation_id] = event["incomplete"] = outcome.incomplete[regulation_id]
+                yield sse_event("regulation", event)
+            yield sse_event("progress", {
+                "completed": len(by_rule) + len(errors) + len(skipped),
+                "total": len(regulations),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+
+        violations = [v for regulation in regulations for v in by_rule.get(regulation.get("id", "unknown"), [])]
+        summary = CheckRegulationsResponse(
+            filename=filename,
+            total_lines=len(file_lines),
+            violations=[RegulationViolation(**v) for v in violations],
+            total_violations=len(violations),
+            mode=mode,
+            llm_requests=llm_requests,
+            cache=cache_status,
+            input_tokens_saved=tokens_saved,
+            prompt_tokens=prompt_tokens,
+            cached_prompt_tokens=cached_prompt_tokens,
+            skipped=skipped,
+            units_total=units_total,
+            units_reanalyzed=units_reanalyzed,
+        )
+        summary.errors = errors
+        summary.incomplete = incomplete
+        yield sse_event("summary", {
+            **summary.model_dump(),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    finally:
+        # the client disconnected or the stream ended; don't leave checks running
+        for task in tasks:
+            task.cancel()
+
 @app.post("/check-violations", response_model=CheckRegulationsResponse)
 async def check_violations(
     file: Optional[UploadFile] = File(None),
     file_str: Optional[str] = None,
+    mode: CheckMode = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
 ) -> CheckRegulationsResponse:
-    if not stored_regulations:
+    if not len(regulation_store):
         raise HTTPException(status_code=400, detail="No regulations are currently set.")
 
+    filename, file_content = await read_source(file, file_str)
     try:
-        if file is not None:
-            content = await file.read()
-            file_content = content.decode("utf-8")
-            filename = file.filename
-        elif file_str is not None:
-            file_content = file_str
-            filename = "string_input.py"
-        else:
-            raise HTTPException(status_code=400, detail="No file or file_str provided.")
-        file_lines = file_content.splitlines()
-
-        violations: List[Dict] = []
-
-        for regulation in stored_regulations:
-            reg_id = regulation.get("id", "unknown")
-            reg_description = regulation.get("description", "No description")
-            
-            prompt = (
-                f"Analyze the following code for violations of regulation {reg_id!r}:\n"
-                f"{reg_description}\n\n"
-                "```python\n"
-                f"{file_content}\n"
-                "```\n\n"
-                "Return ONLY valid JSON in the form:\n"
-                '{ "violations": [ '
-                '{ "start_line": int, "end_line": int, '
-                '"description": str, "severity": "low"|"medium"|"high" } '
-                '] }\n'
-                "If there are no violations, return: { \"violations\": [] }"
-                "Be specific with the lines of code that are violating the regulation - don't just give wide ranges."
-            )
-            
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=2000,
-            )
-            
-            try:
-                result = parse_json_response(response.choices[0].message.content)
-                reg_violations = result.get("violations", [])
-            except json.JSONDecodeError:
-                # fallback if the LLM returns non‑JSON
-                reg_violations = [{
-                    "start_line": 1,
-                    "end_line": len(file_lines),
-                    "description": "Error parsing model output; manual review required.",
-                    "severity": "medium",
-                }]
-            
-            # annotate with regulation_id
-            for v in reg_violations:
-                v["regulation_id"] = reg_id
-            violations.extend(reg_violations)
-        
-        # Build the Pydantic response
-        return CheckRegulationsResponse(
-            filename=filename,
-            total_lines=len(file_lines),
-            violations=[RegulationViolation(**v) for v in violations],
-            total_violations=len(violations),
+        # Snapshot so concurrent add/delete calls don't change the set mid-check
+        regulations = regulation_store.all()
+        return await analyze_regulations(
+            filename, file_content, regulations,
+            mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+            incremental=incremental and file is not None, force_all=force_all,
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(
+    "/check-violations/stream",
+    summary="Check regulations, streaming each regulation's result as server-sent events",
+)
+async def check_violations_stream(
+    file: Optional[UploadFile] = File(None),
+    file_str: Optional[str] = None,
+    mode: CheckMode = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+) -> StreamingResponse:
+    if not len(regulation_store):
+        raise HTTPException(status_code=400, detail="No regulations are currently set.")
+
+    filename, file_content = await read_source(file, file_str)
+
+    regulations = regulation_store.all()
+    return StreamingResponse(
+        stream_regulation_checks(
+            filename, file_content, regulations,
+            mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+            incremental=incremental and file is not None, force_all=force_all,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @app.post("/check-code-violations", response_model=CheckCodeResponse)
-async def check_code_violations(file: UploadFile = File(...)) -> CheckCodeResponse:
-    if not stored_code_rules:
+async def check_code_violations(
+    file: UploadFile = File(...),
+    mode: CheckMode = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+) -> CheckCodeResponse:
+    if not len(code_rule_store):
         raise HTTPException(status_code=400, detail="No code rules are currently set.")
 
+    filename, file_content = await read_source(file, None)
     try:
-        content = await file.read()
-        file_content = content.decode("utf-8")
-        file_lines = file_content.splitlines()
-
-        violations: List[Dict] = []
-
-        for code_rule in stored_code_rules:
-            rule_id = code_rule.get("id", "unknown")
-            rule_description = code_rule.get("description", "No description")
-            
-            prompt = (
-                f"Analyze the following code for violations of code rule {rule_id!r}:\n"
-                f"{rule_description}\n\n"
-                "```python\n"
-                f"{file_content}\n"
-                "```\n\n"
-                "Return ONLY valid JSON in the form:\n"
-                '{ "violations": [ '
-                '{ "start_line": int, "end_line": int, '
-                '"description": str, "severity": "low"|"medium"|"high" } '
-                '] }\n'
-                "If there are no violations, return: { \"violations\": [] }"
-                "Be specific with the lines of code that are violating the code rule - don't just give wide ranges."
-            )
-            
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=2000,
-            )
-            
-            try:
-                result = parse_json_response(response.choices[0].message.content)
-                rule_violations = result.get("violations", [])
-            except json.JSONDecodeError:
-                # fallback if the LLM returns non‑JSON
-                rule_violations = [{
-                    "start_line": 1,
-                    "end_line": len(file_lines),
-                    "description": "Error parsing model output; manual review required.",
-                    "severity": "medium",
-                }]
-            
-            # annotate with code_rule_id
-            for v in rule_violations:
-                v["code_rule_id"] = rule_id
-            violations.extend(rule_violations)
-        
-        # Build the Pydantic response
-        return CheckCodeResponse(
-            filename=file.filename,
-            total_lines=len(file_lines),
-            violations=[CodeViolation(**v) for v in violations],
-            total_violations=len(violations),
+        code_rules = code_rule_store.all()
+        return await analyze_code_rules(
+            filename, file_content, code_rules,
+            mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+            incremental=incremental, force_all=force_all,
         )
     
     except Exception as e:
@@ -286,6 +620,27 @@ class LLMCostEstimate(BaseModel):
     estimated_cost: float
     call_type: str
     description: str
+    source: str = "llm"  # "static" when found by the AST analyzer
+    dynamic_inputs: List[str] = []  # runtime values whose token size was assumed
+
+class CallSiteCost(BaseModel):
+    start_line: int
+    end_line: int
+    model: str
+    multiplier: str  # calls per entry-point invocation, e.g. "N" or "3×N^2"
+    calls_per_invocation: float
+    cost_per_invocation: float
+
+class EntryPointCost(BaseModel):
+    name: str
+    start_line: int
+    end_line: int
+    llm_calls_per_invocation: float
+    cost_per_invocation: float
+    cost_per_day: float
+    cost_by_loop_degree: Dict[int, float]  # cost = sum(coefficient * N ** degree)
+    recursive: bool = False
+    call_sites: List[CallSiteCost]
 
 class CheckCostResponse(BaseModel):
     filename: str
@@ -293,133 +648,280 @@ class CheckCostResponse(BaseModel):
     llm_calls: List[LLMCostEstimate]
     total_calls: int
     total_estimated_cost: float
+    cache: str = "miss"
+    loop_iterations: int = 1
+    requests_per_day: int = 1
+    entry_points: List[EntryPointCost] = []
+    errors: Dict[str, str] = {}
+    input_tokens_saved: int = 0  # prompt tokens saved by eliding lines from the numbered source
 
-@app.post(
-    "/check-cost",
-    response_model=CheckCostResponse,
-    summary="Upload code and analyze LLM API calls for cost estimation",
-)
-async def check_cost(
-    file: UploadFile = File(...),
-) -> CheckCostResponse:
-    try:
-        # Read & split the file
-        content = await file.read()
-        file_content = content.decode("utf-8")
-        file_lines = file_content.splitlines()
-        
-        
-        # Model pricing information (USD per 1000 tokens)
-        model_pricing = {
-            # OpenAI models
-            "gpt-4o": {"input": 5.0, "output": 15.0},
-            "gpt-4": {"input": 10.0, "output": 30.0},
-            "gpt-4-turbo": {"input": 10.0, "output": 30.0},
-            "gpt-4-32k": {"input": 20.0, "output": 60.0},
-            "gpt-3.5-turbo": {"input": 0.5, "output": 1.5},
-            "text-embedding-ada-002": {"input": 0.1, "output": 0.0},
-            
-            # Anthropic models
-            "claude-3-opus": {"input": 15.0, "output": 75.0},
-            "claude-3-sonnet": {"input": 3.0, "output": 15.0},
-            "claude-3-haiku": {"input": 0.25, "output": 1.25},
-            "claude-2": {"input": 8.0, "output": 24.0},
-            "claude-instant": {"input": 1.63, "output": 5.51},
-            
-            # Default for unknown models
-            "default": {"input": 5.0, "output": 15.0}
-        }
-        
-        # Analyze the file for LLM API calls
-        prompt = (
-
-            "You are a JSON-only API. Do not include explanations, markdown, or code blocks.\n\n"
-            "Analyze the following code to identify all Large Language Model (LLM) API calls. "
-            "Return a JSON object only. No prose, comments, or formatting.\n\n"
-            "```python\n"
-            f"{file_content}\n"
-            "```\n\n"
-            "For each LLM API call, provide the following information in a JSON object:\n"
-            "1. start_line: The line number where the API call starts (integer)\n"
-            "2. end_line: The line number where the API call ends (integer)\n"
-            "3. model: The LLM model being used (string, e.g., 'gpt-4', 'claude-3')\n"
-            "4. estimated_input_tokens: Estimate the number of input tokens (integer)\n"
-            "5. estimated_output_tokens: Estimate the number of output tokens (integer)\n"
-            "6. call_type: Type of call (e.g., 'chat', 'completion', 'embedding')\n"
-            "7. description: Brief description of what the API call is doing\n\n"
-            
-            "For token estimation:\n"
-            "- For chat/completion calls, estimate based on prompt length and context\n"
-            "- For RAG applications, assume 4000 tokens of context per call\n"
-            "- For embeddings, count only input tokens\n\n"
-            
-            "Return a JSON object with this structure:\n"
-            "{\n"
-            "  \"llm_calls\": [\n"
-            "    {\n"
-            "      \"start_line\": 10,\n"
-            "      \"end_line\": 20,\n"
-            "      \"model\": \"gpt-4\",\n"
-            "      \"estimated_input_tokens\": 2500,\n"
-            "      \"estimated_output_tokens\": 500,\n"
-            "      \"call_type\": \"chat\",\n"
-            "      \"description\": \"Chat completion call to summarize text\"\n"
-            "    }\n"
-            "  ]\n"
-            "}\n"
-            "If no LLM API calls are found, return: {\"llm_calls\": []}"
-        )
+# Model pricing information (USD per 1000 tokens)
+MODEL_PRICING = {
+    # OpenAI models
+    "gpt-4o": {"input": 5.0, "output": 15.0},
+    "gpt-4": {"input": 10.0, "output": 30.0},
+    "gpt-4-turbo": {"input": 10.0, "output": 30.0},
+    "gpt-4-32k": {"input": 20.0, "output": 60.0},
+    "gpt-3.5-turbo": {"input": 0.5, "output": 1.5},
+    "text-embedding-ada-002": {"input": 0.1, "output": 0.0},
+    
+    # Anthropic models
+    "claude-3-opus": {"input": 15.0, "output": 75.0},
+    "claude-3-sonnet": {"input": 3.0, "output": 15.0},
+    "claude-3-haiku": {"input": 0.25, "output": 1.25},
+    "claude-2": {"input": 8.0, "output": 24.0},
+    "claude-instant": {"input": 1.63, "output": 5.51},
+    
+    # Default for unknown models
+    "default": {"input": 5.0, "output": 15.0}
+}
+
+def build_cost_prompt(file_content: str) -> str:
+    # file_content is already rendered by rule_engine.render; it leads so the
+    # prompt shares its prefix with the rule checks of the same file
+    return source_prompt_prefix(file_content) + (
+        "You are a JSON-only API. Do not include explanations, markdown, or code blocks.\n\n"
+        "Analyze the code above to identify all Large Language Model (LLM) API calls. "
+        "Return a JSON object only. No prose, comments, or formatting.\n\n"
+        "For each LLM API call, provide the following information in a JSON object:\n"
+        "1. start_line: The line number where the API call starts (integer)\n"
+        "2. end_line: The line number where the API call ends (integer)\n"
+        "3. model: The LLM model being used (string, e.g., 'gpt-4', 'claude-3')\n"
+        "4. estimated_input_tokens: Estimate the number of input tokens (integer)\n"
+        "5. estimated_output_tokens: Estimate the number of output tokens (integer)\n"
+        "6. call_type: Type of call (e.g., 'chat', 'completion', 'embedding')\n"
+        "7. description: Brief description of what the API call is doing\n\n"
         
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=2000,
-        )
+        "For token estimation:\n"
+        "- For chat/completion calls, estimate based on prompt length and context\n"
+        "- For RAG applications, assume 4000 tokens of context per call\n"
+        "- For embeddings, count only input tokens\n\n"
         
-        try:
-            result = parse_json_response(response.choices[0].message.content)
-            
-            llm_calls = result.get("llm_calls", [])
-        except json.JSONDecodeError:
-            
-            # Fallback if the LLM returns non-JSON
-            llm_calls = [{
+        "Return a JSON object with this structure:\n"
+        "{\n"
+        "  \"llm_calls\": [\n"
+        "    {\n"
+        "      \"start_line\": 10,\n"
+        "      \"end_line\": 20,\n"
+        "      \"model\": \"gpt-4\",\n"
+        "      \"estimated_input_tokens\": 2500,\n"
+        "      \"estimated_output_tokens\": 500,\n"
+        "      \"call_type\": \"chat\",\n"
+        "      \"description\": \"Chat completion call to summarize text\"\n"
+        "    }\n"
+        "  ]\n"
+        "}\n"
+        "If no LLM API calls are found, return: {\"llm_calls\": []}"
+    )
+
+async def find_llm_calls_with_llm(file_content: str) -> Tuple[List[Dict], bool, int]:
+    """Ask the LLM to locate API calls, chunking large files; returns (calls, all chunks parsed, input tokens saved)."""
+    chunks = chunk_source(file_content, CHUNK_MAX_TOKENS, estimate_tokens)
+    rendered = [rule_engine.render(chunk.text) for chunk in chunks]
+    tokens_saved = sum(rule_engine.tokens_saved(chunk.text, text) for chunk, text in zip(chunks, rendered))
+    outputs = await asyncio.gather(*(
+        rule_engine.complete_json_list(build_cost_prompt(text), "llm_calls", LLM_CALLS_SCHEMA) for text in rendered
+    ))
+
+    llm_calls: List[Dict] = []
+    parsed_all = True
+    seen = set()
+    for chunk, (chunk_calls, done) in zip(chunks, outputs):
+        parsed_all = parsed_all and done
+        if not done and not chunk_calls:
+            # Fallback if nothing could be recovered: flag just this chunk
+            chunk_calls = [{
                 "start_line": 1,
-                "end_line": len(file_lines),
+                "end_line": len(chunk.line_map),
                 "model": "unknown",
                 "estimated_input_tokens": 0,
                 "estimated_output_tokens": 0,
                 "call_type": "unknown",
                 "description": "Error parsing model output; manual review required."
             }]
+        for call in remap_violations(chunk_calls, chunk.line_map):
+            # the same call can be reported by chunks sharing context lines
+            key = (call["start_line"], call["end_line"])
+            if key not in seen:
+                seen.add(key)
+                llm_calls.append(call)
+    return llm_calls, parsed_all, tokens_saved
+
+PROVIDER_LABELS = {"openai": "OpenAI", "anthropic": "Anthropic", "langchain": "LangChain"}
+
+def estimate_static_call(call: DetectedCall) -> Dict:
+    tokens = estimate_call_tokens(call)
+    where = f" in {call.function}()" if call.function else ""
+    model_note = f"model from {call.model_origin}" if call.model else "model could not be resolved"
+    return {
+        "start_line": call.start_line,
+        "end_line": call.end_line,
+        "model": call.model or "unknown",
+        "estimated_input_tokens": tokens.input_tokens,
+        "estimated_output_tokens": tokens.output_tokens,
+        "call_type": call.call_type,
+        "description": f"{PROVIDER_LABELS.get(call.provider, call.provider)} {call.call_type} call{where} via {call.receiver} ({model_note})",
+        "source": "static",
+        "dynamic_inputs": tokens.dynamic_inputs,
+    }
+
+async def find_llm_calls_static_first(file_content: str) -> Tuple[List[Dict], bool, Optional[str], int]:
+    """Locate API calls with the AST analyzer, asking the LLM only about calls it couldn't resolve.
+
+    Returns (calls, complete, LLM error, input tokens saved). If the LLM
+    fallback fails or no client is configured, the static results are
+    returned on their own and marked incomplete, so they aren't cached.
+    """
+    with span("static_analysis") as static_span:
+        scan = find_llm_calls(file_content)
+        static_span.set(calls=len(scan.calls), unresolved=len(scan.unresolved))
+    resolved = [estimate_static_call(call) for call in scan.calls if call.resolved]
+    unresolved = [estimate_static_call(call) for call in scan.unresolved]
+    if not scan.needs_llm:
+        calls = sorted(resolved + unresolved, key=lambda c: (c["start_line"], c["end_line"]))
+        return calls, True, None, 0
+    if client is None:
+        # unresolved calls keep their default estimates; incomplete, so a configured provider can refine them later
+        calls = sorted(resolved + unresolved, key=lambda c: (c["start_line"], c["end_line"]))
+        return calls, False, "No LLM client configured to resolve dynamic calls; their estimates are defaults.", 0
+
+    try:
+        llm_calls, parsed_all, tokens_saved = await find_llm_calls_with_llm(file_content)
+    except LLMError as e:
+        calls = sorted(resolved + unresolved, key=lambda c: (c["start_line"], c["end_line"]))
+        return calls, False, str(e), 0
+
+    def overlaps(a: Dict, b: Dict) -> bool:
+        return a["start_line"] <= b["end_line"] and b["start_line"] <= a["end_line"]
+
+    # Static results win wherever they resolved the call; the LLM fills in the rest
+    calls = list(resolved)
+    for call in llm_calls:
+        if any(overlaps(call, static) for static in resolved):
+            continue
+        call = {**call, "source": "llm"}
+        for static in unresolved:
+            if overlaps(call, static):
+                # keep the LLM's model but our own token counts
+                call["estimated_input_tokens"] = static["estimated_input_tokens"]
+                call["estimated_output_tokens"] = static["estimated_output_tokens"]
+                call["dynamic_inputs"] = static["dynamic_inputs"]
+                break
+        calls.append(call)
+    for call in unresolved:
+        if not any(overlaps(call, other) for other in calls):
+            calls.append(call)
+    return sorted(calls, key=lambda c: (c["start_line"], c["end_line"])), parsed_all, None, tokens_saved
+
+def build_entry_point_cost(projection: EntryPointProjection, loop_iterations: int, requests_per_day: int) -> EntryPointCost:
+    cost = poly_eval(projection.cost, loop_iterations)
+    return EntryPointCost(
+        name=projection.name,
+        start_line=projection.start_line,
+        end_line=projection.end_line,
+        llm_calls_per_invocation=round(poly_eval(projection.calls, loop_iterations), 6),
+        cost_per_invocation=round(cost, 6),
+        cost_per_day=round(cost * requests_per_day, 6),
+        cost_by_loop_degree={degree: round(c, 6) for degree, c in sorted(projection.cost.items())},
+        recursive=projection.recursive,
+        call_sites=[
+            CallSiteCost(
+                start_line=site.start_line,
+                end_line=site.end_line,
+                model=site.model,
+                multiplier=" + ".join(poly_label(d, f) for d, f in sorted(site.calls.items())),
+                calls_per_invocation=round(poly_eval(site.calls, loop_iterations), 6),
+                cost_per_invocation=round(poly_eval(site.cost, loop_iterations), 6),
+            )
+            for site in projection.call_sites
+        ],
+    )
+
+async def analyze_cost(
+    filename: str,
+    file_content: str,
+    use_cache: bool = True,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+) -> CheckCostResponse:
+    file_lines = file_content.splitlines()
+    
+    cache_key = make_cache_key(
+        content_hash(file_content), "cost", LLM_PROVIDER, CHECK_MODEL, rule_engine.prompt_fingerprint, COST_ANALYZER_VERSION,
+    )
+    cached = result_cache.get(cache_key) if use_cache else None
+    cache_status = "hit" if cached is not None else "miss"
+    errors: Dict[str, str] = {}
+    tokens_saved = 0
+    
+    if cached is not None:
+        llm_calls = cached
+    else:
+        # Analyze the file for LLM API calls
+        llm_calls, parsed_all, llm_error, tokens_saved = await find_llm_calls_static_first(file_content)
+        if llm_error is not None:
+            errors["llm_fallback"] = llm_error
+        if parsed_all:
+            result_cache.set(cache_key, llm_calls)
+    
+    # Calculate cost for each LLM call
+    total_cost = 0.0
+    for call in llm_calls:
+        model = call.get("model", "default")
+        input_tokens = call.get("estimated_input_tokens", 0)
+        output_tokens = call.get("estimated_output_tokens", 0)
         
-        # Calculate cost for each LLM call
-        total_cost = 0.0
-        for call in llm_calls:
-            model = call.get("model", "default")
-            input_tokens = call.get("estimated_input_tokens", 0)
-            output_tokens = call.get("estimated_output_tokens", 0)
-            
-            # Get pricing for the model
-            pricing = model_pricing.get(model, model_pricing["default"])
-            
-            # Calculate cost
-            input_cost = (input_tokens / 1000) * pricing["input"]
-            output_cost = (output_tokens / 1000) * pricing["output"]
-            total_call_cost = input_cost + output_cost
-            
-            # Add cost to the call data
-            call["estimated_cost"] = round(total_call_cost, 6)
-            total_cost += total_call_cost
+        # Get pricing for the model
+        pricing = MODEL_PRICING.get(model, MODEL_PRICING["default"])
         
-        # Build the Pydantic response
-        return CheckCostResponse(
-            filename=file.filename,
-            total_lines=len(file_lines),
-            llm_calls=[LLMCostEstimate(**call) for call in llm_calls],
-            total_calls=len(llm_calls),
-            total_estimated_cost=round(total_cost, 6)
+        # Calculate cost
+        input_cost = (input_tokens / 1000) * pricing["input"]
+        output_cost = (output_tokens / 1000) * pricing["output"]
+        total_call_cost = input_cost + output_cost
+        
+        # Add cost to the call data
+        call["estimated_cost"] = round(total_call_cost, 6)
+        total_cost += total_call_cost
+    
+    # Project cost per entry point through loops and the module call graph, off the event loop
+    projections = await asyncio.to_thread(project_costs, file_content, llm_calls)
+    entry_points = [
+        build_entry_point_cost(projection, loop_iterations, requests_per_day)
+        for projection in projections
+    ]
+    entry_points.sort(key=lambda e: e.cost_per_invocation, reverse=True)
+    
+    # Build the Pydantic response
+    return CheckCostResponse(
+        filename=filename,
+        total_lines=len(file_lines),
+        llm_calls=[LLMCostEstimate(**call) for call in llm_calls],
+        total_calls=len(llm_calls),
+        total_estimated_cost=round(total_cost, 6),
+        cache=cache_status,
+        loop_iterations=loop_iterations,
+        requests_per_day=requests_per_day,
+        entry_points=entry_points,
+        errors=errors,
+        input_tokens_saved=tokens_saved,
+    )
+
+@app.post(
+    "/check-cost",
+    response_model=CheckCostResponse,
+    summary="Upload code and analyze LLM API calls for cost estimation",
+)
+async def check_cost(
+    file: UploadFile = File(...),
+    use_cache: bool = True,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+) -> CheckCostResponse:
+    filename, file_content = await read_source(file, None)
+    try:
+        return await analyze_cost(
+            filename, file_content,
+            use_cache=use_cache, loop_iterations=loop_iterations, requests_per_day=requests_per_day,
         )
     
     except Exception as e:
@@ -427,6 +929,407 @@ async def check_cost(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+ANALYZERS = ("regulations", "code_rules", "cost")
+
+def parse_checks(checks: str) -> List[str]:
+    requested = [c.strip() for c in checks.split(",") if c.strip()]
+    unknown = [c for c in requested if c not in ANALYZERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown checks: {', '.join(unknown)}")
+    return requested
+
+async def run_analyzers(
+    filename: str,
+    file_content: str,
+    checks: List[str],
+    regulations: List[Dict[str, str]],
+    code_rules: List[Dict[str, str]],
+    mode: str = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+    on_result: Optional[Callable[[str, Optional[BaseModel], Optional[str], float], None]] = None,
+) -> Tuple[Dict[str, BaseModel], Dict[str, float], Dict[str, str]]:
+    """Run the selected analyzers on one file concurrently; returns (results, timings_ms, errors) by analyzer.
+
+    `on_result(check, result, error, elapsed_ms)` is called as each analyzer finishes.
+    """
+    analyses = {
+        "regulations": lambda: analyze_regulations(
+            filename, file_content, regulations,
+            mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+            incremental=incremental, force_all=force_all,
+        ),
+        "code_rules": lambda: analyze_code_rules(
+            filename, file_content, code_rules,
+            mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+            incremental=incremental, force_all=force_all,
+        ),
+        "cost": lambda: analyze_cost(
+            filename, file_content, use_cache=use_cache,
+            loop_iterations=loop_iterations, requests_per_day=requests_per_day,
+        ),
+    }
+
+    async def timed(check: str):
+        started = time.perf_counter()
+        try:
+            with span(f"analyze.{check}"):
+                result, error = await analyses[check](), None
+        except Exception as e:
+            result, error = None, str(e)
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        if on_result is not None:
+            on_result(check, result, error, elapsed)
+        return check, result, error, elapsed
+
+    results: Dict[str, BaseModel] = {}
+    timings: Dict[str, float] = {}
+    errors: Dict[str, str] = {}
+    for check, result, error, elapsed in await asyncio.gather(*(timed(check) for check in checks)):
+        timings[check] = elapsed
+        if error is None:
+            results[check] = result
+        else:
+            errors[check] = error
+    return results, timings, errors
+
+class CheckAllResponse(BaseModel):
+    filename: str
+    total_lines: int
+    regulations: Optional[CheckRegulationsResponse] = None
+    code_rules: Optional[CheckCodeResponse] = None
+    cost: Optional[CheckCostResponse] = None
+    errors: Dict[str, str] = {}  # analyzer -> why it produced no result
+    timings_ms: Dict[str, float] = {}
+    elapsed_ms: float
+
+async def analyze_all(
+    filename: str,
+    file_content: str,
+    checks: List[str],
+    mode: str = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+    on_result: Optional[Callable[[str, Optional[BaseModel], Optional[str], float], None]] = None,
+) -> CheckAllResponse:
+    started = time.perf_counter()
+    regulations = regulation_store.all()
+    code_rules = code_rule_store.all()
+    errors: Dict[str, str] = {}
+    if "regulations" in checks and not regulations:
+        errors["regulations"] = "No regulations are currently set."
+    if "code_rules" in checks and not code_rules:
+        errors["code_rules"] = "No code rules are currently set."
+    active = [check for check in checks if check not in errors]
+
+    results, timings, failures = await run_analyzers(
+        filename, file_content, active, regulations, code_rules,
+        mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+        incremental=incremental, force_all=force_all,
+        loop_iterations=loop_iterations, requests_per_day=requests_per_day, on_result=on_result,
+    )
+    return CheckAllResponse(
+        filename=filename,
+        total_lines=len(file_content.splitlines()),
+        **results,
+        errors={**errors, **failures},
+        timings_ms=timings,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+async def read_source(file: Optional[UploadFile], file_str: Optional[str]) -> Tuple[str, str]:
+    """(filename, content) from an upload or an inline string.
+
+    Inline strings all share one placeholder name, so endpoints don't check
+    them incrementally: that would compare unrelated sources' units.
+    """
+    if file is not None:
+        try:
+            with span("read_upload") as read_span:
+                content = await file.read()
+                read_span.set(bytes=len(content))
+                return file.filename, content.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"File is not valid UTF-8: {e}")
+    if file_str is not None:
+        return "string_input.py", file_str
+    raise HTTPException(status_code=400, detail="No file or file_str provided.")
+
+@app.post(
+    "/check-all",
+    response_model=CheckAllResponse,
+    summary="Check code against regulations and code rules and estimate LLM cost in one request",
+)
+async def check_all(
+    file: Optional[UploadFile] = File(None),
+    file_str: Optional[str] = None,
+    checks: str = ",".join(ANALYZERS),
+    mode: CheckMode = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+) -> CheckAllResponse:
+    requested = parse_checks(checks)
+    filename, file_content = await read_source(file, file_str)
+    return await analyze_all(
+        filename, file_content, requested,
+        mode=mode, max_prompt_tokens=max_prompt_tokens, use_cache=use_cache,
+        incremental=incremental and file is not None, force_all=force_all,
+        loop_iterations=loop_iterations, requests_per_day=requests_per_day,
+    )
+
+# Background jobs: a durable SQLite queue worked by a bounded pool of asyncio tasks
+job_store = JobStore(
+    os.getenv("JOB_STORE_PATH", "jobs.sqlite3") or ":memory:",
+    retention=float(os.getenv("JOB_RETENTION", str(7 * 24 * 3600))),
+)
+
+async def run_job(job_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    partial: Dict[str, Any] = {"filename": request["filename"], "errors": {}, "timings_ms": {}}
+
+    def save(check: str, result: Optional[BaseModel], error: Optional[str], elapsed_ms: float) -> None:
+        # publish each analyzer's result as soon as it is ready
+        if result is not None:
+            partial[check] = result.model_dump()
+        else:
+            partial["errors"][check] = error
+        partial["timings_ms"][check] = elapsed_ms
+        job_store.save_partial(job_id, partial)
+
+    options = request["options"]
+    with start_trace("job", job_id=job_id, checks=request["checks"]):
+        response = await analyze_all(request["filename"], request["file_content"], request["checks"], on_result=save, **options)
+    return response.model_dump()
+
+job_workers = JobWorkerPool(job_store, run_job, workers=int(os.getenv("JOB_WORKERS", "2")))
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed or cancelled
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None  # grows analyzer by analyzer while running
+    error: Optional[str] = None
+
+@app.post(
+    "/jobs",
+    response_model=JobSubmitted,
+    status_code=202,
+    summary="Queue a /check-all run in the background; poll GET /jobs/{job_id} for the result",
+)
+async def submit_job(
+    file: Optional[UploadFile] = File(None),
+    file_str: Optional[str] = None,
+    checks: str = ",".join(ANALYZERS),
+    mode: CheckMode = "per_rule",
+    max_prompt_tokens: int = BATCH_MAX_PROMPT_TOKENS,
+    use_cache: bool = True,
+    incremental: bool = False,
+    force_all: bool = False,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+) -> JobSubmitted:
+    requested = parse_checks(checks)
+    filename, file_content = await read_source(file, file_str)
+    job_id = job_store.submit({
+        "filename": filename,
+        "file_content": file_content,
+        "checks": requested,
+        "options": {
+            "mode": mode,
+            "max_prompt_tokens": max_prompt_tokens,
+            "use_cache": use_cache,
+            "incremental": incremental and file is not None,
+            "force_all": force_all,
+            "loop_iterations": loop_iterations,
+            "requests_per_day": requests_per_day,
+        },
+    })
+    return JobSubmitted(job_id=job_id, status="queued")
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, summary="Get a job's status and (partial) result")
+async def get_job(job_id: str) -> JobStatus:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return JobStatus(job_id=job.pop("id"), **job)
+
+@app.delete("/jobs/{job_id}", response_model=JobSubmitted, summary="Cancel a queued or running job")
+async def cancel_job(job_id: str) -> JobSubmitted:
+    status = job_store.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return JobSubmitted(job_id=job_id, status=status)
+
+async def scan_source(
+    source: SourceFile,
+    checks: List[str],
+    regulations: List[Dict[str, str]],
+    code_rules: List[Dict[str, str]],
+    mode: str,
+    use_cache: bool,
+    force_all: bool,
+    loop_iterations: int,
+    requests_per_day: int,
+) -> Dict:
+    """Run the selected analyzers on one repository file; returns an NDJSON record."""
+    record: Dict = {"type": "file", "path": source.path}
+    if source.skipped:
+        return {**record, "status": "skipped", "reason": source.skipped}
+    started = time.perf_counter()
+    try:
+        file_content = source.data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        record.update({"status": "error", "error": str(e)})
+    else:
+        results, timings, errors = await run_analyzers(
+            source.path, file_content, checks, regulations, code_rules,
+            mode=mode, use_cache=use_cache, force_all=force_all,
+            loop_iterations=loop_iterations, requests_per_day=requests_per_day,
+        )
+        record.update({check: result.model_dump() for check, result in results.items()})
+        # a file only counts as failed when no analyzer produced a result
+        record["status"] = "ok" if results or not checks else "error"
+        if errors:
+            record["errors"] = errors
+        record["timings_ms"] = timings
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+class RepositorySummary:
+    def __init__(self, checks: List[str]):
+        self.checks = checks
+        self.started = time.perf_counter()
+        self.counts = {"ok": 0, "error": 0, "skipped": 0}
+        self.regulation_violations = 0
+        self.code_violations = 0
+        self.llm_call_sites = 0
+        self.estimated_cost = 0.0
+        self.llm_requests = 0
+        self.file_times: List[Tuple[float, str]] = []
+
+    def add(self, record: Dict) -> None:
+        self.counts[record["status"]] += 1
+        if record["status"] != "ok":
+            return
+        self.file_times.append((record["elapsed_ms"], record["path"]))
+        if "regulations" in record:
+            self.regulation_violations += record["regulations"]["total_violations"]
+            self.llm_requests += record["regulations"]["llm_requests"]
+        if "code_rules" in record:
+            self.code_violations += record["code_rules"]["total_violations"]
+            self.llm_requests += record["code_rules"]["llm_requests"]
+        if "cost" in record:
+            self.llm_call_sites += record["cost"]["total_calls"]
+            self.estimated_cost += record["cost"]["total_estimated_cost"]
+
+    def record(self) -> Dict:
+        slowest = sorted(self.file_times, reverse=True)[:5]
+        return {
+            "type": "summary",
+            "checks": self.checks,
+            "files": sum(self.counts.values()),
+            "files_ok": self.counts["ok"],
+            "files_failed": self.counts["error"],
+            "files_skipped": self.counts["skipped"],
+            "total_regulation_violations": self.regulation_violations,
+            "total_code_violations": self.code_violations,
+            "total_llm_call_sites": self.llm_call_sites,
+            "total_estimated_cost": round(self.estimated_cost, 6),
+            "llm_requests": self.llm_requests,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "file_time_ms_total": round(sum(t for t, _ in self.file_times), 1),
+            "slowest_files": [{"path": path, "elapsed_ms": t} for t, path in slowest],
+        }
+
+@app.post(
+    "/check-repository",
+    summary="Check an archive (zip/tar.gz) or many uploaded files, streaming NDJSON results per file",
+)
+async def check_repository(
+    files: List[UploadFile] = File(...),
+    checks: str = ",".join(ANALYZERS),
+    include: str = "*.py",
+    mode: CheckMode = "per_rule",
+    use_cache: bool = True,
+    force_all: bool = False,
+    workers: int = REPOSITORY_WORKERS,
+    loop_iterations: int = 10,
+    requests_per_day: int = 1,
+) -> StreamingResponse:
+    requested = parse_checks(checks)
+
+    # Snapshot the rule sets; checks with no rules configured are left out
+    regulations = regulation_store.all()
+    code_rules = code_rule_store.all()
+    active = [
+        c for c in requested
+        if not (c == "regulations" and not regulations) and not (c == "code_rules" and not code_rules)
+    ]
+
+    sources: List[SourceFile] = []
+    try:
+        for upload in files:
+            data = await upload.read()
+            if is_archive(upload.filename):
+                sources.extend(read_archive(
+                    upload.filename, data, include, REPOSITORY_MAX_FILE_BYTES, REPOSITORY_MAX_FILES - len(sources),
+                ))
+            elif len(data) > REPOSITORY_MAX_FILE_BYTES:
+                sources.append(SourceFile(upload.filename, None, f"larger than {REPOSITORY_MAX_FILE_BYTES} bytes"))
+            else:
+                sources.append(SourceFile(upload.filename, data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(sources) > REPOSITORY_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"More than {REPOSITORY_MAX_FILES} files uploaded.")
+
+    async def stream():
+        pending: asyncio.Queue = asyncio.Queue()
+        for source in sources:
+            pending.put_nowait(source)
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            while not pending.empty():
+                source = pending.get_nowait()
+                await finished.put(await scan_source(
+                    source, active, regulations, code_rules, mode, use_cache, force_all,
+                    loop_iterations, requests_per_day,
+                ))
+
+        tasks = [asyncio.create_task(worker()) for _ in range(max(1, min(workers, len(sources))))]
+        summary = RepositorySummary(active)
+        try:
+            yield json.dumps({"type": "start", "files": len(sources), "checks": active}) + "\n"
+            for _ in sources:
+                record = await finished.get()
+                summary.add(record)
+                yield json.dumps(record) + "\n"
+            yield json.dumps(summary.record()) + "\n"
+        finally:
+            # stop scheduling work if the client goes away mid-stream
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 # Add the MCP server to your FastAPI app
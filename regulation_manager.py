@@ -1,6 +1,9 @@
 import streamlit as st
 import requests
 import base64
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 API_BASE = "http://localhost:8000"
 
@@ -107,12 +110,65 @@ def get_code_snippet_text(all_lines, viol_start_line, viol_end_line, context=1):
     snippet_lines = all_lines[snippet_start_idx : snippet_end_idx + 1]
     return '\n'.join(snippet_lines)
 
+SEVERITY_ICONS = {"low": "🟢", "medium": "🟠", "high": "🔴"}
+
+def render_violation(v, id_key, file_lines):
+    severity_color = SEVERITY_ICONS.get(v.get("severity", "medium"), "⚪")
+    st.markdown(
+        f"{severity_color} **[{v.get(id_key, 'UNKNOWN')}]** "
+        f"Lines `{v.get('start_line', 0)}-{v.get('end_line', 0)}`\n\n"
+        f"> {v.get('description', 'No description')}"
+    )
+    snippet_text = get_code_snippet_text(file_lines, v.get('start_line', 0), v.get('end_line', 0))
+    st.code(snippet_text, language="python", line_numbers=False)
+    st.caption(f"Violation in snippet above corresponds to original file lines: {v.get('start_line', 0)}-{v.get('end_line', 0)}")
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a streaming text/event-stream response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
 # --- Cache Helpers ---
+@st.cache_resource
+def http_session():
+    # One keep-alive connection pool per server process, shared by reruns and sessions
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def etag_cache():
+    # path -> (etag, body) of the last full response, shared across sessions
+    return {}
+
+def get_if_changed(path):
+    """GET `path`, sending the last ETag so an unchanged rule set comes back as an empty 304."""
+    cached = etag_cache().get(path)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = http_session().get(f"{API_BASE}{path}", headers=headers, timeout=5)
+    if r.status_code == 304 and cached:
+        return cached[1]
+    if not r.ok:
+        return []
+    body = r.json()
+    if r.headers.get("ETag"):
+        etag_cache()[path] = (r.headers["ETag"], body)
+    return body
+
 @st.cache_data(ttl=5)
 def fetch_regulations():
     try:
-        r = requests.get(f"{API_BASE}/get-regulations", timeout=5)
-        return r.json() if r.ok else []
+        return get_if_changed("/get-regulations")
     except Exception as e:
         st.error(f"Failed to fetch regulations: {e}")
         return []
@@ -120,15 +176,14 @@ def fetch_regulations():
 @st.cache_data(ttl=5)
 def fetch_code_rules():
     try:
-        r = requests.get(f"{API_BASE}/get-code-rules", timeout=5)
-        return r.json() if r.ok else []
+        return get_if_changed("/get-code-rules")
     except Exception as e:
         st.error(f"Failed to fetch code rules: {e}")
         return []
 
 def add_regulation(regulation):
     try:
-        r = requests.post(f"{API_BASE}/add-regulations", json=[regulation])
+        r = http_session().post(f"{API_BASE}/add-regulations", json=[regulation])
         if r.ok:
             st.success(f"✅ Added: {regulation['id']}")
             st.cache_data.clear()
@@ -139,7 +194,7 @@ def add_regulation(regulation):
 
 def add_code_rule(code_rule):
     try:
-        r = requests.post(f"{API_BASE}/add-code-rules", json=[code_rule])
+        r = http_session().post(f"{API_BASE}/add-code-rules", json=[code_rule])
         if r.ok:
             st.success(f"✅ Added: {code_rule['id']}")
             st.cache_data.clear()
@@ -150,7 +205,7 @@ def add_code_rule(code_rule):
 
 def delete_regulation(reg_id):
     try:
-        r = requests.delete(f"{API_BASE}/delete-regulations", params={"regulation_id": reg_id})
+        r = http_session().delete(f"{API_BASE}/delete-regulations", params={"regulation_id": reg_id})
         if r.ok:
             st.success(f"🗑️ Deleted: {reg_id}")
             st.cache_data.clear()
@@ -161,7 +216,7 @@ def delete_regulation(reg_id):
         
 def delete_code_rule(rule_id):
     try:
-        r = requests.delete(f"{API_BASE}/delete-code-rules", params={"code_rule_id": rule_id})
+        r = http_session().delete(f"{API_BASE}/delete-code-rules", params={"code_rule_id": rule_id})
         if r.ok:
             st.success(f"🗑️ Deleted: {rule_id}")
             st.cache_data.clear()
@@ -241,125 +296,200 @@ st.header("🧪 Check Code for Legal Violations and Code Rules")
 
 uploaded_file = st.file_uploader("Upload a Python file to check:", type=["py"])
 
-check_col1, check_col2 = st.columns(2)
+check_col1, check_col2, check_col3, check_col4 = st.columns(4)
 
 check_regulations = check_col1.checkbox("Check Regulatory Violations", value=True)
 check_code_rules = check_col2.checkbox("Check Code Violations", value=True)
+combined_request = check_col3.checkbox(
+    "Single request", value=False,
+    help="Send one /check-all request instead of one request per check; regulations then appear all at once.",
+)
+force_all = check_col4.checkbox(
+    "Check every rule", value=False,
+    help="Skip the relevance filter, which leaves out rules that can't apply to this file (e.g. TLS rules for code with no network calls).",
+)
 
 if uploaded_file and st.button("🚨 Run Check", type="primary"):
-    # Read file content once
-    uploaded_file.seek(0) # Ensure we start from the beginning
-    file_content_str = uploaded_file.getvalue().decode("utf-8")
-    file_lines = file_content_str.splitlines()
-    uploaded_file.seek(0) # Reset for any other part of the script that might read it
+    # Read file content once; every check posts these same bytes
+    file_bytes = uploaded_file.getvalue()
+    file_lines = file_bytes.decode("utf-8").splitlines()
+    upload = {"file": (uploaded_file.name, file_bytes)}
+    options = {"force_all": "true"} if force_all else {}
 
-    # Track total violations for summary
-    total_violations = 0
-    
-    # Check Regulatory Violations
-    if check_regulations:
+    # Worker threads only talk HTTP and queue (section, event, data);
+    # all Streamlit calls happen on this thread as events arrive.
+    events = queue.Queue()
+
+    def run_job(job_sections, request):
         try:
-            with st.spinner("Analyzing regulatory violations..."):
-                files = {"file": uploaded_file}
-                r = requests.post(f"{API_BASE}/check-violations", files=files)
-
-            if r.ok:
-                result = r.json()
-                total_violations += result['total_violations']
-                
-                if result['total_violations'] > 0:
-                    with st.expander(f"📋 Regulatory Violations ({result['total_violations']})", expanded=True):
-                        for v in result["violations"]:
-                            severity_color = {
-                                "low": "🟢",
-                                "medium": "🟠",
-                                "high": "🔴"
-                            }.get(v["severity"], "⚪")
-                            st.markdown(
-                                f"{severity_color} **[{v['regulation_id']}]** "
-                                f"Lines `{v['start_line']}-{v['end_line']}`\n\n"
-                                f"> {v['description']}"
-                            )
-                            snippet_text = get_code_snippet_text(file_lines, v['start_line'], v['end_line'])
-                            st.code(snippet_text, language="python", line_numbers=False)
-                            st.caption(f"Violation in snippet above corresponds to original file lines: {v['start_line']}-{v['end_line']}")
-                else:
-                    st.success("No regulatory violations found! ✅")
-            else:
-                st.error(f"❌ Regulation check failed: {r.status_code}: {r.text}")
+            request(events)
         except Exception as e:
-            st.error(f"❌ Failed to check regulatory violations: {e}")
+            for section in job_sections:
+                events.put((section, "failed", str(e)))
+        finally:
+            events.put((None, "done", None))
+
+    def request_regulations(events):
+        with http_session().post(f"{API_BASE}/check-violations/stream", params=options, files=upload, stream=True) as r:
+            if not r.ok:
+                events.put(("regulations", "failed", f"{r.status_code}: {r.text}"))
+                return
+            for event, data in iter_sse(r):
+                events.put(("regulations", event, data))
+
+    def request_code_rules(events):
+        r = http_session().post(f"{API_BASE}/check-code-violations", params=options, files=upload)
+        events.put(("code_rules", "result" if r.ok else "failed", r.json() if r.ok else f"{r.status_code}: {r.text}"))
+
+    def request_cost(events):
+        r = http_session().post(f"{API_BASE}/check-cost", files=upload)
+        events.put(("cost", "result" if r.ok else "failed", r.json() if r.ok else f"{r.status_code}"))
+
+    names = [name for name, wanted in (("regulations", check_regulations), ("code_rules", check_code_rules), ("cost", True)) if wanted]
+
+    def request_all(events):
+        r = http_session().post(f"{API_BASE}/check-all", params={"checks": ",".join(names), **options}, files=upload)
+        if not r.ok:
+            for name in names:
+                events.put((name, "failed", f"{r.status_code}: {r.text}"))
+            return
+        result = r.json()
+        for name in names:
+            if result.get(name) is not None:
+                events.put((name, "result", result[name]))
+            else:
+                events.put((name, "failed", result["errors"].get(name, "no result")))
 
-    # Check Code Rule Violations
-    if check_code_rules:
-        try:
-            with st.spinner("Analyzing code rule violations..."):
-                # Reset the file position for reuse
-                uploaded_file.seek(0)
-                files = {"file": uploaded_file}
-                r = requests.post(f"{API_BASE}/check-code-violations", files=files)
-
-            if r.ok:
-                result = r.json()
+    # job -> (sections it fills, request function)
+    if combined_request:
+        jobs = {"all": (names, request_all)}
+    else:
+        requests_by_name = {"regulations": request_regulations, "code_rules": request_code_rules, "cost": request_cost}
+        jobs = {name: ([name], requests_by_name[name]) for name in names}
+
+    # One placeholder per section keeps the layout stable whatever finishes first
+    sections = {name: st.container() for name in names}
+    status = {name: sections[name].empty() for name in names}
+    status_text = {
+        "regulations": "Analyzing regulatory violations...",
+        "code_rules": "Analyzing code rule violations...",
+        "cost": "Analyzing LLM cost...",
+    }
+    for name in names:
+        status[name].info(f"⏳ {status_text[name]}")
+
+    # Track total violations for summary
+    total_violations = 0
+    regulation_results = None
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        for job_sections, request in jobs.values():
+            pool.submit(run_job, job_sections, request)
+
+        running = len(jobs)
+        while running:
+            section, event, data = events.get()
+            if event == "done":
+                running -= 1
+                continue
+
+            if section == "regulations":
+                if event == "regulation":
+                    if regulation_results is None:
+                        regulation_results = sections["regulations"].expander("📋 Regulatory Violations", expanded=True)
+                    with regulation_results:
+                        if "incomplete" in data:
+                            st.warning(f"⚠️ {data['regulation_id']}: {data['incomplete']}")
+                        for v in data["violations"]:
+                            render_violation(v, "regulation_id", file_lines)
+                elif event == "error":
+                    with sections["regulations"]:
+                        st.error(f"❌ {data['regulation_id']}: {data['error']}")
+                elif event == "skipped":
+                    sections["regulations"].caption(f"⏭️ {data['regulation_id']} skipped: {data['reason']}")
+                elif event == "progress":
+                    status["regulations"].progress(
+                        data["completed"] / max(data["total"], 1),
+                        text=f"Checked {data['completed']}/{data['total']} regulations",
+                    )
+                elif event == "summary":
+                    status["regulations"].empty()
+                    total_violations += data["total_violations"]
+                    with sections["regulations"]:
+                        if data["total_violations"] > 0:
+                            st.caption(f"{data['total_violations']} regulatory violations in {data['elapsed_ms'] / 1000:.1f}s")
+                        else:
+                            st.success("No regulatory violations found! ✅")
+                elif event == "result":
+                    # the whole /check-all result at once
+                    status["regulations"].empty()
+                    total_violations += data["total_violations"]
+                    with sections["regulations"]:
+                        for regulation_id, error in data.get("errors", {}).items():
+                            st.error(f"❌ {regulation_id} could not be checked: {error}")
+                        for regulation_id, note in data.get("incomplete", {}).items():
+                            st.warning(f"⚠️ {regulation_id}: {note}")
+                        for regulation_id, reason in data.get("skipped", {}).items():
+                            st.caption(f"⏭️ {regulation_id} skipped: {reason}")
+                        if data["total_violations"] > 0:
+                            with st.expander(f"📋 Regulatory Violations ({data['total_violations']})", expanded=True):
+                                for v in data["violations"]:
+                                    render_violation(v, "regulation_id", file_lines)
+                        else:
+                            st.success("No regulatory violations found! ✅")
+                elif event == "failed":
+                    status["regulations"].empty()
+                    sections["regulations"].error(f"❌ Regulation check failed: {data}")
+
+            elif section == "code_rules":
+                status["code_rules"].empty()
+                if event == "failed":
+                    sections["code_rules"].error(f"❌ Code rule check failed: {data}")
+                    continue
+                result = data
                 total_violations += result.get('total_violations', 0)
-                
-                if result.get('total_violations', 0) > 0:
-                    with st.expander(f"🔍 Code Rule Violations ({result.get('total_violations', 0)})", expanded=True):
-                        for v in result.get("violations", []):
-                            severity_color = {
-                                "low": "🟢",
-                                "medium": "🟠",
-                                "high": "🔴"
-                            }.get(v.get("severity", "medium"), "⚪")
-                            st.markdown(
-                                f"{severity_color} **[{v.get('code_rule_id', 'UNKNOWN')}]** "
-                                f"Lines `{v.get('start_line', 0)}-{v.get('end_line', 0)}`\n\n"
-                                f"> {v.get('description', 'No description')}"
-                            )
-                            snippet_text = get_code_snippet_text(file_lines, v.get('start_line', 0), v.get('end_line', 0))
-                            st.code(snippet_text, language="python", line_numbers=False)
-                            st.caption(f"Violation in snippet above corresponds to original file lines: {v.get('start_line', 0)}-{v.get('end_line', 0)}")
-                else:
-                    st.success("No code rule violations found! ✅")
-            else:
-                st.error(f"❌ Code rule check failed: {r.status_code}: {r.text}")
-        except Exception as e:
-            st.error(f"❌ Failed to check code rule violations: {e}")
-    
-    # Check for LLM Cost Analysis
-    try:
-        with st.spinner("Analyzing LLM cost..."):
-            # Reset the file position for reuse
-            uploaded_file.seek(0)
-            files = {"file": uploaded_file}
-            r = requests.post(f"{API_BASE}/check-cost", files=files)
 
-        if r.ok:
-            result = r.json()
-            total_calls = result.get('total_calls', 0)
-            
-            if total_calls > 0:
-                # Format the cost with 6 decimal places
-                total_cost = "${:,.6f}".format(result.get('total_estimated_cost', 0))
-                
-                with st.expander(f"💰 LLM Cost Analysis - {total_cost} for {total_calls} calls", expanded=True):
-                    for call in result.get("llm_calls", []):
-                        call_cost = "${:,.6f}".format(call.get('estimated_cost', 0))
-                        st.markdown(
-                            f"**Model: {call.get('model', 'unknown')}** ({call.get('call_type', 'unknown')}) - {call_cost}\n\n"
-                            f"Lines `{call.get('start_line', 0)}-{call.get('end_line', 0)}`\n\n"
-                            f"• Input tokens: {call.get('estimated_input_tokens', 0):,}\n"
-                            f"• Output tokens: {call.get('estimated_output_tokens', 0):,}\n\n"
-                            f"> {call.get('description', 'No description')}"
-                        )
-                        st.markdown("---")
-            else:
-                st.info("No LLM API calls detected in this code.")
-        else:
-            st.warning(f"⚠️ Cost analysis not available: {r.status_code}")
-    except Exception as e:
-        st.warning(f"⚠️ Cost analysis failed: {e}")
-    
+                with sections["code_rules"]:
+                    for rule_id, error in result.get("errors", {}).items():
+                        st.error(f"❌ {rule_id} could not be checked: {error}")
+                    for rule_id, note in result.get("incomplete", {}).items():
+                        st.warning(f"⚠️ {rule_id}: {note}")
+                    for rule_id, reason in result.get("skipped", {}).items():
+                        st.caption(f"⏭️ {rule_id} skipped: {reason}")
+                    if result.get('total_violations', 0) > 0:
+                        with st.expander(f"🔍 Code Rule Violations ({result.get('total_violations', 0)})", expanded=True):
+                            for v in result.get("violations", []):
+                                render_violation(v, "code_rule_id", file_lines)
+                    else:
+                        st.success("No code rule violations found! ✅")
+
+            elif section == "cost":
+                status["cost"].empty()
+                if event == "failed":
+                    sections["cost"].warning(f"⚠️ Cost analysis not available: {data}")
+                    continue
+                result = data
+                total_calls = result.get('total_calls', 0)
+
+                with sections["cost"]:
+                    if total_calls > 0:
+                        # Format the cost with 6 decimal places
+                        total_cost = "${:,.6f}".format(result.get('total_estimated_cost', 0))
+
+                        with st.expander(f"💰 LLM Cost Analysis - {total_cost} for {total_calls} calls", expanded=True):
+                            for call in result.get("llm_calls", []):
+                                call_cost = "${:,.6f}".format(call.get('estimated_cost', 0))
+                                st.markdown(
+                                    f"**Model: {call.get('model', 'unknown')}** ({call.get('call_type', 'unknown')}) - {call_cost}\n\n"
+                                    f"Lines `{call.get('start_line', 0)}-{call.get('end_line', 0)}`\n\n"
+                                    f"• Input tokens: {call.get('estimated_input_tokens', 0):,}\n"
+                                    f"• Output tokens: {call.get('estimated_output_tokens', 0):,}\n\n"
+                                    f"> {call.get('description', 'No description')}"
+                                )
+                                st.markdown("---")
+                    else:
+                        st.info("No LLM API calls detected in this code.")
+
     # Show final summary
     if total_violations > 0:
         st.warning(f"⚠️ Total violations found: {total_violations}")
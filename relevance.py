@@ -0,0 +1,184 @@
+import ast
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+# Keyword families for the kinds of code regulations are usually about.
+# A rule whose description mentions one of these can be skipped for files
+# that show no sign of it; rules that mention none of them always run.
+CONCEPTS: Dict[str, Tuple[str, ...]] = {
+    "network": (
+        "tls", "ssl", "https", "http", "url", "uri", "api", "external", "network", "socket", "request",
+        "httpx", "urllib", "urllib3", "aiohttp", "grpc", "websocket", "endpoint", "webhook", "download",
+        "upload", "certificate", "cert", "verify", "proxy", "fetch", "remote", "smtp", "ftp",
+    ),
+    "personal_data": (
+        "pii", "personal", "gdpr", "hipaa", "ccpa", "privacy", "consent", "email", "phone", "address",
+        "ssn", "birth", "dob", "name", "user", "customer", "patient", "health", "ip", "location", "profile",
+        "subject", "anonymize", "pseudonymize", "mask",
+    ),
+    "storage": (
+        "database", "db", "sql", "sqlite", "sqlite3", "postgres", "psycopg2", "mysql", "mongo", "pymongo",
+        "redis", "store", "storage", "persist", "save", "write", "open", "csv", "file", "s3", "boto3",
+        "bucket", "retention", "retain", "delete", "deletion", "erase", "cursor", "execute", "insert",
+        "query", "sqlalchemy", "orm", "backup",
+    ),
+    "secrets": (
+        "secret", "password", "passwd", "credential", "key", "token", "apikey", "encrypt", "encryption",
+        "decrypt", "hash", "hashlib", "crypto", "cryptography", "bcrypt", "hmac", "cipher", "aes", "rsa",
+        "md5", "sha1", "sha256", "environ", "getenv", "vault", "plaintext", "hardcode", "hardcoded",
+    ),
+    "logging": ("log", "logging", "logger", "print", "audit", "trace", "debug", "warn", "loguru"),
+    "execution": (
+        "subprocess", "exec", "eval", "shell", "command", "popen", "pickle", "marshal", "deserialize",
+        "deserialization", "yaml", "injection", "sanitize", "system",
+    ),
+    "llm": (
+        "llm", "openai", "anthropic", "gpt", "claude", "prompt", "completion", "langchain", "embedding",
+        "chatcompletion", "gemini", "mistral", "llama",
+    ),
+    "randomness": ("random", "randint", "randrange", "seed", "uuid", "nonce", "entropy", "urandom"),
+}
+
+STOPWORDS = frozenset(
+    "a an and any are as at be been by can code do does each for from has have if in into is it its "
+    "may must never no not of on only or other should such than that the their them then there these "
+    "this those to under use used using via when where which while with within without all also".split()
+)
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    """Lower-cased, plural-stripped words of `text`, splitting snake_case, camelCase and dotted names."""
+    return [stem(word.lower()) for word in _WORD.findall(text) if len(word) > 1 and word.lower() not in STOPWORDS]
+
+
+_CONCEPTS_BY_TERM: Dict[str, Set[str]] = {}
+for _concept, _keywords in CONCEPTS.items():
+    for _keyword in _keywords:
+        _CONCEPTS_BY_TERM.setdefault(stem(_keyword), set()).add(_concept)
+
+
+def concepts_of(term: str) -> Set[str]:
+    return _CONCEPTS_BY_TERM.get(term, set())
+
+
+@dataclass
+class FileProfile:
+    terms: FrozenSet[str]
+    concepts: FrozenSet[str]
+
+
+def profile_source(source: str) -> FileProfile:
+    """Index a file's imports, calls, keyword arguments, parameters, assigned names and string literals.
+
+    Source that doesn't parse is indexed word by word.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        found = set(terms(source))
+    else:
+        found = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    found.update(terms(alias.name))
+            elif isinstance(node, ast.ImportFrom):
+                found.update(terms(node.module or ""))
+                for alias in node.names:
+                    found.update(terms(alias.name))
+            elif isinstance(node, ast.Call):
+                func = node.func
+                while isinstance(func, ast.Attribute):
+                    found.update(terms(func.attr))
+                    func = func.value
+                if isinstance(func, ast.Name):
+                    found.update(terms(func.id))
+                for keyword in node.keywords:
+                    found.update(terms(keyword.arg or ""))
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                for target in node.targets if isinstance(node, ast.Assign) else [node.target]:
+                    for name in ast.walk(target):
+                        if isinstance(name, ast.Name):
+                            found.update(terms(name.id))
+                        elif isinstance(name, ast.Attribute):
+                            found.update(terms(name.attr))
+            elif isinstance(node, ast.arg):
+                # parameters name the data a function handles, e.g. `user` or `profile`
+                found.update(terms(node.arg))
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                found.update(terms(node.value))
+    concepts = frozenset(concept for term in found for concept in concepts_of(term))
+    return FileProfile(frozenset(found), concepts)
+
+
+@dataclass
+class RuleRelevance:
+    score: float
+    missing: List[str]  # concepts the rule is about that the file shows no sign of
+
+
+class RelevanceIndex:
+    """TF-IDF weighted keyword index over rule descriptions.
+
+    A rule's relevance to a file is the share of its description's weight
+    carried by terms the file contains, directly or through a shared
+    concept. Terms common to many rules weigh less.
+    """
+
+    def __init__(self, rules: List[Dict[str, str]]):
+        documents = {rule.get("id", "unknown"): Counter(terms(rule.get("description", ""))) for rule in rules}
+        document_frequency = Counter(term for counts in documents.values() for term in counts)
+        total = len(documents)
+        self.weights: Dict[str, Dict[str, float]] = {
+            rule_id: {
+                term: count * (math.log((1 + total) / (1 + document_frequency[term])) + 1)
+                for term, count in counts.items()
+            }
+            for rule_id, counts in documents.items()
+        }
+
+    def relevance(self, rule_id: str, profile: FileProfile) -> Optional[RuleRelevance]:
+        """None when the rule isn't about any known concept, so it can't be judged and should run."""
+        weights = self.weights.get(rule_id, {})
+        rule_concepts = {concept for term in weights for concept in concepts_of(term)}
+        if not rule_concepts:
+            return None
+        matched = sum(
+            weight for term, weight in weights.items()
+            if term in profile.terms or concepts_of(term) & profile.concepts
+        )
+        return RuleRelevance(matched / sum(weights.values()), sorted(rule_concepts - profile.concepts))
+
+
+def filter_relevant(
+    rules: List[Dict[str, str]], source: str, threshold: float
+) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """Split rules into (rules worth sending to the LLM for `source`, {skipped rule id: reason})."""
+    if threshold <= 0 or not rules:
+        return rules, {}
+    index = RelevanceIndex(rules)
+    profile = profile_source(source)
+    kept: List[Dict[str, str]] = []
+    skipped: Dict[str, str] = {}
+    for rule in rules:
+        rule_id = rule.get("id", "unknown")
+        relevance = index.relevance(rule_id, profile)
+        if relevance is None or relevance.score >= threshold:
+            kept.append(rule)
+            continue
+        reason = f"relevance {relevance.score:.2f} below {threshold:g}"
+        if relevance.missing:
+            reason += f"; no {', '.join(relevance.missing).replace('_', ' ')} code found"
+        skipped[rule_id] = reason
+    return kept, skipped
@@ -0,0 +1,64 @@
+import fnmatch
+import io
+import posixpath
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz")
+
+
+@dataclass
+class SourceFile:
+    path: str
+    data: Optional[bytes]
+    skipped: Optional[str] = None  # reason the file won't be analysed
+
+
+def is_archive(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def matches(path: str, include: str) -> bool:
+    """True if `path` matches any of the comma-separated glob patterns in `include`."""
+    patterns = [p.strip() for p in include.split(",") if p.strip()]
+    name = posixpath.basename(path)
+    return any(fnmatch.fnmatch(path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def _normalize(path: str) -> Optional[str]:
+    path = posixpath.normpath(path.replace("\\", "/")).lstrip("/")
+    if path.startswith("..") or path in ("", "."):
+        return None
+    return path
+
+
+def read_archive(filename: str, data: bytes, include: str, max_file_bytes: int, max_files: int) -> List[SourceFile]:
+    """List matching files in a zip/tar archive. Raises ValueError for unreadable archives."""
+    sources: List[SourceFile] = []
+
+    def add(path: Optional[str], size: int, read) -> None:
+        if path is None or not matches(path, include):
+            return
+        if len(sources) >= max_files:
+            raise ValueError(f"Archive has more than {max_files} matching files.")
+        if size > max_file_bytes:
+            sources.append(SourceFile(path, None, f"larger than {max_file_bytes} bytes"))
+        else:
+            sources.append(SourceFile(path, read()))
+
+    try:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        add(_normalize(info.filename), info.file_size, lambda: archive.read(info))
+        else:
+            with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+                for member in archive:
+                    if member.isfile():
+                        add(_normalize(member.name), member.size, lambda: archive.extractfile(member).read())
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        raise ValueError(f"Could not read archive {filename!r}: {e}")
+    return sources
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from metrics import Counter
+
+CACHE_LOOKUPS = Counter("result_cache_lookups_total", "Result cache lookups by outcome (memory, disk, miss).", ["result"])
+CACHE_WRITE_ERRORS = Counter("result_cache_write_errors_total", "SQLite writes the result cache gave up on (e.g. database locked).")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(*parts: str) -> str:
+    # Join with a separator that can't appear in hex digests or ids we control
+    return content_hash("\x1f".join(parts))
+
+
+class ResultCache:
+    """Two-tier cache for check results: an in-memory LRU in front of SQLite.
+
+    Entries expire after `ttl` seconds in both tiers. Values must be
+    JSON-serialisable. Pass `path=None` to keep the cache in memory only.
+    The SQLite file is opened in WAL mode so several worker processes can
+    share it; a write that still fails only costs a future cache hit, so it
+    is counted and skipped rather than raised.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1024, ttl: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    CACHE_LOOKUPS.labels("memory").inc()
+                    return json.loads(value)
+                del self._memory[key]
+
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            value, created = row
+            if now - created >= self.ttl:
+                self._write("DELETE FROM results WHERE key = ?", (key,))
+                CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            self._remember(key, created, value)
+            CACHE_LOOKUPS.labels("disk").inc()
+            return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        created = time.time()
+        serialized = json.dumps(value)
+        with self._lock:
+            self._remember(key, created, serialized)
+            if self._db is not None:
+                self._write("INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)", (key, serialized, created))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def _write(self, statement: str, parameters: tuple) -> None:
+        # Call with the lock held. A failed write only costs other processes
+        # (and this one after a restart) a cache hit.
+        try:
+            self._db.execute(statement, parameters)
+            self._db.commit()
+        except sqlite3.OperationalError:
+            self._db.rollback()
+            CACHE_WRITE_ERRORS.inc()
+
+    def _remember(self, key: str, created: float, serialized: str) -> None:
+        self._memory[key] = (created, serialized)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
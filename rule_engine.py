@@ -0,0 +1,544 @@
+import ast
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from code_units import (
+    CodeUnit,
+    SourceChunk,
+    chunk_source,
+    context_ranges,
+    merge_chunk_violations,
+    remap_violations,
+    render_units,
+    shared_context_lines,
+    split_units,
+    unit_index_for_line,
+)
+from json_salvage import salvage_json_list
+from llm_dispatch import LLMError
+from llm_providers import cached_prompt_tokens, json_response_format
+from metrics import Counter
+from relevance import filter_relevant
+from result_cache import ResultCache, content_hash, make_cache_key
+from source_render import render_source
+from tracing import span
+
+NUMBERED_SOURCE_NOTE = (
+    "A line of code starting with `N|` is line N; lines without a number continue the count "
+    "from the line above. Some blank lines, comments or docstrings may be left out, which the "
+    "numbering already accounts for. Report start_line and end_line in this numbering.\n\n"
+)
+
+PARSE_FAILURES = Counter(
+    "llm_output_parse_failures_total",
+    "Model answers that didn't parse as complete JSON, by expected list and whether anything was salvaged.",
+    ["key", "salvaged"],
+)
+
+INCOMPLETE_OUTPUT = "Model output was cut off, malformed or had invalid entries twice; some violations may be missing."
+
+
+def salvage(text: str, key: str, schema: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict], bool]:
+    """salvage_json_list, dropping objects that don't match `schema`'s items and counting imperfect answers."""
+    item_schema = schema["properties"][key].get("items") if schema else None
+    with span("parse_output", key=key) as parse_span:
+        items, done = salvage_json_list(text, key, item_schema)
+        parse_span.set(items=len(items), complete=done)
+    if not done:
+        PARSE_FAILURES.labels(key, "yes" if items else "no").inc()
+    return items, done
+
+
+def source_prompt_prefix(source: str) -> str:
+    """The part of every checker prompt that depends only on the (rendered) source.
+
+    Prompts start with it and put the rule or task after, so every check of
+    the same file shares one long prefix that provider-side prompt caching
+    (or llama.cpp's KV cache) can reuse.
+    """
+    return (
+        "You review Python code. Here is the code:\n\n"
+        "```\n"
+        f"{source}\n"
+        "```\n"
+        f"{NUMBERED_SOURCE_NOTE}"
+    )
+
+
+def build_rule_prompt(kind: str, rule_id: str, rule_description: str, source: str) -> str:
+    return source_prompt_prefix(source) + (
+        f"Analyze the code above for violations of {kind} {rule_id!r}:\n"
+        f"{rule_description}\n\n"
+        "Return ONLY valid JSON in the form:\n"
+        '{ "violations": [ '
+        '{ "start_line": int, "end_line": int, '
+        '"description": str, "severity": "low"|"medium"|"high" } '
+        '] }\n'
+        "If there are no violations, return: { \"violations\": [] }"
+        f"Be specific with the lines of code that are violating the {kind} - don't just give wide ranges."
+    )
+
+
+def build_batch_rule_prompt(kind: str, id_key: str, rules: List[Dict[str, str]], source: str) -> str:
+    rule_list = "\n".join(
+        f"- {rule.get('id', 'unknown')!r}: {rule.get('description', 'No description')}" for rule in rules
+    )
+    return source_prompt_prefix(source) + (
+        f"Analyze the code above for violations of each of these {kind}s:\n"
+        f"{rule_list}\n\n"
+        "Return ONLY valid JSON in the form:\n"
+        '{ "violations": [ '
+        f'{{ "{id_key}": str, "start_line": int, "end_line": int, '
+        '"description": str, "severity": "low"|"medium"|"high" } '
+        '] }\n'
+        f"Set {id_key} to the id of the {kind} being violated, exactly as listed above. "
+        "If there are no violations, return: { \"violations\": [] }"
+        f"Be specific with the lines of code that are violating each {kind} - don't just give wide ranges."
+    )
+
+
+def violations_schema(id_key: Optional[str] = None) -> Dict[str, Any]:
+    violation = {
+        "type": "object",
+        "properties": {
+            "start_line": {"type": "integer"},
+            "end_line": {"type": "integer"},
+            "description": {"type": "string"},
+            "severity": {"type": "string", "enum": ["low", "medium", "high"]},
+        },
+        "required": ["start_line", "end_line", "description", "severity"],
+    }
+    if id_key:
+        violation["properties"][id_key] = {"type": "string"}
+        violation["required"].insert(0, id_key)
+    return {"type": "object", "properties": {"violations": {"type": "array", "items": violation}}, "required": ["violations"]}
+
+
+def violations_by_unit(violations: List[Dict], units: List[CodeUnit]) -> Dict[str, List[Dict]]:
+    by_fingerprint: Dict[str, List[Dict]] = {unit.fingerprint: [] for unit in units}
+    owners = [unit_index_for_line(units, v["start_line"]) for v in violations]
+    for i, unit in enumerate(units):
+        if by_fingerprint[unit.fingerprint]:
+            continue  # identical unit text seen earlier in the file
+        by_fingerprint[unit.fingerprint] = [
+            {**v, "start_line": v["start_line"] - unit.start_line, "end_line": v["end_line"] - unit.start_line}
+            for v, owner in zip(violations, owners) if owner == i
+        ]
+    return by_fingerprint
+
+
+def shift_unit_violations(relative: List[Dict], unit: CodeUnit) -> List[Dict]:
+    return [
+        {**v, "start_line": v["start_line"] + unit.start_line, "end_line": v["end_line"] + unit.start_line}
+        for v in relative
+    ]
+
+
+@dataclass
+class TokenUsage:
+    """LLM calls made (failed ones included) and the token counts the provider reported for them."""
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        self.prompt_tokens += getattr(usage, "prompt_tokens", None) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", None) or 0
+        self.cached_prompt_tokens += cached_prompt_tokens(response)
+
+
+class RuleCheckOutcome(BaseModel):
+    violations: List[Dict]
+    llm_requests: int
+    cache: Dict[str, str]
+    errors: Dict[str, str] = {}  # rule id -> why its LLM call failed
+    incomplete: Dict[str, str] = {}  # rule id -> why some violations may be missing
+    input_tokens_saved: int = 0  # by eliding lines from the numbered source, over all LLM calls
+    prompt_tokens: int = 0  # as reported by the provider
+    cached_prompt_tokens: int = 0  # of those, served from the provider's prompt cache
+    skipped: Dict[str, str] = {}  # rule id -> why it wasn't sent to the LLM
+    units_total: Optional[int] = None
+    units_reanalyzed: Optional[int] = None
+
+
+class _RuleRun:
+    """What one RuleEngine.check call accumulates across its LLM calls."""
+
+    def __init__(self):
+        self.errors: Dict[str, str] = {}
+        self.incomplete: Dict[str, str] = {}
+        self.tokens_saved = 0
+        self.usage = TokenUsage()
+
+
+# chat.completions.create-style coroutine: (model=..., messages=..., ...) -> response
+ChatFunction = Callable[..., Awaitable[Any]]
+
+
+class RuleEngine:
+    """Checks rules (regulations or code rules) against source files with an LLM.
+
+    Both rule endpoints run through `check`: relevance filtering, result and
+    unit caching, chunking of large files, per-rule or batched prompts, and
+    salvage of incomplete model output. Prompts lead with the file and end
+    with the rule, so checks of one file share a cacheable prefix.
+    """
+
+    def __init__(
+        self,
+        chat: ChatFunction,
+        cache: ResultCache,
+        model: str,
+        provider: str,
+        prompt_version: str,
+        count_tokens: Callable[[str], int],
+        chunk_max_tokens: int = 3000,
+        output_max_tokens: int = 2000,
+        elide: FrozenSet[str] = frozenset({"blank", "comments", "docstrings"}),
+        number_every: int = 1,
+        relevance_threshold: float = 0.0,
+    ):
+        self.chat = chat
+        self.cache = cache
+        self.model = model
+        self.provider = provider
+        self.count_tokens = count_tokens
+        self.chunk_max_tokens = chunk_max_tokens
+        self.output_max_tokens = output_max_tokens
+        self.elide = elide
+        self.number_every = number_every
+        self.relevance_threshold = relevance_threshold
+        # cached results also depend on how the source was rendered into the prompt
+        self.prompt_fingerprint = f"{prompt_version}:{','.join(sorted(elide))}:{number_every}"
+
+    def render(self, text: str) -> str:
+        """Line-numbered, compacted source as sent to the LLM."""
+        return render_source(text, self.elide, self.number_every)
+
+    def tokens_saved(self, text: str, rendered: str) -> int:
+        """Prompt tokens `rendered` saves over `text` with every line numbered and nothing left out."""
+        return max(0, self.count_tokens(render_source(text)) - self.count_tokens(rendered))
+
+    def relevant(self, rules: List[Dict[str, str]], source: str) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+        """(rules worth checking against `source`, {skipped rule id: reason})."""
+        return filter_relevant(rules, source, self.relevance_threshold)
+
+    async def complete(
+        self, prompt: str, max_tokens: int, schema: Optional[Dict[str, Any]] = None, usage: Optional[TokenUsage] = None,
+    ) -> str:
+        options: Dict[str, Any] = {}
+        response_format = json_response_format(self.provider, self.model, schema) if schema else None
+        if response_format is not None:
+            options["response_format"] = response_format
+        if usage is not None:
+            usage.calls += 1  # counted before the call, so retries, fallbacks and failures all show
+        with span("llm.request", **{"gen_ai.request.model": self.model, "gen_ai.request.max_tokens": max_tokens}) as llm_span:
+            response = await self.chat(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=max_tokens,
+                **options,
+            )
+            response_usage = getattr(response, "usage", None)
+            llm_span.set(**{
+                "gen_ai.usage.input_tokens": getattr(response_usage, "prompt_tokens", None),
+                "gen_ai.usage.cached_input_tokens": cached_prompt_tokens(response),
+                "gen_ai.usage.output_tokens": getattr(response_usage, "completion_tokens", None),
+            })
+        if usage is not None:
+            usage.add(response)
+        return response.choices[0].message.content or ""
+
+    async def complete_json_list(
+        self, prompt: str, key: str, schema: Dict[str, Any], usage: Optional[TokenUsage] = None,
+    ) -> Tuple[List[Dict], bool]:
+        """Ask for `{key: [...]}`; returns (objects, complete).
+
+        Complete objects are recovered from truncated or malformed output, and
+        objects that don't match `schema` are dropped. Such an answer is
+        retried once with twice the token budget, keeping whichever attempt
+        recovered more.
+        """
+        items, done = salvage(await self.complete(prompt, self.output_max_tokens, schema, usage), key, schema)
+        if done:
+            return items, True
+        retry = await self.complete(prompt, self.output_max_tokens * 2, schema, usage)
+        retry_items, retry_done = salvage(retry, key, schema)
+        if retry_done or len(retry_items) >= len(items):
+            return retry_items, retry_done
+        return items, False
+
+    def plan_batches(
+        self, kind: str, id_key: str, rules: List[Dict[str, str]], source: str, max_prompt_tokens: int,
+    ) -> List[List[Dict[str, str]]]:
+        # Greedily pack rules into prompts that stay under the token budget;
+        # a rule that doesn't fit even on its own still gets a batch of one.
+        base_tokens = self.count_tokens(build_batch_rule_prompt(kind, id_key, [], source))
+        batches: List[List[Dict[str, str]]] = []
+        current: List[Dict[str, str]] = []
+        current_tokens = base_tokens
+        for rule in rules:
+            rule_tokens = self.count_tokens(f"- {rule.get('id', 'unknown')!r}: {rule.get('description', 'No description')}\n")
+            if current and current_tokens + rule_tokens > max_prompt_tokens:
+                batches.append(current)
+                current, current_tokens = [], base_tokens
+            current.append(rule)
+            current_tokens += rule_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def cache_key(self, kind: str, rule: Dict[str, str], file_hash: str) -> str:
+        return make_cache_key(
+            file_hash,
+            kind,
+            rule.get("id", "unknown"),
+            content_hash(rule.get("description", "No description")),
+            self.provider,
+            self.model,
+            self.prompt_fingerprint,
+        )
+
+    def unit_cache_key(self, kind: str, rule: Dict[str, str], filename: str) -> str:
+        # Per-file, per-rule map of unit fingerprint -> unit-relative violations
+        return make_cache_key(
+            "units",
+            filename,
+            kind,
+            rule.get("id", "unknown"),
+            content_hash(rule.get("description", "No description")),
+            self.provider,
+            self.model,
+            self.prompt_fingerprint,
+        )
+
+    async def check(
+        self,
+        kind: str,
+        id_key: str,
+        rules: List[Dict[str, str]],
+        file_content: str,
+        mode: str = "per_rule",
+        max_prompt_tokens: int = 6000,
+        use_cache: bool = True,
+        incremental: bool = False,
+        filename: str = "",
+        force_all: bool = False,
+    ) -> RuleCheckOutcome:
+        """Run every rule against the file, serving unchanged (file, rule) pairs from the result cache.
+
+        Rules the relevance filter finds don't apply to the file are skipped
+        unless `force_all` is set. In incremental mode only the top-level units
+        that changed since the last check of `filename` are sent to the LLM;
+        violations in unchanged units are carried over from the previous result
+        at their new line numbers.
+        """
+        with span("rule_check", kind=kind, mode=mode, rules=len(rules)) as check_span:
+            skipped: Dict[str, str] = {}
+            if not force_all:
+                rules, skipped = self.relevant(rules, file_content)
+            file_hash = content_hash(file_content)
+            by_rule: Dict[str, List[Dict]] = {}
+            cache_status: Dict[str, str] = {}
+            pending: List[Dict[str, str]] = []
+            for rule in rules:
+                rule_id = rule.get("id", "unknown")
+                cached = self.cache.get(self.cache_key(kind, rule, file_hash)) if use_cache else None
+                if cached is not None:
+                    by_rule[rule_id] = cached
+                    cache_status[rule_id] = "hit"
+                else:
+                    pending.append(rule)
+                    cache_status[rule_id] = "miss"
+
+            units: Optional[List[CodeUnit]] = None
+            context: List[Tuple[int, int]] = []
+            if incremental and pending:
+                try:
+                    units = split_units(file_content)
+                    context = context_ranges(ast.parse(file_content))
+                except SyntaxError:
+                    units = None  # not parseable; check the whole file
+
+            # Group rules by the set of units they need re-checked (None = whole file)
+            groups: Dict[Optional[Tuple[int, ...]], List[Dict[str, str]]] = {}
+            previous: Dict[str, Dict[str, List[Dict]]] = {}
+            for rule in pending:
+                changed: Optional[Tuple[int, ...]] = None
+                if units:
+                    prior = self.cache.get(self.unit_cache_key(kind, rule, filename)) if use_cache else None
+                    if prior is not None:
+                        previous[rule.get("id", "unknown")] = prior
+                        changed = tuple(i for i, unit in enumerate(units) if unit.fingerprint not in prior)
+                groups.setdefault(changed, []).append(rule)
+
+            run = _RuleRun()
+            file_lines = file_content.splitlines()
+
+            async def run_group(changed: Optional[Tuple[int, ...]], group: List[Dict[str, str]]) -> Dict[str, List[Dict]]:
+                if changed is None:
+                    return await self._run_rules(run, kind, id_key, group, file_content, mode, max_prompt_tokens)
+                if not changed:
+                    return {rule.get("id", "unknown"): [] for rule in group}
+                # changed units go with the module's imports and globals, as chunks do
+                changed_units = [units[i] for i in changed]
+                source, line_map = render_units(file_lines, changed_units, context)
+                group_results = await self._run_rules(run, kind, id_key, group, source, mode, max_prompt_tokens)
+                for rule_id, rule_violations in group_results.items():
+                    # findings on context lines alone belong to unchanged units, whose results carry over
+                    group_results[rule_id] = [
+                        v for v in remap_violations(rule_violations, line_map)
+                        if any(unit.start_line <= v["start_line"] <= unit.end_line for unit in changed_units)
+                    ]
+                return group_results
+
+            # Fan out all LLM calls at once, then merge back in rule order
+            for group_results in await asyncio.gather(*(run_group(k, g) for k, g in groups.items())):
+                by_rule.update(group_results)
+
+            for rule in pending:
+                rule_id = rule.get("id", "unknown")
+                if rule_id in run.errors:
+                    continue  # not cached; the next run retries it
+                if rule_id in previous:
+                    prior = previous[rule_id]
+                    for unit in units:
+                        if unit.fingerprint in prior:
+                            by_rule[rule_id].extend(shift_unit_violations(prior[unit.fingerprint], unit))
+                    by_rule[rule_id].sort(key=lambda v: (v["start_line"], v["end_line"]))
+                if rule_id in run.incomplete:
+                    continue  # partial results are returned but not cached
+                self.cache.set(self.cache_key(kind, rule, file_hash), by_rule[rule_id])
+                if units:
+                    self.cache.set(self.unit_cache_key(kind, rule, filename), violations_by_unit(by_rule[rule_id], units))
+
+            violations = [v for rule in rules for v in by_rule[rule.get("id", "unknown")]]
+            outcome = RuleCheckOutcome(
+                violations=violations,
+                llm_requests=run.usage.calls,
+                cache=cache_status,
+                errors=run.errors,
+                incomplete=run.incomplete,
+                input_tokens_saved=run.tokens_saved,
+                prompt_tokens=run.usage.prompt_tokens,
+                cached_prompt_tokens=run.usage.cached_prompt_tokens,
+                skipped=skipped,
+            )
+            if units:
+                reanalyzed = set()
+                for changed in groups:
+                    reanalyzed.update(range(len(units)) if changed is None else changed)
+                outcome.units_total = len(units)
+                outcome.units_reanalyzed = len(reanalyzed)
+            check_span.set(
+                skipped=len(skipped),
+                cache_hits=sum(status == "hit" for status in cache_status.values()),
+                llm_requests=run.usage.calls,
+            )
+            return outcome
+
+    async def _run_rules(
+        self,
+        run: _RuleRun,
+        kind: str,
+        id_key: str,
+        rules: List[Dict[str, str]],
+        source: str,
+        mode: str,
+        max_prompt_tokens: int,
+    ) -> Dict[str, List[Dict]]:
+        """Send rules to the LLM against `source`; returns violations per rule id.
+
+        Large sources are split into chunks that are analysed in parallel, with
+        chunk line numbers mapped back to `source` coordinates. Rules whose LLM
+        call failed are recorded in run.errors, with no violations; rules whose
+        output could only partly be recovered are recorded in run.incomplete
+        and keep what was.
+        """
+        chunks = chunk_source(source, self.chunk_max_tokens, self.count_tokens)
+        task_chunks: List[SourceChunk] = []
+        task_rule_ids: List[List[str]] = []
+        tasks = []
+        for chunk in chunks:
+            rendered = self.render(chunk.text)
+            chunk_saving = self.tokens_saved(chunk.text, rendered)
+            if mode == "batched":
+                for batch in self.plan_batches(kind, id_key, rules, rendered, max_prompt_tokens):
+                    task_chunks.append(chunk)
+                    task_rule_ids.append([rule.get("id", "unknown") for rule in batch])
+                    tasks.append(self._check_batch(run, kind, id_key, batch, rendered))
+                    run.tokens_saved += chunk_saving
+            else:
+                for rule in rules:
+                    task_chunks.append(chunk)
+                    task_rule_ids.append([rule.get("id", "unknown")])
+                    tasks.append(self._check_rule(run, kind, id_key, rule, rendered))
+                    run.tokens_saved += chunk_saving
+
+        by_rule: Dict[str, List[Dict]] = {rule.get("id", "unknown"): [] for rule in rules}
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for chunk, rule_ids, result in zip(task_chunks, task_rule_ids, results):
+            if isinstance(result, LLMError):
+                # a failed call costs only its own rules, not the whole check
+                for rule_id in rule_ids:
+                    run.errors.setdefault(rule_id, str(result))
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            for rule_id, rule_violations in result.items():
+                by_rule[rule_id].extend(remap_violations(rule_violations, chunk.line_map))
+
+        if len(chunks) > 1:
+            shared_lines = shared_context_lines(chunks)
+            for rule_id, rule_violations in by_rule.items():
+                by_rule[rule_id] = merge_chunk_violations(rule_violations, id_key, shared_lines)
+        for rule_id in by_rule:
+            if rule_id in run.errors:
+                by_rule[rule_id] = []
+                run.incomplete.pop(rule_id, None)
+        return by_rule
+
+    async def _check_rule(
+        self, run: _RuleRun, kind: str, id_key: str, rule: Dict[str, str], source: str,
+    ) -> Dict[str, List[Dict]]:
+        rule_id = rule.get("id", "unknown")
+        with span("rule", rule_id=rule_id) as rule_span:
+            with span("build_prompt"):
+                prompt = build_rule_prompt(kind, rule_id, rule.get("description", "No description"), source)
+            rule_violations, done = await self.complete_json_list(prompt, "violations", violations_schema(), run.usage)
+            rule_span.set(violations=len(rule_violations), complete=done)
+        if not done:
+            run.incomplete.setdefault(rule_id, INCOMPLETE_OUTPUT)
+        # annotate with the rule id
+        for v in rule_violations:
+            v[id_key] = rule_id
+        return {rule_id: rule_violations}
+
+    async def _check_batch(
+        self, run: _RuleRun, kind: str, id_key: str, rules: List[Dict[str, str]], source: str,
+    ) -> Dict[str, List[Dict]]:
+        with span("rule_batch", rule_ids=[rule.get("id", "unknown") for rule in rules]):
+            with span("build_prompt"):
+                prompt = build_batch_rule_prompt(kind, id_key, rules, source)
+            schema = violations_schema(id_key)
+            output = await self.complete(prompt, self.output_max_tokens, schema, run.usage)
+            batch_violations, done = salvage(output, "violations", schema)
+        if not done:
+            # any rule in the batch may have lost violations; re-check them one by one
+            by_rule: Dict[str, List[Dict]] = {}
+            for rule_results in await asyncio.gather(*(self._check_rule(run, kind, id_key, rule, source) for rule in rules)):
+                by_rule.update(rule_results)
+            return by_rule
+
+        by_rule = {rule.get("id", "unknown"): [] for rule in rules}
+        for v in batch_violations:
+            # drop violations attributed to ids that weren't in this batch
+            if v.get(id_key) in by_rule:
+                by_rule[v[id_key]].append(v)
+        return by_rule
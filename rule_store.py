@@ -0,0 +1,156 @@
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class DuplicateRuleError(ValueError):
+    def __init__(self, ids: List[str]):
+        super().__init__(f"IDs already exist: {', '.join(ids)}")
+        self.ids = ids
+
+
+class RuleStore:
+    """Rules keyed by id, kept in insertion order and mirrored to SQLite.
+
+    Lookups and duplicate checks go to an in-memory dict; every write is a
+    single SQLite transaction, so a bulk import either lands completely or
+    not at all. Each write also bumps a version number stored next to the
+    rules, so processes sharing the database file notice each other's
+    changes and reload. Pass `path=None` to keep the store in memory only.
+    """
+
+    def __init__(self, path: Optional[str] = None, table: str = "rules"):
+        self.table = table
+        self._rules: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._epoch = uuid.uuid4().hex
+        self._version: Optional[int] = 0
+        if path:
+            # autocommit; transactions are opened explicitly in _transaction
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, position INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rule_versions ("
+                "name TEXT PRIMARY KEY, epoch TEXT NOT NULL, version INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO rule_versions (name, epoch, version) VALUES (?, ?, 0)",
+                (table, self._epoch),
+            )
+            self._db.execute("COMMIT")
+            self._version = None
+            self._sync()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._rules)
+
+    def __contains__(self, rule_id: str) -> bool:
+        with self._lock:
+            self._sync()
+            return rule_id in self._rules
+
+    def get(self, rule_id: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            self._sync()
+            return self._rules.get(rule_id)
+
+    def all(self) -> List[Dict[str, str]]:
+        """Snapshot of all rules in insertion order."""
+        return self.snapshot()[1]
+
+    def snapshot(self) -> Tuple[str, List[Dict[str, str]]]:
+        """(etag, rules) read atomically; the etag changes whenever the rule set does."""
+        with self._lock:
+            self._sync()
+            return f"{self._epoch}-{self._version}", list(self._rules.values())
+
+    def add(self, rules: List[Dict[str, str]]) -> None:
+        """Insert new rules. Raises DuplicateRuleError, adding none of them, if any id is taken."""
+        with self._transaction():
+            seen = set()
+            duplicates = []
+            for rule in rules:
+                if rule["id"] in self._rules or rule["id"] in seen:
+                    duplicates.append(rule["id"])
+                seen.add(rule["id"])
+            if duplicates:
+                raise DuplicateRuleError(duplicates)
+            self._write(rules)
+            for rule in rules:
+                self._rules[rule["id"]] = rule
+
+    def upsert(self, rules: List[Dict[str, str]]) -> Tuple[int, int]:
+        """Insert or replace rules by id; replaced rules keep their position. Returns (inserted, updated)."""
+        with self._transaction():
+            latest = {rule["id"]: rule for rule in rules}  # last one wins within a batch
+            updated = sum(1 for rule_id in latest if rule_id in self._rules)
+            self._write(list(latest.values()))
+            self._rules.update(latest)
+            return len(latest) - updated, updated
+
+    def delete(self, rule_ids: Iterable[str]) -> List[str]:
+        """Delete rules by id; returns the ids that existed."""
+        with self._transaction():
+            existing = list(dict.fromkeys(rule_id for rule_id in rule_ids if rule_id in self._rules))
+            if self._db is not None and existing:
+                self._db.executemany(f"DELETE FROM {self.table} WHERE id = ?", [(rule_id,) for rule_id in existing])
+            for rule_id in existing:
+                del self._rules[rule_id]
+            return existing
+
+    def _sync(self) -> None:
+        """Reload from SQLite if another process (or connection) changed the rules. Call with the lock held."""
+        if self._db is None:
+            return
+        epoch, version = self._db.execute(
+            "SELECT epoch, version FROM rule_versions WHERE name = ?", (self.table,)
+        ).fetchone()
+        if (epoch, version) == (self._epoch, self._version):
+            return
+        self._rules = {
+            rule_id: json.loads(data)
+            for rule_id, data in self._db.execute(f"SELECT id, data FROM {self.table} ORDER BY position")
+        }
+        self._epoch, self._version = epoch, version
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._db is None:
+                yield
+                self._version += 1
+                return
+            # IMMEDIATE takes the write lock up front, so duplicate checks see every other writer's commits
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._sync()
+                yield
+                self._db.execute("UPDATE rule_versions SET version = version + 1 WHERE name = ?", (self.table,))
+                self._db.execute("COMMIT")
+                self._version += 1
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                self._version = None  # memory may hold uncommitted changes; reload on next read
+                raise
+
+    def _write(self, rules: List[Dict[str, str]]) -> None:
+        if self._db is None or not rules:
+            return
+        (position,) = self._db.execute(f"SELECT COALESCE(MAX(position), 0) FROM {self.table}").fetchone()
+        self._db.executemany(
+            f"INSERT INTO {self.table} (id, data, position) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+            [(rule["id"], json.dumps(rule), position + i) for i, rule in enumerate(rules, 1)],
+        )
@@ -0,0 +1,79 @@
+import ast
+import io
+import tokenize
+from typing import Dict, FrozenSet, Iterable, Set
+
+# What render_source can leave out of a prompt
+ELIDABLE = ("blank", "comments", "docstrings")
+
+
+def parse_elide(value: str) -> FrozenSet[str]:
+    """Parse a comma-separated ELIDABLE list such as "blank,comments". Raises ValueError on unknown names."""
+    names = frozenset(name.strip() for name in value.split(",") if name.strip())
+    unknown = sorted(names - set(ELIDABLE))
+    if unknown:
+        raise ValueError(f"Unknown elide option(s) {', '.join(unknown)}; expected {', '.join(ELIDABLE)}.")
+    return names
+
+
+def docstring_lines(source: str) -> Set[int]:
+    """1-based lines of module, class and function docstrings. Empty if the source doesn't parse."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return set()
+    lines: Set[int] = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        body = node.body
+        if (
+            len(body) > 1  # a docstring-only body would be left empty
+            and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant)
+            and isinstance(body[0].value.value, str)
+        ):
+            lines.update(range(body[0].lineno, body[0].end_lineno + 1))
+    return lines
+
+
+def comment_columns(source: str) -> Dict[int, int]:
+    """1-based line -> column where its `#` comment starts. Empty if the source can't be tokenized."""
+    columns: Dict[int, int] = {}
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type == tokenize.COMMENT:
+                columns[token.start[0]] = token.start[1]
+    except (tokenize.TokenError, SyntaxError):
+        return {}
+    return columns
+
+
+def render_source(source: str, elide: Iterable[str] = (), number_every: int = 1) -> str:
+    """Source with line numbers, as `12|code`.
+
+    Every `number_every`-th line, the first line, and the first line after
+    an elided gap carry their 1-based number; the lines in between continue
+    the count. Elided lines are dropped but don't shift the numbering, so
+    line numbers the model reports still point into `source`.
+    """
+    elide = frozenset(elide)
+    skipped = docstring_lines(source) if "docstrings" in elide else set()
+    comments = comment_columns(source) if "comments" in elide else {}
+    rendered = []
+    previous = -1  # so the first rendered line is always numbered
+    for number, line in enumerate(source.splitlines(), 1):
+        if number in skipped:
+            continue
+        if number in comments:
+            line = line[:comments[number]].rstrip()
+            if not line:
+                continue  # the line was only a comment
+        if not line.strip() and "blank" in elide:
+            continue
+        if number == previous + 1 and number % number_every:
+            rendered.append(line)
+        else:
+            rendered.append(f"{number}|{line}")
+        previous = number
+    return "\n".join(rendered)
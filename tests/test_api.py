@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+# in-memory stores, so importing the app writes nothing to disk
+for name in ("RULE_STORE_PATH", "JOB_STORE_PATH", "RESULT_CACHE_PATH"):
+    os.environ.setdefault(name, "")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+client = TestClient(main.app)
+client.post("/add-regulations", json=[{"id": "R1", "description": "Never log personal data"}])
+client.post("/add-code-rules", json=[{"id": "C1", "description": "Never use eval"}])
+
+LATIN1 = "# caf\xe9\nx = 1\n".encode("latin-1")
+
+
+@pytest.mark.parametrize("path", ["/check-violations", "/check-code-violations", "/check-cost", "/check-all", "/jobs"])
+def test_non_utf8_uploads_are_rejected_with_400(path):
+    response = client.post(path, files={"file": ("latin1.py", LATIN1)})
+    assert response.status_code == 400
+    assert "not valid UTF-8" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("path", ["/check-violations", "/check-all", "/jobs"])
+def test_missing_source_is_rejected_with_400(path):
+    response = client.post(path)
+    assert response.status_code == 400
+
+
+def test_rule_lists_answer_304_until_they_change():
+    first = client.get("/get-regulations")
+    etag = first.headers["ETag"]
+    assert client.get("/get-regulations", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/get-regulations", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    client.put("/upsert-regulations", json=[{"id": "R1", "description": "Never log personal data or secrets"}])
+    changed = client.get("/get-regulations", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert [r["description"] for r in changed.json()] == ["Never log personal data or secrets"]
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import re
+import textwrap
+import types
+
+from code_units import (
+    chunk_source,
+    map_line,
+    merge_chunk_violations,
+    remap_violations,
+    render_units,
+    shared_context_lines,
+    split_units,
+    unit_index_for_line,
+)
+from rule_engine import RuleEngine, shift_unit_violations, violations_by_unit
+
+SOURCE = textwrap.dedent("""\
+    import os
+
+    LIMIT = 3
+
+    def first():
+        return eval(os.environ["A"])
+
+    @decorator
+    def second():
+        return 2
+
+    class Third:
+        def method(self):
+            return eval("3")
+""")
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_split_units_covers_decorators_and_module_runs():
+    units = split_units(SOURCE)
+    assert [(u.name, u.start_line, u.end_line) for u in units] == [
+        ("<module>", 1, 3),
+        ("def first", 5, 6),
+        ("def second", 8, 10),
+        ("class Third", 12, 14),
+    ]
+    assert unit_index_for_line(units, 4) == 0
+    assert unit_index_for_line(units, 11) == 2
+
+
+def test_fingerprints_ignore_position_but_not_content():
+    moved = split_units("\n\n" + SOURCE)
+    assert [u.fingerprint for u in moved] == [u.fingerprint for u in split_units(SOURCE)]
+    edited = split_units(SOURCE.replace("return 2", "return 22"))
+    assert [a.fingerprint == b.fingerprint for a, b in zip(edited, split_units(SOURCE))] == [True, True, False, True]
+
+
+def test_render_units_maps_lines_back_across_gaps():
+    units = split_units(SOURCE)
+    text, line_map = render_units(SOURCE.splitlines(), [units[1], units[3]])
+    assert text.splitlines()[2] == "# ..."
+    assert line_map == [5, 6, None, 12, 13, 14]
+    assert map_line(line_map, 3) == 6  # a separator maps to the line before it
+    assert map_line(line_map, 99) == 14
+    violations = remap_violations([{"start_line": 2, "end_line": 2}, {"start_line": 5, "end_line": 4}], line_map)
+    assert violations == [{"start_line": 6, "end_line": 6}, {"start_line": 13, "end_line": 13}]
+
+
+def test_chunks_carry_context_and_remap_to_source_lines():
+    chunks = chunk_source(SOURCE, 12, count_words)
+    assert len(chunks) > 1
+    lines = SOURCE.splitlines()
+    for chunk in chunks:
+        assert chunk.line_map[0] == 1  # every chunk starts with the imports
+        for rendered, original in zip(chunk.text.splitlines(), chunk.line_map):
+            if original is not None:
+                assert rendered == lines[original - 1]
+    covered = {line for chunk in chunks for line in chunk.line_map if line is not None}
+    assert covered >= {n for n, line in enumerate(lines, 1) if line.strip()}
+    assert {1, 3} <= shared_context_lines(chunks)
+
+
+def test_small_or_unparseable_source_is_one_chunk():
+    assert len(chunk_source(SOURCE, 10_000, count_words)) == 1
+    broken = "def broken(:\n" * 50
+    [chunk] = chunk_source(broken, 5, count_words)
+    assert chunk.text == broken and chunk.line_map == list(range(1, 51))
+
+
+def test_merge_chunk_violations_folds_duplicates_in_shared_context():
+    found = [
+        {"rule": "R1", "start_line": 1, "end_line": 1, "severity": "low"},
+        {"rule": "R1", "start_line": 1, "end_line": 1, "severity": "low"},
+        {"rule": "R1", "start_line": 1, "end_line": 3, "severity": "high"},
+        {"rule": "R1", "start_line": 6, "end_line": 6},
+        {"rule": "R2", "start_line": 1, "end_line": 1},
+    ]
+    merged = merge_chunk_violations(found, "rule", {1, 2, 3})
+    assert [(v["rule"], v["start_line"], v["end_line"], v.get("severity")) for v in merged] == [
+        ("R1", 1, 3, "high"),
+        ("R2", 1, 1, None),
+        ("R1", 6, 6, None),
+    ]
+
+
+def test_unit_relative_violations_shift_to_new_positions():
+    units = split_units(SOURCE)
+    stored = violations_by_unit([{"start_line": 6, "end_line": 6}, {"start_line": 14, "end_line": 14}], units)
+    moved = split_units("# header\n\n" + SOURCE)
+    restored = [v for unit in moved for v in shift_unit_violations(stored.get(unit.fingerprint, []), unit)]
+    assert restored == [{"start_line": 8, "end_line": 8}, {"start_line": 16, "end_line": 16}]
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+def test_incremental_check_rechecks_changed_units_and_moves_the_rest():
+    prompts = []
+
+    async def chat(**kwargs):
+        # report every numbered line that calls eval or imports os, as the model would
+        prompt = kwargs["messages"][0]["content"]
+        prompts.append(prompt)
+        lines = [int(n) for n in re.findall(r"^(\d+)\|(?:.*eval\(|import os)", prompt, re.MULTILINE)]
+        found = [{"start_line": n, "end_line": n, "description": "eval", "severity": "high"} for n in lines]
+        message = types.SimpleNamespace(content=json.dumps({"violations": found}))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    engine = RuleEngine(chat, DictCache(), model="m", provider="openai", prompt_version="1", count_tokens=count_words)
+    rules = [{"id": "SEC-1", "description": "Never use eval"}]
+
+    def check(source):
+        return asyncio.run(engine.check("code_rule", "code_rule_id", rules, source, incremental=True, filename="app.py"))
+
+    first = check(SOURCE)
+    assert [v["start_line"] for v in first.violations] == [1, 6, 14]
+
+    # two lines added above `first`, and `second` now calls eval too
+    edited = SOURCE.replace("LIMIT = 3\n", "LIMIT = 3\nRETRIES = 2\n\n").replace("return 2", "return eval('2')")
+    prompts.clear()
+    second = check(edited)
+    assert (second.units_total, second.units_reanalyzed) == (4, 2)
+    assert "def first" not in prompts[0] and "def second" in prompts[0]
+    # the module's imports and globals go along as context ...
+    assert "import os" in prompts[0] and "RETRIES = 2" in prompts[0]
+    # ... but findings on them aren't re-attributed: the unchanged import carries its earlier result once
+    assert [v["start_line"] for v in second.violations] == [1, 8, 12, 16]
@@ -0,0 +1,102 @@
+import textwrap
+import time
+
+from cost_projection import poly_eval, poly_label, project_costs
+
+
+def llm_call(line, cost=1.0, model="gpt-4o"):
+    return {"start_line": line, "end_line": line, "model": model, "estimated_cost": cost}
+
+
+def line_of(source, marker):
+    return next(i for i, text in enumerate(source.splitlines(), 1) if marker in text)
+
+
+def by_name(projections):
+    return {p.name: p for p in projections}
+
+
+def test_nested_loops_raise_the_degree():
+    source = textwrap.dedent("""\
+        def handle(items):
+            for item in items:
+                for part in item:
+                    client.create()  # llm
+            for _ in range(3):
+                client.create()  # fixed
+    """)
+    calls = [llm_call(line_of(source, "# llm"), 0.5), llm_call(line_of(source, "# fixed"), 0.1)]
+    handle = by_name(project_costs(source, calls))["handle"]
+    assert handle.calls == {2: 1.0, 0: 3.0}
+    assert poly_eval(handle.cost, 10) == 0.5 * 100 + 0.3
+    assert [poly_label(d, f) for d, f in handle.call_sites[0].calls.items()] == ["N^2"]
+
+
+def test_callers_inherit_callee_cost_times_loop_factor():
+    source = textwrap.dedent("""\
+        def ask():
+            client.create()
+
+        def batch(items):
+            for item in items:
+                ask()
+
+        def main():
+            for _ in [1, 2]:
+                batch([])
+            ask()
+    """)
+    projections = by_name(project_costs(source, [llm_call(2)]))
+    assert list(projections) == ["main"]
+    assert projections["main"].calls == {1: 2.0, 0: 1.0}
+
+
+def test_recursion_counts_one_level_and_is_flagged():
+    source = textwrap.dedent("""\
+        def walk(node):
+            client.create()
+            for child in node.children:
+                walk(child)
+
+        def run(tree):
+            walk(tree)
+    """)
+    run = by_name(project_costs(source, [llm_call(2)]))["run"]
+    assert run.recursive
+    assert run.calls == {0: 1.0}
+
+
+def test_mutual_recursion_without_outside_caller_keeps_its_calls():
+    source = textwrap.dedent("""\
+        def even(n):
+            client.create()
+            return odd(n - 1)
+
+        def odd(n):
+            for _ in range(n):
+                client.create()  # odd
+            return even(n - 1)
+    """)
+    calls = [llm_call(2), llm_call(line_of(source, "# odd"))]
+    projections = project_costs(source, calls)
+    assert [p.name for p in projections] == ["even"]
+    assert projections[0].recursive
+    assert projections[0].calls == {0: 1.0, 1: 1.0}
+
+
+def test_shared_callees_are_expanded_once():
+    # f_i calls f_{i-1} twice: 2^n paths but n+1 functions
+    lines = ["def f0():\n    client.create()\n"]
+    for i in range(1, 41):
+        lines.append(f"def f{i}():\n    f{i - 1}()\n    f{i - 1}()\n")
+    started = time.perf_counter()
+    projections = project_costs("".join(lines), [llm_call(2)])
+    assert time.perf_counter() - started < 1.0
+    assert [p.name for p in projections] == ["f40"]
+    assert projections[0].calls == {0: 2.0 ** 40}
+
+
+def test_module_scope_is_an_entry_point_and_bad_syntax_projects_nothing():
+    source = "for row in rows:\n    client.create()\n"
+    assert by_name(project_costs(source, [llm_call(2)]))["<module>"].calls == {1: 1.0}
+    assert project_costs("def broken(:\n", [llm_call(1)]) == []
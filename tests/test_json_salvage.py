@@ -0,0 +1,76 @@
+import json
+
+from json_salvage import matches_schema, salvage_json_list, strip_fences
+
+V1 = '{"start_line": 3, "end_line": 4, "description": "eval on input"}'
+V2 = '{"start_line": 9, "end_line": 9, "description": "plain HTTP"}'
+
+
+def test_complete_answer():
+    assert salvage_json_list('{"violations": [%s, %s]}' % (V1, V2), "violations") == (
+        [{"start_line": 3, "end_line": 4, "description": "eval on input"},
+         {"start_line": 9, "end_line": 9, "description": "plain HTTP"}],
+        True,
+    )
+    assert salvage_json_list('{"violations": []}', "violations") == ([], True)
+
+
+def test_fenced_answer():
+    assert strip_fences('```json\n{"a": 1}\n```') == '{"a": 1}'
+    items, complete = salvage_json_list('```json\n{"violations": [%s]}\n```' % V1, "violations")
+    assert complete and [item["start_line"] for item in items] == [3]
+
+
+def test_truncated_answer_keeps_closed_objects():
+    items, complete = salvage_json_list('{"violations": [%s, %s' % (V1, V2[:20]), "violations")
+    assert not complete
+    assert [item["start_line"] for item in items] == [3]
+
+
+def test_closed_list_with_missing_braces_is_complete():
+    items, complete = salvage_json_list('{"violations": [%s, %s]' % (V1, V2), "violations")
+    assert complete
+    assert [item["start_line"] for item in items] == [3, 9]
+
+
+def test_keyless_or_wrongly_typed_answers_are_incomplete():
+    for text in ('{}', '{"issues": [%s]}' % V1, '{"violations": null}', '{"violations": {}}', '[%s]' % V1):
+        assert salvage_json_list(text, "violations") == ([], False), text
+
+
+def test_unrelated_text_is_incomplete():
+    assert salvage_json_list("I could not find any violations.", "violations") == ([], False)
+    assert salvage_json_list('{"violations": [%s' % V1[:10], "violations") == ([], False)
+
+
+def test_non_object_items_are_dropped():
+    assert salvage_json_list('{"llm_calls": [1, "x", {"model": "gpt-4o"}]}', "llm_calls") == ([{"model": "gpt-4o"}], True)
+
+
+ITEM = {
+    "type": "object",
+    "properties": {
+        "start_line": {"type": "integer"},
+        "end_line": {"type": "integer"},
+        "description": {"type": "string"},
+        "severity": {"type": "string", "enum": ["low", "medium", "high"]},
+    },
+    "required": ["start_line", "end_line", "description"],
+}
+
+
+def test_matches_schema():
+    assert matches_schema({"start_line": 1, "end_line": 2, "description": "x"}, ITEM)
+    assert not matches_schema({"start_line": 1, "end_line": 2}, ITEM)
+    assert not matches_schema({"start_line": None, "end_line": 2, "description": "x"}, ITEM)
+    assert not matches_schema({"start_line": "2-3", "end_line": 3, "description": "x"}, ITEM)
+    assert not matches_schema({"start_line": True, "end_line": 3, "description": "x"}, ITEM)
+    assert not matches_schema({"start_line": 1, "end_line": 2, "description": "x", "severity": "critical"}, ITEM)
+
+
+def test_invalid_items_are_dropped_and_the_answer_is_incomplete():
+    text = '{"violations": [%s, {"start_line": "2-3", "end_line": 3, "description": "x"}, {"start_line": 4}]}' % V1
+    items, complete = salvage_json_list(text, "violations", ITEM)
+    assert not complete
+    assert [item["start_line"] for item in items] == [3]
+    assert salvage_json_list('{"violations": [%s]}' % V1, "violations", ITEM) == ([json.loads(V1)], True)
@@ -0,0 +1,100 @@
+import pathlib
+import textwrap
+
+from llm_call_analyzer import find_llm_calls
+
+SAMPLE = pathlib.Path(__file__).resolve().parent.parent / "sample_llm_calls.py"
+
+
+def summary(source):
+    return [
+        (c.start_line, c.provider, c.call_type, c.model, c.model_origin, c.max_tokens, c.function)
+        for c in find_llm_calls(textwrap.dedent(source)).calls
+    ]
+
+
+def test_sample_call_sites():
+    scan = find_llm_calls(SAMPLE.read_text())
+    assert [(c.start_line, c.end_line, c.provider, c.call_type, c.model, c.model_origin, c.max_tokens, c.function) for c in scan.calls] == [
+        (18, 23, "openai", "chat", "gpt-3.5-turbo", "default argument", 500, "get_openai_completion"),
+        (28, 31, "openai", "embedding", "text-embedding-ada-002", "literal", None, "get_openai_embedding"),
+        (36, 40, "anthropic", "chat", "claude-3-haiku", "default argument", 1000, "get_anthropic_completion"),
+        (62, 68, "openai", "chat", "gpt-4", "literal", 1000, "rag_search_and_answer"),
+        (78, 86, "openai", "chat", "gpt-4-turbo", "literal", 300, "batch_process_documents"),
+    ]
+    assert not scan.needs_llm
+
+
+def test_import_aliases_and_instance_clients():
+    assert summary("""\
+        import openai as oa
+        from anthropic import Anthropic as Claude
+
+        MODEL = "claude-3-opus"
+
+        class Bot:
+            def __init__(self):
+                self.client = oa.OpenAI()
+                self.claude = Claude()
+                self.model = "gpt-4o"
+
+            def ask(self, prompt):
+                return self.client.chat.completions.create(model=self.model, messages=[])
+
+            def summarize(self, text):
+                return self.claude.messages.create(model=MODEL, max_tokens=256, messages=[])
+    """) == [
+        (13, "openai", "chat", "gpt-4o", "constant", None, "ask"),
+        (16, "anthropic", "chat", "claude-3-opus", "constant", 256, "summarize"),
+    ]
+
+
+def test_inline_clients_legacy_api_and_untraced_receivers():
+    assert summary("""\
+        import openai
+        from openai import OpenAI
+
+        def inline():
+            return OpenAI().embeddings.create(model="text-embedding-3-small", input="x")
+
+        def legacy(prompt):
+            model = "gpt-3.5-turbo"
+            return openai.ChatCompletion.create(model=model, messages=[], max_tokens=64)
+
+        def passed_in(client, model):
+            return client.chat.completions.create(model=model, messages=[])
+
+        def not_an_llm(client):
+            return client.messages.create(to="+1555", body="hi")
+    """) == [
+        (5, "openai", "embedding", "text-embedding-3-small", "literal", None, "inline"),
+        (9, "openai", "chat", "gpt-3.5-turbo", "local variable", 64, "legacy"),
+        (12, "openai", "chat", None, None, None, "passed_in"),
+    ]
+
+
+def test_models_from_client_constructors_and_wrapper_defaults():
+    scan = find_llm_calls(textwrap.dedent("""\
+        from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+        chat = ChatOpenAI(model="gpt-4o-mini", max_tokens=128)
+        embeddings = OpenAIEmbeddings()
+
+        def answer(question):
+            return chat.invoke(question)
+
+        def embed(text):
+            return embeddings.embed_query(text)
+    """))
+    assert [(c.start_line, c.provider, c.call_type, c.model, c.model_origin, c.max_tokens) for c in scan.calls] == [
+        (7, "langchain", "chat", "gpt-4o-mini", "client constructor", 128),
+        (10, "langchain", "embedding", "text-embedding-ada-002", "client default", None),
+    ]
+
+
+def test_unresolved_models_and_bad_syntax_need_the_llm():
+    scan = find_llm_calls("def f(client, model):\n    return client.chat.completions.create(model=model)\n")
+    assert [c.start_line for c in scan.unresolved] == [2]
+    assert scan.needs_llm
+    broken = find_llm_calls("def broken(:\n")
+    assert (broken.parsed, broken.calls, broken.needs_llm) == (False, [], True)
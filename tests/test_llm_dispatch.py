@@ -0,0 +1,179 @@
+import asyncio
+import types
+
+import pytest
+
+from llm_dispatch import CircuitBreaker, CircuitOpenError, LLMDispatcher, LLMError
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """chat.completions.create that sleeps `delay` seconds, then answers or raises the next queued error."""
+
+    def __init__(self, delay=0.0, errors=()):
+        self.delay = delay
+        self.errors = list(errors)
+        self.calls = 0
+        self.cancelled = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.errors:
+            raise self.errors.pop(0)
+        message = types.SimpleNamespace(content=kwargs["messages"][0]["content"])
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+def request(text="hi"):
+    return {"model": "m", "messages": [{"role": "user", "content": text}]}
+
+
+def content(response):
+    return response.choices[0].message.content
+
+
+def open_breaker(reset_after=0.0):
+    breaker = CircuitBreaker(threshold=1, reset_after=reset_after)
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=2, reset_after=60)
+    assert breaker.before_call() is False
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = open_breaker()
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_trial_success_closes_and_failure_reopens():
+    breaker = open_breaker()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+    breaker = open_breaker()
+    breaker.reset_after = 60
+    breaker.opened_at -= 60  # cool-down elapsed
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_breaker_neutral_trial_frees_the_slot():
+    breaker = open_breaker()
+    breaker.before_call()
+    breaker.record_neutral()
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+
+
+def test_retries_transient_errors_then_succeeds():
+    client = FakeClient(errors=[UpstreamError(503), UpstreamError(429)])
+    dispatcher = LLMDispatcher(max_retries=3, backoff_base=0, backoff_max=0)
+    response = asyncio.run(dispatcher.create(client, **request()))
+    assert content(response) == "hi"
+    assert client.calls == 3
+    assert dispatcher.stats["retries"] == 2
+
+
+def test_non_transient_error_is_not_retried():
+    client = FakeClient(errors=[UpstreamError(400)])
+    dispatcher = LLMDispatcher(max_retries=3, backoff_base=0)
+    with pytest.raises(LLMError):
+        asyncio.run(dispatcher.create(client, **request()))
+    assert client.calls == 1
+    assert dispatcher.breaker.state == "closed"
+
+
+def test_cancelled_half_open_trial_releases_the_circuit():
+    async def scenario():
+        dispatcher = LLMDispatcher(breaker_threshold=1, breaker_reset=0)
+        dispatcher.breaker.record_failure()
+        assert dispatcher.breaker.state == "half_open"
+
+        trial = asyncio.create_task(dispatcher.create(FakeClient(delay=10), **request("trial")))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        # the next call becomes the new trial instead of failing with CircuitOpenError
+        response = await dispatcher.create(FakeClient(), **request("next"))
+        assert content(response) == "next"
+        assert dispatcher.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_identical_concurrent_requests_share_one_call():
+    async def scenario():
+        client = FakeClient(delay=0.05)
+        dispatcher = LLMDispatcher()
+        responses = await asyncio.gather(*(dispatcher.create(client, **request()) for _ in range(3)))
+        assert [content(r) for r in responses] == ["hi"] * 3
+        assert client.calls == 1
+        assert dispatcher.stats["coalesced"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_first_caller_does_not_fail_followers():
+    async def scenario():
+        client = FakeClient(delay=0.05)
+        dispatcher = LLMDispatcher()
+        first = asyncio.create_task(dispatcher.create(client, **request()))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(dispatcher.create(client, **request()))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert content(await follower) == "hi"
+        assert client.calls == 1
+        assert client.cancelled == 0
+
+    asyncio.run(scenario())
+
+
+def test_upstream_call_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        client = FakeClient(delay=10)
+        dispatcher = LLMDispatcher()
+        callers = [asyncio.create_task(dispatcher.create(client, **request())) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert client.cancelled == 1
+        assert not dispatcher._inflight
+
+        # a later identical request starts a fresh call rather than joining the cancelled one
+        client.delay = 0
+        assert content(await dispatcher.create(client, **request())) == "hi"
+        assert client.calls == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+import os
+import textwrap
+
+from relevance import RelevanceIndex, filter_relevant, profile_source
+from rule_engine import RuleEngine
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RULES = [
+    {"id": "SEC-1", "description": "Never use eval on untrusted input"},
+    {"id": "NET-1", "description": "All external API calls must use TLS"},
+    {"id": "GDPR-1", "description": "Personal data such as names and email addresses must not be logged in plain text"},
+    {"id": "GDPR-2", "description": "Users must be able to request deletion of their personal data"},
+    {"id": "GDPR-3", "description": "Personal data may only be sent to third parties with the user's consent"},
+    {"id": "STYLE-1", "description": "Functions should have docstrings"},
+]
+
+REQUESTS_ONLY = textwrap.dedent("""\
+    import requests
+
+    def sync(profile):
+        return requests.post("https://crm.example.com/contacts", json=profile, timeout=10)
+""")
+
+
+def sample(name):
+    with open(os.path.join(REPO, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def rule_ids(rules):
+    return [rule["id"] for rule in rules]
+
+
+def default_engine():
+    return RuleEngine(chat=None, cache=None, model="m", provider="openai", prompt_version="1", count_tokens=len)
+
+
+def test_filter_is_off_by_default_so_sample_files_keep_every_rule():
+    engine = default_engine()
+    for source in (sample("sample_bad.py"), sample("sample_good.py"), sample("sample_llm_calls.py"), REQUESTS_ONLY):
+        kept, skipped = engine.relevant(RULES, source)
+        assert rule_ids(kept) == rule_ids(RULES)
+        assert skipped == {}
+
+
+def test_profile_indexes_parameters_calls_and_imports():
+    profile = profile_source(REQUESTS_ONLY)
+    assert {"request", "post", "profile", "json"} <= profile.terms
+    assert {"network", "personal_data"} <= profile.concepts
+
+
+def test_requests_only_file_keeps_gdpr_rules_when_filtering():
+    kept, skipped = filter_relevant(RULES, REQUESTS_ONLY, 0.2)
+    assert {"NET-1", "GDPR-3"} <= set(rule_ids(kept))
+    assert "SEC-1" in skipped
+
+
+def test_scoring_and_skip_reasons():
+    index = RelevanceIndex(RULES)
+    profile = profile_source(sample("sample_bad.py"))
+    assert index.relevance("STYLE-1", profile) is None  # about no known concept: always runs
+    assert index.relevance("GDPR-1", profile).score > 0.5
+    tls = index.relevance("NET-1", profile)
+    assert tls.score == 0 and tls.missing == ["network"]
+
+    kept, skipped = filter_relevant(RULES, sample("sample_bad.py"), 0.2)
+    assert "STYLE-1" in rule_ids(kept)
+    assert skipped["NET-1"] == "relevance 0.00 below 0.2; no network code found"
+
+
+def test_unparseable_source_is_indexed_word_by_word():
+    profile = profile_source("def broken(:\n    subprocess.run(cmd, shell=True)\n")
+    assert "execution" in profile.concepts
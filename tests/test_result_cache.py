@@ -0,0 +1,52 @@
+import sqlite3
+
+from result_cache import CACHE_WRITE_ERRORS, ResultCache, make_cache_key
+
+
+class LockedConnection:
+    """Stands in for a SQLite connection another process keeps locked."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, statement, parameters=()):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            raise sqlite3.OperationalError("database is locked")
+        return self.db.execute(statement, parameters)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+
+def test_values_survive_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResultCache(path).set("k", {"violations": [1]})
+    assert ResultCache(path).get("k") == {"violations": [1]}
+
+
+def test_sqlite_tier_uses_wal(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_locked_database_does_not_fail_the_write(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    cache._db = LockedConnection(cache._db)
+    errors = CACHE_WRITE_ERRORS.labels().value
+    cache.set("k", [1])
+    assert cache.get("k") == [1]  # still served from memory
+    assert CACHE_WRITE_ERRORS.labels().value == errors + 1
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl=0)
+    cache.set("k", 1)
+    assert cache.get("k") is None
+
+
+def test_cache_keys_depend_on_every_part():
+    assert make_cache_key("a", "b") != make_cache_key("ab")
+    assert make_cache_key("a", "b") == make_cache_key("a", "b")
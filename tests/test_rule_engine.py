@@ -0,0 +1,105 @@
+import asyncio
+import json
+import types
+
+from llm_dispatch import LLMError
+from rule_engine import RuleEngine
+
+SOURCE = "import requests\n\ndef fetch(url):\n    return requests.get(url, verify=False)\n"
+
+RULES = [
+    {"id": "R1", "description": "All external API calls must use TLS"},
+    {"id": "R2", "description": "Personal data must not be logged"},
+]
+
+GOOD = {"start_line": 4, "end_line": 4, "description": "TLS verification disabled", "severity": "high"}
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+def response(content):
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+def engine_answering(answer, cache=None):
+    """RuleEngine whose model replies answer(prompt, max_tokens); the prompts it was sent are in engine.prompts."""
+    prompts = []
+
+    async def chat(**kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        prompts.append(prompt)
+        return response(answer(prompt, kwargs["max_tokens"]))
+
+    engine = RuleEngine(chat, cache or DictCache(), model="m", provider="openai", prompt_version="1", count_tokens=len)
+    engine.prompts = prompts
+    return engine
+
+
+def check(engine, mode="per_rule", rules=RULES):
+    return asyncio.run(engine.check("regulation", "regulation_id", rules, SOURCE, mode=mode))
+
+
+def test_invalid_violation_marks_only_its_rule_incomplete():
+    def answer(prompt, max_tokens):
+        if "Personal data" in prompt:
+            return json.dumps({"violations": [{"start_line": "2-3", "end_line": None, "severity": "high"}]})
+        return json.dumps({"violations": [GOOD]})
+
+    outcome = check(engine_answering(answer))
+    assert [(v["regulation_id"], v["start_line"]) for v in outcome.violations] == [("R1", 4)]
+    assert list(outcome.incomplete) == ["R2"]
+    assert outcome.errors == {}
+
+
+def test_invalid_batch_entries_fall_back_to_per_rule_checks():
+    def answer(prompt, max_tokens):
+        if "- 'R1'" in prompt:  # the batched prompt
+            return json.dumps({"violations": [{**GOOD, "regulation_id": "R1", "start_line": None}]})
+        return json.dumps({"violations": [GOOD] if "TLS" in prompt else []})
+
+    engine = engine_answering(answer)
+    outcome = check(engine, mode="batched")
+    assert len(engine.prompts) == 3  # the batch, then each rule on its own
+    assert [(v["regulation_id"], v["start_line"]) for v in outcome.violations] == [("R1", 4)]
+    assert outcome.incomplete == {}
+
+
+def test_llm_requests_counts_retries_and_fallbacks():
+    truncated = '{"violations": [%s, {"start_line": 7' % json.dumps(GOOD)
+
+    outcome = check(engine_answering(lambda prompt, max_tokens: truncated), rules=RULES[:1])
+    assert outcome.llm_requests == 2  # first answer, then the retry with twice the budget
+    assert list(outcome.incomplete) == ["R1"]
+
+    outcome = check(engine_answering(lambda prompt, max_tokens: truncated), mode="batched")
+    assert outcome.llm_requests == 5  # the batch, then two attempts per rule
+
+
+def test_llm_requests_counts_failed_calls():
+    async def chat(**kwargs):
+        raise LLMError("provider down")
+
+    engine = RuleEngine(chat, DictCache(), model="m", provider="openai", prompt_version="1", count_tokens=len)
+    outcome = check(engine)
+    assert outcome.llm_requests == 2
+    assert sorted(outcome.errors) == ["R1", "R2"]
+
+
+def test_cached_results_are_keyed_by_provider():
+    def engine(provider):
+        return RuleEngine(None, DictCache(), model="gpt-4", provider=provider, prompt_version="1", count_tokens=len)
+
+    openai, local = engine("openai"), engine("llamacpp_server")
+    rule = RULES[0]
+    assert openai.cache_key("regulation", rule, "hash") != local.cache_key("regulation", rule, "hash")
+    assert openai.unit_cache_key("regulation", rule, "a.py") != local.unit_cache_key("regulation", rule, "a.py")
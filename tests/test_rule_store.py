@@ -0,0 +1,73 @@
+import pytest
+
+from rule_store import DuplicateRuleError, RuleStore
+
+
+def rule(rule_id, description="rule"):
+    return {"id": rule_id, "description": description}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return RuleStore(str(tmp_path / "rules.db") if request.param == "sqlite" else None)
+
+
+def test_duplicate_in_batch_adds_nothing(store):
+    store.add([rule("R1")])
+    etag, _ = store.snapshot()
+    with pytest.raises(DuplicateRuleError) as error:
+        store.add([rule("R2"), rule("R3"), rule("R2")])
+    assert error.value.ids == ["R2"]
+    with pytest.raises(DuplicateRuleError):
+        store.add([rule("R4"), rule("R1")])
+    assert [r["id"] for r in store.all()] == ["R1"]
+    assert store.snapshot()[0] == etag
+
+
+def test_upsert_replaces_in_place_and_appends_new_rules(store):
+    store.add([rule("R1"), rule("R2"), rule("R3")])
+    assert store.upsert([rule("R2", "changed"), rule("R4"), rule("R4", "last wins")]) == (1, 1)
+    assert [(r["id"], r["description"]) for r in store.all()] == [
+        ("R1", "rule"), ("R2", "changed"), ("R3", "rule"), ("R4", "last wins"),
+    ]
+    assert store.delete(["R3", "R9", "R3"]) == ["R3"]
+    assert [r["id"] for r in store.all()] == ["R1", "R2", "R4"]
+
+
+def test_etag_changes_on_every_write(store):
+    etags = [store.snapshot()[0]]
+    store.add([rule("R1")])
+    etags.append(store.snapshot()[0])
+    store.upsert([rule("R1", "changed")])
+    etags.append(store.snapshot()[0])
+    store.delete(["R1"])
+    etags.append(store.snapshot()[0])
+    assert len(set(etags)) == 4
+    assert store.snapshot()[0] == etags[-1]  # reads leave it alone
+
+
+def test_stores_sharing_a_file_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "rules.db")
+    first, second = RuleStore(path), RuleStore(path)
+    first.add([rule("R1"), rule("R2")])
+    assert [r["id"] for r in second.all()] == ["R1", "R2"]
+    with pytest.raises(DuplicateRuleError):
+        second.add([rule("R2")])
+
+    etag = first.snapshot()[0]
+    second.upsert([rule("R1", "changed")])
+    assert first.get("R1")["description"] == "changed"
+    assert first.snapshot()[0] != etag
+    assert first.snapshot()[0] == second.snapshot()[0]
+
+    second.delete(["R2"])
+    assert "R2" not in first and len(first) == 1
+    assert [r["id"] for r in RuleStore(path).all()] == ["R1"]
+
+
+def test_tables_are_versioned_separately(tmp_path):
+    path = str(tmp_path / "rules.db")
+    regulations, code_rules = RuleStore(path, table="regulations"), RuleStore(path, table="code_rules")
+    etag = code_rules.snapshot()[0]
+    regulations.add([rule("R1")])
+    assert code_rules.all() == [] and code_rules.snapshot()[0] == etag
@@ -0,0 +1,54 @@
+import textwrap
+
+import pytest
+
+from rule_engine import RuleEngine
+from source_render import parse_elide, render_source
+
+SOURCE = textwrap.dedent('''\
+    def load(path):
+        """Read the file."""
+        # open it
+        with open(path) as f:  # text mode
+
+            return f.read()
+''')
+
+
+def test_every_line_is_numbered_by_default():
+    assert render_source(SOURCE).splitlines() == [
+        f"{number}|{line}" for number, line in enumerate(SOURCE.splitlines(), 1)
+    ]
+
+
+def test_elision_keeps_original_line_numbers():
+    assert render_source(SOURCE, ("blank", "comments", "docstrings")).splitlines() == [
+        "1|def load(path):",
+        "4|    with open(path) as f:",
+        "6|        return f.read()",
+    ]
+
+
+def test_sparse_anchors_number_the_first_line_after_a_gap():
+    assert render_source(SOURCE, ("blank",), number_every=5).splitlines() == [
+        "1|def load(path):",
+        '    """Read the file."""',
+        "    # open it",
+        "    with open(path) as f:  # text mode",
+        "6|        return f.read()",
+    ]
+
+
+def test_parse_elide_rejects_unknown_names():
+    assert parse_elide(" blank, comments ,") == {"blank", "comments"}
+    with pytest.raises(ValueError):
+        parse_elide("blank,whitespace")
+
+
+def test_tokens_saved_is_measured_against_the_numbered_source_and_never_negative():
+    engine = RuleEngine(
+        chat=None, cache=None, model="m", provider="openai", prompt_version="1", count_tokens=len, elide=frozenset(),
+    )
+    assert engine.tokens_saved(SOURCE, engine.render(SOURCE)) == 0
+    elided = render_source(SOURCE, ("blank", "comments", "docstrings"))
+    assert engine.tokens_saved(SOURCE, elided) == len(render_source(SOURCE)) - len(elided) > 0
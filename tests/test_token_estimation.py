@@ -0,0 +1,19 @@
+import token_estimation
+from token_estimation import count_tokens
+
+
+def test_counts_follow_the_piece_rules():
+    assert count_tokens("") == 0
+    assert count_tokens("hello world") == 2
+    assert count_tokens("extraordinarily") == 3  # long identifiers split every ~5 chars
+    assert count_tokens("hello", "claude-3-haiku") == 1
+
+
+def test_cache_holds_pieces_not_texts():
+    token_estimation._cached_piece_tokens.cache_clear()
+    blob = "x" * 10_000
+    text = f"data = '{blob}'\n" * 3
+    assert count_tokens(text) == count_tokens(text)
+    cached = token_estimation._cached_piece_tokens.cache_info()
+    assert cached.currsize < 10
+    assert cached.hits > 0
@@ -0,0 +1,202 @@
+import ast
+import math
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional
+
+from llm_call_analyzer import DetectedCall, FunctionNode, NameScope, dotted_name
+
+# Pre-tokenizer modelled on the cl100k_base split pattern: contractions,
+# letter runs, 1-3 digit groups, punctuation runs and whitespace runs.
+_PIECES = re.compile(r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|_+|\s+")
+
+# Token density of other tokenizer families relative to cl100k_base
+FAMILY_SCALE = {
+    "cl100k": 1.0,
+    "o200k": 0.95,
+    "claude": 1.1,
+    "sentencepiece": 1.05,
+}
+
+# Model-name prefixes -> tokenizer family (first match wins)
+MODEL_FAMILIES = (
+    ("gpt-4o", "o200k"),
+    ("o1", "o200k"),
+    ("gpt-4", "cl100k"),
+    ("gpt-3.5", "cl100k"),
+    ("text-embedding", "cl100k"),
+    ("claude", "claude"),
+    ("gemma", "sentencepiece"),
+    ("llama", "sentencepiece"),
+    ("mistral", "sentencepiece"),
+)
+
+# Chat framing overhead per message, plus priming for the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Tokens assumed for prompt parts only known at runtime, by variable-name hint
+DYNAMIC_TOKENS = 500
+DYNAMIC_HINTS = (
+    ("context", 4000),  # RAG context
+    ("document", 1000),
+    ("doc", 1000),
+    ("query", 50),
+    ("question", 50),
+)
+
+# Output tokens assumed when a call sets no max_tokens
+DEFAULT_OUTPUT_TOKENS = {"chat": 500, "completion": 256, "embedding": 0}
+
+# Keyword arguments that carry prompt text into an SDK call
+PROMPT_KWARGS = ("messages", "prompt", "input", "system", "text")
+
+
+def tokenizer_family(model: Optional[str]) -> str:
+    name = (model or "").lower()
+    for prefix, family in MODEL_FAMILIES:
+        if name.startswith(prefix):
+            return family
+    return "cl100k"
+
+
+def _piece_tokens(piece: str) -> int:
+    word = piece.strip()
+    if not word:
+        return 1  # whitespace runs merge into one token
+    if word[0].isalpha():
+        # common words are single tokens; long identifiers split every ~5 chars
+        return 1 if len(word) <= 8 else math.ceil(len(word) / 5)
+    if word[0].isdigit():
+        return 1
+    return math.ceil(len(word) / 2)
+
+
+# Pieces repeat across files, so they are cached rather than whole texts;
+# the length cap keeps one long literal from pinning memory.
+_cached_piece_tokens = lru_cache(maxsize=8192)(_piece_tokens)
+_CACHED_PIECE_CHARS = 64
+
+
+def _cl100k_tokens(text: str) -> int:
+    return sum(
+        _cached_piece_tokens(piece) if len(piece) <= _CACHED_PIECE_CHARS else _piece_tokens(piece)
+        for piece in _PIECES.findall(text)
+    )
+
+
+def count_tokens(text: str, model: Optional[str] = "gpt-4") -> int:
+    """Approximate token count for `text` under `model`'s tokenizer; deterministic and offline."""
+    if not text:
+        return 0
+    return max(1, round(_cl100k_tokens(text) * FAMILY_SCALE[tokenizer_family(model)]))
+
+
+def _dynamic_guess(name: str) -> int:
+    lowered = name.lower()
+    for hint, tokens in DYNAMIC_HINTS:
+        if hint in lowered:
+            return tokens
+    return DYNAMIC_TOKENS
+
+
+@dataclass
+class PromptSize:
+    tokens: int = 0
+    dynamic: List[str] = field(default_factory=list)  # runtime values whose size was assumed
+
+    def add(self, other: "PromptSize") -> "PromptSize":
+        self.tokens += other.tokens
+        self.dynamic.extend(name for name in other.dynamic if name not in self.dynamic)
+        return self
+
+
+# Expressions whose value PromptSizer can follow through a variable binding
+_SIZABLE = (ast.Constant, ast.JoinedStr, ast.BinOp, ast.List, ast.Tuple, ast.Dict, ast.Name)
+
+
+class PromptSizer:
+    """Statically sizes prompt expressions at one call site."""
+
+    def __init__(self, names: NameScope, function: Optional[FunctionNode], line: int, model: Optional[str]):
+        self.names = names
+        self.function = function
+        self.line = line
+        self.model = model
+
+    def dynamic(self, label: str) -> PromptSize:
+        return PromptSize(_dynamic_guess(label), [label])
+
+    def size(self, expr: ast.expr) -> PromptSize:
+        return self._size(expr, self.function, 0)
+
+    def _size(self, expr: ast.expr, function: Optional[FunctionNode], depth: int) -> PromptSize:
+        if depth > 8:
+            return self.dynamic(dotted_name(expr) or "expression")
+        if isinstance(expr, ast.Constant):
+            return PromptSize(count_tokens(str(expr.value), self.model) if expr.value is not None else 0)
+        if isinstance(expr, ast.JoinedStr):
+            total = PromptSize()
+            for part in expr.values:
+                value = part.value if isinstance(part, ast.FormattedValue) else part
+                total.add(self._size(value, function, depth + 1))
+            return total
+        if isinstance(expr, ast.BinOp) and isinstance(expr.op, (ast.Add, ast.Mod)):
+            return self._size(expr.left, function, depth + 1).add(self._size(expr.right, function, depth + 1))
+        if isinstance(expr, (ast.List, ast.Tuple)):
+            total = PromptSize()
+            for element in expr.elts:
+                total.add(self._size(element, function, depth + 1))
+            if expr.elts and all(isinstance(e, ast.Dict) for e in expr.elts):
+                total.tokens += TOKENS_PER_MESSAGE * len(expr.elts) + TOKENS_PER_REPLY
+            return total
+        if isinstance(expr, ast.Dict):
+            total = PromptSize()
+            for key, value in zip(expr.keys, expr.values):
+                # the role is covered by the per-message overhead
+                if not (isinstance(key, ast.Constant) and key.value == "role"):
+                    total.add(self._size(value, function, depth + 1))
+            return total
+        if isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and expr.func.attr == "format":
+            total = self._size(expr.func.value, function, depth + 1)
+            for arg in list(expr.args) + [kw.value for kw in expr.keywords]:
+                total.add(self._size(arg, function, depth + 1))
+            return total
+        if isinstance(expr, ast.Name):
+            bound, origin = self.names.lookup(expr.id, function, self.line)
+            if bound is None or not isinstance(bound, _SIZABLE):
+                return self.dynamic(expr.id)
+            # module constants are resolved outside the function's scope
+            return self._size(bound, function if origin != "constant" else None, depth + 1)
+        if isinstance(expr, ast.Starred):
+            return self._size(expr.value, function, depth + 1)
+        if isinstance(expr, ast.Subscript):
+            return self.dynamic(dotted_name(expr.value) or "expression")
+        label = dotted_name(expr.func) if isinstance(expr, ast.Call) else dotted_name(expr)
+        return self.dynamic(label or "expression")
+
+
+@dataclass
+class CallTokenEstimate:
+    input_tokens: int
+    output_tokens: int
+    dynamic_inputs: List[str]
+    output_is_cap: bool  # True when output_tokens comes from max_tokens
+
+
+def estimate_call_tokens(call: DetectedCall) -> CallTokenEstimate:
+    """Estimate input/output tokens for a statically detected call."""
+    prompt_args = list(call.node.args) + [kw.value for kw in call.node.keywords if kw.arg in PROMPT_KWARGS]
+    sizer = PromptSizer(call.names, call.scope, call.start_line, call.model)
+    size = PromptSize()
+    for arg in prompt_args:
+        size.add(sizer.size(arg))
+
+    if call.call_type == "embedding":
+        output_tokens, capped = 0, False
+    elif call.max_tokens is not None:
+        output_tokens, capped = call.max_tokens, True
+    else:
+        output_tokens, capped = DEFAULT_OUTPUT_TOKENS.get(call.call_type, 500), False
+    return CallTokenEstimate(size.tokens, output_tokens, size.dynamic, capped)
@@ -0,0 +1,176 @@
+import json
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+SERVICE_NAME = "compliance-checker"
+
+
+class Span:
+    """One timed stage of a traced request; children are opened with `span()` while it is current."""
+
+    def __init__(self, trace: "_Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> Optional[str]:
+        return self.trace.trace_id
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def rename(self, name: str) -> None:
+        self.name = name
+
+
+class _NoopSpan:
+    """Stands in for a span when the request isn't sampled."""
+
+    trace_id: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def rename(self, name: str) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.open = 0
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return {"arrayValue": {"values": [_attribute_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def otlp_json(spans: List[Span]) -> Dict[str, Any]:
+    """Spans as an OTLP/JSON ExportTraceServiceRequest."""
+    encoded = []
+    for s in spans:
+        encoded_span = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1 if s.parent_id else 2,  # INTERNAL, or SERVER for the request itself
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _attributes(s.attributes),
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            encoded_span["parentSpanId"] = s.parent_id
+        encoded.append(encoded_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": encoded}],
+        }],
+    }
+
+
+class Tracer:
+    """Samples traces and appends each finished one to a JSONL file.
+
+    Every line is one OTLP/JSON export request, the format the
+    OpenTelemetry Collector's file exporter writes and its `otlpjsonfile`
+    receiver reads. Spans are written whenever none of their trace's spans
+    are still open: normally once per request, but a streamed response
+    keeps working after the request span has ended, so its later spans are
+    written on further lines with the same trace id.
+    """
+
+    def __init__(self, path: Optional[str] = None, sample_rate: float = 0.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        if not self.path or not spans:
+            return
+        line = json.dumps(otlp_json(sorted(spans, key=lambda s: s.start_ns)))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+tracer = Tracer()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def configure(path: Optional[str], sample_rate: float) -> None:
+    tracer.path = path
+    tracer.sample_rate = sample_rate
+
+
+@contextmanager
+def _record(trace: _Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Iterator[Span]:
+    current = Span(trace, name, parent_id, attributes)
+    trace.open += 1
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            pass  # closed from another context, e.g. an abandoned stream
+        current.end_ns = time.time_ns()
+        trace.spans.append(current)
+        trace.open -= 1
+        if trace.open == 0:
+            finished, trace.spans = trace.spans, []
+            tracer.export(finished)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any):
+    """Root span of a new trace, subject to sampling; yields NOOP_SPAN when not sampled."""
+    if tracer.sample_rate <= 0 or random.random() >= tracer.sample_rate:
+        yield NOOP_SPAN
+        return
+    with _record(_Trace(), name, None, attributes) as root:
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Child of the current span; a no-op outside a sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _record(parent.trace, name, parent.span_id, attributes) as child:
+        yield child